@@ -0,0 +1,78 @@
+"""
+Compare materializing a processed chunk as Address aggregates with holding it
+as an AddressBatch: build time and memory (tracemalloc peak).
+
+Usage: python benchmarks/address_batch.py [rows]
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from addresses.infrastructure.records import UF_ACRONYMS, to_address, to_batch
+
+
+def make_chunk(rows: int, seed: int = 0) -> pd.DataFrame:
+    """A processed chunk with the cardinalities of a real UF file."""
+    rng = np.random.default_rng(seed)
+    municipalities = rng.choice(300, rows)
+    return pd.DataFrame(
+        {
+            "ID_ENDERECO": np.arange(rows).astype(str),
+            "ESTADO": rng.choice(list(UF_ACRONYMS), rows),
+            "MUNICIPIO": municipalities.astype(str),
+            "DISTRITO": municipalities.astype(str),
+            "SUBDISTRITO": None,
+            "BAIRRO": rng.choice(2_000, rows).astype(str),
+            "CEP": rng.choice(20_000, rows).astype(str),
+            "TIPO_LOGRADOURO": rng.choice(["RUA", "AVENIDA", "TRAVESSA"], rows),
+            "RUA": rng.choice(20_000, rows).astype(str),
+            "NUMERO": rng.integers(1, 3_000, rows).astype(str),
+            "COMPLEMENTO": np.where(rng.random(rows) < 0.3, "APARTAMENTO 101", None),
+            "LATITUDE": rng.uniform(-33, 5, rows),
+            "LONGITUDE": rng.uniform(-73, -35, rows),
+            "ESPECIE": rng.integers(1, 9, rows),
+            "NIVEL_GEOCODIFICACAO": rng.integers(1, 7, rows),
+        }
+    )
+
+
+def measure(build):
+    """Time a build, then run it again under tracemalloc, which slows down
+    allocations, to get its peak memory in MB."""
+    start = time.perf_counter()
+    result = build()
+    elapsed = time.perf_counter() - start
+    del result
+
+    tracemalloc.start()
+    result = build()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, elapsed, peak / 1024**2
+
+
+def main(rows: int = 250_000):
+    chunk = make_chunk(rows)
+    records = chunk.to_dict("records")
+
+    _, aggregates_time, aggregates_peak = measure(
+        lambda: [to_address(row) for row in records]
+    )
+    batch, batch_time, batch_peak = measure(lambda: to_batch(chunk))
+
+    start = time.perf_counter()
+    batch.validate()
+    validate_time = time.perf_counter() - start
+
+    print(f"rows per chunk: {rows:,}")
+    print(f"Address list:   {aggregates_time:.2f} s, {aggregates_peak:.0f} MB peak")
+    print(f"AddressBatch:   {batch_time:.2f} s, {batch_peak:.0f} MB peak")
+    print(f"  validate:     {validate_time * 1000:.0f} ms")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:2]))
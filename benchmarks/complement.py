@@ -0,0 +1,69 @@
+"""
+Benchmark the COMPLEMENTO builder against the previous row-wise implementation.
+
+Usage: python benchmarks/complement.py [rows] [repeat]
+"""
+
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.process_addresses import COMPLEMENT_COLUMNS, build_complement
+
+NAMES = ["APARTAMENTO", "BLOCO", "CASA", "LOJA", "SALA", "FUNDOS", "LOTE"]
+VALUES = ["101", "A", "2", "B", "1203", "QUADRA 4"]
+
+# Share of rows filled for each of the five complement elements
+FILL_RATES = [0.5, 0.3, 0.1, 0.05, 0.02]
+
+
+def make_chunk(rows: int, seed: int = 0) -> pd.DataFrame:
+    """Build a chunk of complement columns with realistic sparsity."""
+    rng = np.random.default_rng(seed)
+    data = {}
+    for element, rate in enumerate(FILL_RATES, start=1):
+        filled = rng.random(rows) < rate
+        data[f"NOM_COMP_ELEM{element}"] = np.where(
+            filled, rng.choice(NAMES, rows), None
+        )
+        data[f"VAL_COMP_ELEM{element}"] = np.where(
+            filled, rng.choice(VALUES, rows), None
+        )
+    return pd.DataFrame(data)[COMPLEMENT_COLUMNS].astype("string")
+
+
+def build_complement_rowwise(df: pd.DataFrame) -> pd.Series:
+    """Previous implementation, extended to all five elements."""
+    return (
+        df[COMPLEMENT_COLUMNS]
+        .fillna("")
+        .astype(str)
+        .agg(" ".join, axis=1)
+        .str.split()
+        .str.join(" ")
+    )
+
+
+def main(rows: int = 250_000, repeat: int = 3):
+    chunk = make_chunk(rows)
+    assert build_complement(chunk).equals(build_complement_rowwise(chunk))
+
+    rowwise = min(
+        timeit.repeat(lambda: build_complement_rowwise(chunk), number=1, repeat=repeat)
+    )
+    vectorized = min(
+        timeit.repeat(lambda: build_complement(chunk), number=1, repeat=repeat)
+    )
+
+    print(f"rows per chunk: {rows:,}")
+    print(f"row-wise:       {rowwise:.3f} s")
+    print(f"vectorized:     {vectorized:.3f} s")
+    print(f"speedup:        {rowwise / vectorized:.1f}x")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,143 @@
+"""
+Benchmark linking a batch of address records to a synthetic processed CSV
+store, and how often the record is linked to its own address.
+
+Usage: python benchmarks/linkage.py [rows] [records] [workers]
+"""
+
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from addresses.infrastructure import linkage
+
+FILES = 27
+SYLLABLES = [
+    o + v for o in "b c d f g j l m n p r s t v x z ch".split() for v in "AEIOU"
+]
+COMPLEMENTS = ["APTO", "CASA", "BLOCO", "LOJA", "FUNDOS"]
+
+
+def street_names(rng, count: int) -> np.ndarray:
+    lengths = rng.integers(2, 5, (count, 2))
+    return np.array(
+        [
+            " ".join("".join(rng.choice(SYLLABLES, n)).upper() for n in pair)
+            for pair in lengths
+        ]
+    )
+
+
+def reference_frame(rng, rows: int, first: int, file: int) -> pd.DataFrame:
+    """Rows grouped in CEPs of skewed sizes: most hold one to three streets,
+    a few generic ones a whole town."""
+    sizes = np.minimum(1 + rng.lognormal(3.5, 1.2, rows // 20).astype(int), 20_000)
+    sizes = sizes[np.cumsum(sizes) <= rows]
+    cep = np.repeat(np.arange(len(sizes)), sizes)
+    streets = 1 + rng.poisson(0.5, len(sizes)).clip(0, 2) + sizes // 100
+    street_starts = np.cumsum(streets) - streets
+    names = street_names(rng, int(streets.sum()))
+    street = street_starts[cep] + (rng.random(len(cep)) * streets[cep]).astype(int)
+
+    numbers = rng.integers(1, 2_000, len(cep)).astype(str).astype(object)
+    numbers[rng.random(len(cep)) < 0.03] = "SN"
+    complements = np.full(len(cep), None, dtype=object)
+    has = rng.random(len(cep)) < 0.2
+    complements[has] = [
+        f"{kind} {n}"
+        for kind, n in zip(
+            rng.choice(COMPLEMENTS, has.sum()), rng.integers(1, 40, has.sum())
+        )
+    ]
+    return pd.DataFrame(
+        {
+            "ID_ENDERECO": np.arange(first, first + len(cep)).astype(str),
+            "ESTADO": f"UF {file}",
+            # About a hundred CEPs per municipality, in CEP order
+            "MUNICIPIO": [f"CIDADE {file} {c // 100}" for c in cep],
+            "CEP": [f"{10_000_000 + file * 300_000 + c:08d}" for c in cep],
+            "RUA": names[street],
+            "NUMERO": numbers,
+            "COMPLEMENTO": complements,
+        }
+    )
+
+
+def typo(text: str, rng) -> str:
+    """Swap two adjacent letters."""
+    at, letters = rng.integers(0, len(text) - 1), list(text)
+    letters[at], letters[at + 1] = letters[at + 1], letters[at]
+    return "".join(letters)
+
+
+def perturb(records: pd.DataFrame, rng) -> pd.DataFrame:
+    """Records as typed by people: typos in the street, a dash in the CEP,
+    upper case cities and complements often left out."""
+    records = records.copy()
+    typos = rng.random(len(records)) < 0.3
+    records.loc[typos, "RUA"] = [typo(s, rng) for s in records.loc[typos, "RUA"]]
+    dashed = rng.random(len(records)) < 0.5
+    ceps = records.loc[dashed, "CEP"]
+    records.loc[dashed, "CEP"] = ceps.str[:5] + "-" + ceps.str[5:]
+    records["MUNICIPIO"] = records["MUNICIPIO"].str.upper()
+    records.loc[rng.random(len(records)) < 0.5, "COMPLEMENTO"] = None
+    return records
+
+
+def main(rows: int = 5_000_000, records: int = 1_000_000, workers: int = 1):
+    rng = np.random.default_rng(0)
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        store = workdir / "processed"
+        store.mkdir()
+        keys, samples, first, pairs = [], [], 0, 0
+        for file in range(FILES):
+            frame = reference_frame(rng, rows // FILES, first, file)
+            frame.to_csv(store / f"{file:02d}.csv", index=False)
+            keys.append(frame["CEP"] + frame["RUA"] + frame["NUMERO"])
+            sample = frame.sample(records // FILES, random_state=file)
+            pairs += frame["CEP"].value_counts()[sample["CEP"]].sum()
+            samples.append(sample)
+            first += len(frame)
+        keys = pd.concat(keys, ignore_index=True).to_numpy()
+        sample = pd.concat(samples, ignore_index=True)
+        sample.rename(columns={"ID_ENDERECO": "ID"}).pipe(perturb, rng).to_csv(
+            workdir / "records.csv", index=False
+        )
+        print(
+            f"{first:,} rows, {len(sample):,} records: {pairs:,} candidate pairs "
+            f"instead of {first * len(sample):,}"
+        )
+
+        start = time.perf_counter()
+        linked = linkage.link(
+            store, workdir / "records.csv", workdir / "linked.csv", workers=workers
+        )
+        seconds = time.perf_counter() - start
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        print(
+            f"link: {seconds:.1f} s ({len(sample) / seconds:,.0f} records/s), "
+            f"peak RSS {peak:,.0f} MB"
+        )
+
+        result = pd.read_csv(workdir / "linked.csv", dtype={"ID_ENDERECO": str})
+        found = result["ID_ENDERECO"].dropna().astype(int).to_numpy()
+        expected = keys[result["ID"][result["ID_ENDERECO"].notna()].to_numpy()]
+        # Rows of the same CEP, street and number are equally right
+        correct = (keys[found] == expected).sum()
+        print(
+            f"linked {linked / len(sample):.1%}, to the right address "
+            f"{correct / len(sample):.1%}"
+        )
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
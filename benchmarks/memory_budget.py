@@ -0,0 +1,107 @@
+"""
+Benchmark processing the largest UF of a synthetic CNEFE release (see
+synthetic.py) under memory budgets: the chunk size ChunkSizer settles on, the
+peak RSS and the time taken, against the fixed CHUNKSIZE without a budget.
+
+Every run is a new process, so the peak RSS reported is its own.
+
+Usage: python benchmarks/memory_budget.py [rows] [budget MB ...]
+"""
+
+import contextlib
+import io
+import multiprocessing
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, Optional
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from synthetic import write_release
+
+from scripts import (
+    download,
+    extract,
+    instrumentation,
+    metadata,
+    process_addresses,
+    process_metadata,
+)
+
+BUDGETS = [250, 400, 600, 1000]
+
+
+def run_file(
+    archive: Path, mappings: Path, destination: Path, engine: str, budget: Optional[int]
+) -> Dict:
+    lookups = process_addresses.load_lookups(mappings)
+    (source,) = process_addresses.archive_sources(archive)
+    memory_budget = budget * process_addresses.MB if budget else None
+
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        process_addresses.process_file(
+            source,
+            destination,
+            lookups,
+            progress=False,
+            engine=engine,
+            memory_budget=memory_budget,
+        )
+    seconds = time.perf_counter() - start
+
+    sizer = process_addresses._sizers.get(memory_budget)
+    return {
+        "rows_per_chunk": sizer.size if sizer else process_addresses.CHUNKSIZE,
+        "seconds": seconds,
+        "peak_mb": instrumentation.peak_rss_mb(),
+    }
+
+
+def main(rows: int = 5_000_000, budgets=BUDGETS):
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        written = write_release(workdir / "ftp", rows)
+        dtb = workdir / "ftp" / metadata.FTP_DIR.lstrip("/")
+        extract.main(dtb, workdir / "dtb", ".xls")
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_metadata.main(workdir / "dtb", workdir / "mappings", force=True)
+
+        path, count = max(
+            (item for item in written.items() if item[0] != metadata.DTB_PATH),
+            key=lambda item: item[1],
+        )
+        archive = workdir / "ftp" / download.FTP_DIR.lstrip("/") / path
+        print(f"{Path(path).name}: {count:,} rows")
+
+        for engine in process_addresses.ENGINES:
+            for budget in [None, *budgets]:
+                destination = workdir / "processed" / f"{engine}-{budget}"
+                destination.mkdir(parents=True)
+                with ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                ) as executor:
+                    result = executor.submit(
+                        run_file,
+                        archive,
+                        workdir / "mappings",
+                        destination,
+                        engine,
+                        budget,
+                    ).result()
+                print(
+                    f"{engine:8} budget {f'{budget} MB' if budget else '-':>8}: "
+                    f"{result['rows_per_chunk']:>9,} rows per chunk, "
+                    f"peak {result['peak_mb']:,.0f} MB, "
+                    f"{count / result['seconds']:,.0f} rows/s"
+                )
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 5_000_000
+    main(rows, [int(budget) for budget in sys.argv[2:]] or BUDGETS)
@@ -0,0 +1,168 @@
+"""
+Benchmark each stage of the pipeline on a synthetic CNEFE release (see
+synthetic.py) served by a local FTP stand-in: rows per second and peak memory
+of the download, the metadata (DTB download, extraction and mappings), the
+extraction of the address CSVs and their processing with each CSV engine.
+
+Every stage runs in a new process, so the peak RSS reported is its own. The
+results can be saved as JSON and compared with those of a previous run; a
+stage more than TOLERANCE slower, or using that much more memory, is reported
+as a regression and makes the script exit with status 1.
+
+Usage: python benchmarks/pipeline.py [--rows N] [--save PATH] [--compare PATH]
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from synthetic import write_release
+
+from scripts import (
+    download,
+    extract,
+    instrumentation,
+    metadata,
+    process_addresses,
+    process_metadata,
+)
+from tests.ftp_server import serve
+
+STAGES = ["download", "metadata", "extract", "process (c)", "process (pyarrow)"]
+TOLERANCE = 0.10
+
+
+def run_stage(stage: str, workdir: Path, host: str, port: int) -> Dict[str, float]:
+    """Run one stage in the current process; returns its time and peak RSS."""
+    download.FTP_HOST, download.FTP_PORT = host, port
+    metadata.FTP_HOST, metadata.FTP_PORT = host, port
+
+    start = time.perf_counter()
+    # Progress bars and messages would only add noise to the report
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output), contextlib.redirect_stderr(output):
+        _run(stage, workdir)
+    return {
+        "seconds": time.perf_counter() - start,
+        "peak_mb": instrumentation.peak_rss_mb(),
+    }
+
+
+def _run(stage: str, workdir: Path):
+    if stage == "download":
+        download.main(workdir / "raw")
+    elif stage == "metadata":
+        metadata.main(workdir / "dtb")
+        extract.main(workdir / "dtb", workdir / "extracted" / "metadata", ".xls")
+        process_metadata.main(
+            workdir / "extracted" / "metadata", workdir / "mappings", force=True
+        )
+    elif stage == "extract":
+        extract.main(workdir / "raw", workdir / "extracted" / "addresses", ".csv")
+    else:
+        engine = stage.split("(")[1].rstrip(")")
+        process_addresses.main(
+            workdir / "raw",
+            workdir / "mappings",
+            workdir / "processed" / engine,
+            engine=engine,
+            force=True,
+        )
+
+
+def run(rows: int) -> Dict:
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        start = time.perf_counter()
+        written = write_release(workdir / "ftp", rows)
+        print(f"generated in {time.perf_counter() - start:.1f} s")
+        addresses = sum(
+            count for path, count in written.items() if path != metadata.DTB_PATH
+        )
+
+        stages = {}
+        with serve(workdir / "ftp") as server:
+            host, port = server.address[:2]
+            for stage in STAGES:
+                with ProcessPoolExecutor(
+                    max_workers=1, mp_context=multiprocessing.get_context("spawn")
+                ) as executor:
+                    result = executor.submit(
+                        run_stage, stage, workdir, host, port
+                    ).result()
+                count = written[metadata.DTB_PATH] if stage == "metadata" else addresses
+                result["rows_per_second"] = count / result["seconds"]
+                stages[stage] = result
+                print(
+                    f"{stage}: {result['seconds']:.1f} s, "
+                    f"{result['rows_per_second']:,.0f} rows/s, "
+                    f"peak {result['peak_mb']:,.0f} MB"
+                )
+    finally:
+        shutil.rmtree(workdir)
+
+    return {
+        "rows": addresses,
+        "python": platform.python_version(),
+        "cpus": os.cpu_count(),
+        "stages": stages,
+    }
+
+
+def compare(results: Dict, baseline: Dict) -> bool:
+    """Print the change of each stage from `baseline`; returns whether any
+    regressed by more than TOLERANCE."""
+    if results["rows"] != baseline["rows"]:
+        print(
+            f"Note: the baseline has {baseline['rows']:,} rows, not {results['rows']:,}"
+        )
+    regressed = False
+    for stage, result in results["stages"].items():
+        before = baseline["stages"].get(stage)
+        if before is None:
+            continue
+        speed = result["rows_per_second"] / before["rows_per_second"] - 1
+        memory = result["peak_mb"] / before["peak_mb"] - 1
+        slower = speed < -TOLERANCE or memory > TOLERANCE
+        regressed |= slower
+        print(
+            f"{stage}: rows/s {speed:+.1%}, peak memory {memory:+.1%}"
+            + (" REGRESSION" if slower else "")
+        )
+    return regressed
+
+
+def main(rows: int, save: Path = None, baseline: Path = None) -> int:
+    results = run(rows)
+    if save is not None:
+        save.parent.mkdir(parents=True, exist_ok=True)
+        save.write_text(json.dumps(results, indent=2) + "\n", encoding="utf-8")
+    if baseline is not None:
+        return int(compare(results, json.loads(baseline.read_text(encoding="utf-8"))))
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument(
+        "--rows", type=int, default=5_000_000, help="Addresses in the release"
+    )
+    parser.add_argument("--save", type=Path, help="Write the results to this JSON")
+    parser.add_argument(
+        "--compare", type=Path, help="JSON of a previous run to compare with"
+    )
+    args = parser.parse_args()
+
+    sys.exit(main(args.rows, args.save, args.compare))
@@ -0,0 +1,92 @@
+"""
+Benchmark the build time, open time and lookup latency of the CEP index on
+synthetic processed CSVs.
+
+Usage: python benchmarks/postal_code_index.py [rows] [queries]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from addresses.domain.value_objects import PostalCode
+from addresses.infrastructure import postal_code_index
+
+FILES = 27
+POSTAL_CODES = 900_000  # Distinct CEPs in Brazil, roughly
+MUNICIPALITIES = 5_570
+
+
+def write_store(store: Path, rows: int, seed: int = 0) -> np.ndarray:
+    """Write FILES processed CSVs and return the CEP of every row."""
+    rng = np.random.default_rng(seed)
+    # Skewed: generic city CEPs are shared by many addresses
+    ranks = np.minimum(rng.zipf(1.3, rows), POSTAL_CODES) - 1
+    all_codes = rng.choice(99_999_999, POSTAL_CODES, replace=False) + 1
+    codes = all_codes[ranks]
+
+    for number, part in enumerate(np.array_split(np.arange(rows), FILES)):
+        pd.DataFrame(
+            {
+                "ID_ENDERECO": part.astype(str),
+                "ESTADO": "São Paulo",
+                "MUNICIPIO": (part % MUNICIPALITIES).astype(str),
+                "DISTRITO": "Sé",
+                "SUBDISTRITO": "",
+                "BAIRRO": "Centro",
+                "CEP": [f"{code:08d}" for code in codes[part]],
+                "TIPO_LOGRADOURO": "AVENIDA",
+                "RUA": "PAULISTA",
+                "NUMERO": part % 3000,
+                "COMPLEMENTO": "APARTAMENTO 101",
+                "LATITUDE": -23.56,
+                "LONGITUDE": -46.65,
+                "ESPECIE": 1,
+                "NIVEL_GEOCODIFICACAO": 1,
+            }
+        ).to_csv(store / f"{number:02d}.csv", index=False)
+    return codes
+
+
+def main(rows: int = 10_000_000, queries: int = 1_000):
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        store = workdir / "processed"
+        store.mkdir()
+        codes = write_store(store, rows)
+
+        start = time.perf_counter()
+        postal_code_index.build(store, workdir / "index")
+        print(f"build: {time.perf_counter() - start:.1f} s for {rows:,} rows")
+
+        start = time.perf_counter()
+        index = postal_code_index.PostalCodeIndex(workdir / "index")
+        print(f"open: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+        # CEPs drawn from the rows, excluding the few huge generic ones
+        counts = pd.Series(codes).value_counts()
+        sample = np.random.default_rng(1).choice(counts[counts <= 100].index, queries)
+
+        seconds, found = [], 0
+        for code in sample:
+            postal_code = PostalCode(f"{code // 1000:05d}-{code % 1000:03d}")
+            start = time.perf_counter()
+            found += len(index.find_by_postal_code(postal_code))
+            seconds.append(time.perf_counter() - start)
+
+        p50, p95, p99 = np.percentile(np.array(seconds) * 1000, [50, 95, 99])
+        print(
+            f"lookup ({found / queries:.1f} addresses on average): "
+            f"p50 {p50:.2f} ms | p95 {p95:.2f} ms | p99 {p99:.2f} ms"
+        )
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,105 @@
+"""
+Benchmark the build time and query latency of the spatial index on a
+synthetic national dataset.
+
+Usage: python benchmarks/spatial_index.py [rows] [queries]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from addresses.infrastructure import spatial_index
+from addresses.infrastructure.records import PROCESSED_SCHEMA, UF_ACRONYMS
+
+CITIES = 2_000  # Urban clusters addresses are drawn around
+SPREAD = 0.03  # Standard deviation of a cluster, in degrees (about 3 km)
+
+
+def make_table(rows: int, seed: int = 0) -> pa.Table:
+    """Addresses clustered around random cities inside Brazil's bounding box."""
+    rng = np.random.default_rng(seed)
+    city_lats = rng.uniform(-33.0, 5.0, CITIES)
+    city_lons = rng.uniform(-73.0, -35.0, CITIES)
+    # Few large cities hold most addresses
+    weights = rng.pareto(1.2, CITIES) + 1
+    city = rng.choice(CITIES, rows, p=weights / weights.sum())
+    # UFs are compact regions: tile the box in 3 x 9 states
+    states = np.array(list(UF_ACRONYMS)).reshape(3, 9)
+    state = states[
+        ((city_lats[city] + 33.0) // (38.0 / 3)).astype(int).clip(0, 2),
+        ((city_lons[city] + 73.0) // (38.0 / 9)).astype(int).clip(0, 8),
+    ]
+
+    columns = {name: pa.nulls(rows, pa.string()) for name in PROCESSED_SCHEMA.names}
+    columns.update(
+        ID_ENDERECO=pa.array(np.arange(rows).astype(str)),
+        ESTADO=pa.array(state),
+        MUNICIPIO=pa.array(city.astype(str)),
+        CEP=pa.array(np.full(rows, "01310100")),
+        LATITUDE=city_lats[city] + rng.normal(0, SPREAD, rows),
+        LONGITUDE=city_lons[city] + rng.normal(0, SPREAD, rows),
+        ESPECIE=pa.array(np.ones(rows, np.int8)),
+        NIVEL_GEOCODIFICACAO=pa.array(np.ones(rows, np.int8)),
+    )
+    return pa.table(columns).cast(PROCESSED_SCHEMA)
+
+
+def percentiles(seconds) -> str:
+    p50, p95, p99 = np.percentile(np.array(seconds) * 1000, [50, 95, 99])
+    return f"p50 {p50:.2f} ms | p95 {p95:.2f} ms | p99 {p99:.2f} ms"
+
+
+def timed(query, points):
+    seconds = []
+    for lat, lon in points:
+        start = time.perf_counter()
+        query(lat, lon)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def main(rows: int = 10_000_000, queries: int = 1_000):
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        table = make_table(rows)
+        pq.write_to_dataset(table, workdir / "processed", partition_cols=["ESTADO"])
+
+        start = time.perf_counter()
+        spatial_index.build(workdir / "processed", workdir / "index")
+        print(f"build: {time.perf_counter() - start:.1f} s for {rows:,} rows")
+
+        start = time.perf_counter()
+        index = spatial_index.SpatialIndex(workdir / "index")
+        print(f"open: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+        # Query points near existing addresses, as real lookups are
+        rng = np.random.default_rng(1)
+        sample = rng.choice(rows, queries)
+        points = np.column_stack(
+            [
+                table["LATITUDE"].to_numpy()[sample],
+                table["LONGITUDE"].to_numpy()[sample],
+            ]
+        ) + rng.normal(0, 0.001, (queries, 2))
+
+        print(
+            "nearest k=10:    ",
+            percentiles(timed(lambda *p: index.nearest(*p, 10), points)),
+        )
+        print(
+            "within 250 m:    ",
+            percentiles(timed(lambda *p: index.within_radius(*p, 250), points)),
+        )
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
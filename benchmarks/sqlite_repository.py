@@ -0,0 +1,88 @@
+"""
+Benchmark loading processed CSVs into the SQLite repository and the latency
+of its finders.
+
+Usage: python benchmarks/sqlite_repository.py [rows] [queries]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+from postal_code_index import MUNICIPALITIES, write_store
+
+from addresses.domain.value_objects import PostalCode, TerritorialDivision
+from addresses.infrastructure import sqlite_repository
+
+
+def report(name: str, seconds) -> None:
+    p50, p95, p99 = np.percentile(np.array(seconds) * 1000, [50, 95, 99])
+    print(f"{name:<28} p50 {p50:.3f} ms | p95 {p95:.3f} ms | p99 {p99:.3f} ms")
+
+
+def timed(query, arguments):
+    seconds = []
+    for argument in arguments:
+        start = time.perf_counter()
+        query(argument)
+        seconds.append(time.perf_counter() - start)
+    return seconds
+
+
+def main(rows: int = 10_000_000, queries: int = 1_000):
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        store = workdir / "processed"
+        store.mkdir()
+        codes = write_store(store, rows)
+
+        start = time.perf_counter()
+        loaded = sqlite_repository.load(store, workdir / "addresses.db")
+        elapsed = time.perf_counter() - start
+        print(f"load: {elapsed:.1f} s, {loaded / elapsed:,.0f} rows/s")
+
+        repository = sqlite_repository.SqliteAddressRepository(workdir / "addresses.db")
+        rng = np.random.default_rng(1)
+        report(
+            "find_by_id",
+            timed(repository.find_by_id, rng.choice(rows, queries).astype(str)),
+        )
+
+        counts = np.unique(codes, return_counts=True)
+        rare = counts[0][counts[1] <= 100]
+        report(
+            "find_by_postal_code",
+            timed(
+                repository.find_by_postal_code,
+                [
+                    PostalCode(f"{code // 1000:05d}-{code % 1000:03d}")
+                    for code in rng.choice(rare, queries)
+                ],
+            ),
+        )
+
+        report(
+            "find_by_territorial_division",
+            timed(
+                repository.find_by_territorial_division,
+                [
+                    TerritorialDivision(
+                        uf="SP",
+                        municipality=str(municipality),
+                        district="Sé",
+                        subdistrict="",
+                    )
+                    for municipality in rng.choice(MUNICIPALITIES, queries)
+                ],
+            ),
+        )
+        repository.close()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
@@ -0,0 +1,405 @@
+"""
+Generate a synthetic CNEFE release: the UF ZIPs of address CSVs with the real
+schema, the dictionary and the DTB spreadsheets, laid out as on the IBGE FTP
+servers so the whole pipeline can run against a local stand-in.
+
+Rows are spread over the 27 UFs by their share of the real addresses, and over
+the real number of municipalities of each UF with Zipf-distributed sizes.
+Species, geocoding levels, complements, "SN" numbers and the generic CEP of
+small towns follow roughly the proportions of the 2022 release, and a few rows
+in ten thousand break a validation rule.
+
+Usage: python benchmarks/synthetic.py <root> [rows]
+"""
+
+import io
+import sys
+from pathlib import Path
+from typing import Dict
+from zipfile import ZIP_DEFLATED, ZipFile
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts import download, metadata, process_metadata
+
+BATCH_ROWS = 500_000  # Rows generated and written at once
+INVALID_RATE = 0.0005  # Rows with a malformed CEP or no latitude
+ROWS_PER_STREET = 40
+
+# Code, abbreviation, name, share of the addresses (%), municipalities, CEP
+# prefixes and approximate center
+UFS = [
+    (11, "RO", "Rondônia", 0.8, 52, (76800, 76999), (-10.9, -62.8)),
+    (12, "AC", "Acre", 0.4, 22, (69900, 69999), (-9.0, -70.5)),
+    (13, "AM", "Amazonas", 1.8, 62, (69000, 69299), (-4.1, -63.0)),
+    (14, "RR", "Roraima", 0.3, 15, (69300, 69399), (2.0, -61.4)),
+    (15, "PA", "Pará", 3.8, 144, (66000, 68899), (-4.0, -52.5)),
+    (16, "AP", "Amapá", 0.4, 16, (68900, 68999), (1.4, -51.8)),
+    (17, "TO", "Tocantins", 0.8, 139, (77000, 77999), (-10.2, -48.3)),
+    (21, "MA", "Maranhão", 3.2, 217, (65000, 65999), (-5.1, -45.3)),
+    (22, "PI", "Piauí", 1.7, 224, (64000, 64999), (-7.7, -42.7)),
+    (23, "CE", "Ceará", 4.3, 184, (60000, 63999), (-5.2, -39.5)),
+    (24, "RN", "Rio Grande do Norte", 1.7, 167, (59000, 59999), (-5.8, -36.6)),
+    (25, "PB", "Paraíba", 2.0, 223, (58000, 58999), (-7.1, -36.8)),
+    (26, "PE", "Pernambuco", 4.6, 185, (50000, 56999), (-8.4, -37.9)),
+    (27, "AL", "Alagoas", 1.5, 102, (57000, 57999), (-9.6, -36.6)),
+    (28, "SE", "Sergipe", 1.1, 75, (49000, 49999), (-10.6, -37.4)),
+    (29, "BA", "Bahia", 7.4, 417, (40000, 48999), (-12.5, -41.7)),
+    (31, "MG", "Minas Gerais", 10.8, 853, (30000, 39999), (-18.5, -44.6)),
+    (32, "ES", "Espírito Santo", 2.0, 78, (29000, 29999), (-19.6, -40.7)),
+    (33, "RJ", "Rio de Janeiro", 8.2, 92, (20000, 28999), (-22.3, -42.7)),
+    (35, "SP", "São Paulo", 21.8, 645, (1000, 19999), (-22.2, -48.6)),
+    (41, "PR", "Paraná", 5.8, 399, (80000, 87999), (-24.6, -51.6)),
+    (42, "SC", "Santa Catarina", 3.7, 295, (88000, 89999), (-27.2, -50.4)),
+    (43, "RS", "Rio Grande do Sul", 6.0, 497, (90000, 99999), (-29.7, -53.2)),
+    (50, "MS", "Mato Grosso do Sul", 1.3, 79, (79000, 79999), (-20.5, -54.8)),
+    (51, "MT", "Mato Grosso", 1.6, 141, (78000, 78899), (-12.9, -55.9)),
+    (52, "GO", "Goiás", 3.3, 246, (72800, 76799), (-16.0, -49.6)),
+    (53, "DF", "Distrito Federal", 1.2, 1, (70000, 73699), (-15.8, -47.9)),
+]
+
+# Columns of the CNEFE CSVs, in their order; all but the coordinates are text
+COLUMNS = [
+    "COD_UNICO_ENDERECO",
+    "COD_UF",
+    "COD_MUNICIPIO",
+    "COD_DISTRITO",
+    "COD_SUBDISTRITO",
+    "COD_SETOR",
+    "NUM_QUADRA",
+    "NUM_FACE",
+    "CEP",
+    "DSC_LOCALIDADE",
+    "NOM_TIPO_SEGLOGR",
+    "NOM_TITULO_SEGLOGR",
+    "NOM_SEGLOGR",
+    "NUM_ENDERECO",
+    "DSC_MODIFICADOR",
+    *[f"{prefix}_COMP_ELEM{n}" for n in range(1, 6) for prefix in ["NOM", "VAL"]],
+    "LATITUDE",
+    "LONGITUDE",
+    "NV_GEO_COORD",
+    "COD_ESPECIE",
+    "DSC_ESTABELECIMENTO",
+    "COD_INDICADOR_ESTAB_ENDERECO",
+    "COD_INDICADOR_CONST_ENDERECO",
+    "COD_INDICADOR_FINALIDADE_CONST",
+    "COD_TIPO_ESPECI",
+]
+SCHEMA = pa.schema(
+    [
+        (column, pa.float64() if column in ("LATITUDE", "LONGITUDE") else pa.string())
+        for column in COLUMNS
+    ]
+)
+
+SPECIES_SHARE = [0.845, 0.003, 0.03, 0.004, 0.003, 0.085, 0.024, 0.006]
+GEOCODING_SHARE = [0.80, 0.08, 0.05, 0.04, 0.02, 0.01]
+APARTMENT_SHARE = 0.18  # Of the private dwellings
+COMPLEMENT_SHARE = 0.12  # Of the other addresses
+STREET_TYPES = {
+    "RUA": 0.70,
+    "AVENIDA": 0.10,
+    "TRAVESSA": 0.06,
+    "ESTRADA": 0.04,
+    "RODOVIA": 0.02,
+    "ALAMEDA": 0.02,
+    "PRAÇA": 0.02,
+    "BECO": 0.02,
+    "VILA": 0.01,
+    "LINHA": 0.01,
+}
+TITLES = ["PRESIDENTE", "DOUTOR", "SANTA", "SÃO", "PADRE", "GOVERNADOR"]
+COMPLEMENTS = ["CASA", "LOJA", "SALA", "ANDAR", "LOTE", "QUADRA", "FUNDOS"]
+ONSETS = "B C D F G J L M N P R S T V X Z CH NH LH BR TR".split()
+SYLLABLES = [o + v for o in ONSETS for v in ["A", "E", "I", "O", "U", "Ã", "É"]]
+
+
+def vocabulary(rng, count: int) -> np.ndarray:
+    """Made-up names of one or two words of 2 to 4 syllables."""
+    syllables = np.array(SYLLABLES + [""])[
+        np.where(
+            np.arange(4) < rng.integers(2, 5, (2 * count, 1)),
+            rng.integers(0, len(SYLLABLES), (2 * count, 4)),
+            len(SYLLABLES),
+        )
+    ]
+    words = syllables[:, 0]
+    for column in range(1, 4):
+        words = np.char.add(words, syllables[:, column])
+    first, second = words[:count], words[count:]
+    connector = rng.choice(["", " DE", " DA", " DO", " DOS"], count)
+    two = rng.random(count) < 0.6
+    return np.where(
+        two, np.char.add(np.char.add(first, connector), np.char.add(" ", second)), first
+    )
+
+
+def territory(rng, names: np.ndarray) -> pd.DataFrame:
+    """One row per municipality: codes, name, share of the rows, districts,
+    subdistricts, CEP range and center."""
+    frames = []
+    for uf, _, state, share, count, (first_cep, last_cep), (lat, lon) in UFS:
+        rank = np.arange(1, count + 1)
+        frames.append(
+            pd.DataFrame(
+                {
+                    "uf": str(uf),
+                    "state": state,
+                    "code": [f"{uf}{k * 10 + 7:05d}" for k in rank],
+                    "name": rng.choice(names, count),
+                    "share": share / 100 / rank / (1 / rank).sum(),
+                    "districts": 1 + rng.poisson(0.7, count),
+                    # Only the largest municipalities have subdistricts
+                    "subdistricts": np.where(rank <= max(1, count // 40), 3, 0),
+                    # Small towns have a single, generic CEP
+                    "generic": rank > max(1, count // 5),
+                    "first_cep": first_cep,
+                    "ceps": last_cep - first_cep + 1,
+                    "lat": lat + rng.normal(0, 1.5, count),
+                    "lon": lon + rng.normal(0, 1.5, count),
+                }
+            )
+        )
+    frame = pd.concat(frames, ignore_index=True)
+    frame["share"] /= frame["share"].sum()
+    return frame
+
+
+def dtb_tables(municipalities: pd.DataFrame) -> Dict[str, pd.DataFrame]:
+    """The three DTB reports read by process_metadata."""
+    districts = municipalities.loc[
+        municipalities.index.repeat(municipalities["districts"])
+    ]
+    number = (districts.groupby(level=0).cumcount() * 5 + 5).to_numpy()
+    subdistricts = districts[number == 5]
+    subdistricts = subdistricts.loc[
+        subdistricts.index.repeat(subdistricts["subdistricts"])
+    ]
+    sub_number = subdistricts.groupby(level=0).cumcount().to_numpy() + 1
+    return {
+        process_metadata.STATE_MUNICIPALITY_FILE: pd.DataFrame(
+            {
+                "UF": municipalities["uf"].astype(int),
+                "Nome_UF": municipalities["state"],
+                "Município": municipalities["code"].str[2:].astype(int),
+                "Código Município Completo": municipalities["code"].astype(int),
+                "Nome_Município": municipalities["name"],
+            }
+        ),
+        process_metadata.DISTRITAL_FILE: pd.DataFrame(
+            {
+                "Código de Distrito Completo": (
+                    districts["code"].astype(int) * 100 + number
+                ),
+                # The district at the seat has the name of the municipality
+                "Nome_Distrito": np.where(
+                    number == 5, districts["name"], [f"DISTRITO {n}" for n in number]
+                ),
+            }
+        ),
+        process_metadata.SUBDISTRITAL_FILE: pd.DataFrame(
+            {
+                "Código de Subdistrito Completo": (
+                    subdistricts["code"].astype(int) * 10_000 + 500 + sub_number
+                ),
+                "Nome_Subdistrito": [f"SUBDISTRITO {n}" for n in sub_number],
+            }
+        ),
+    }
+
+
+def write_dtb(path: Path, municipalities: pd.DataFrame) -> int:
+    """Zip the DTB reports below a title, as process_metadata expects. Returns
+    the number of rows written."""
+    rows = 0
+    with ZipFile(path, "w", ZIP_DEFLATED) as archive:
+        for name, frame in dtb_tables(municipalities).items():
+            # pandas picks the reader from the content, so xlsx content under
+            # the .xls name reads like the real file; no .xls writer exists
+            buffer = io.BytesIO()
+            with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+                pd.DataFrame([["DIVISÃO TERRITORIAL BRASILEIRA"]]).to_excel(
+                    writer, index=False, header=False
+                )
+                frame.to_excel(
+                    writer, index=False, startrow=process_metadata.HEADER_POS
+                )
+            archive.writestr(name, buffer.getvalue())
+            rows += len(frame)
+    return rows
+
+
+def text(values, mask=None) -> pa.Array:
+    """Text column, null where `mask` is set."""
+    return pa.array(values, mask=mask).cast(pa.string())
+
+
+def join(*parts) -> pa.Array:
+    return pc.binary_join_element_wise(*parts, "")
+
+
+def digits(values: np.ndarray, width: int) -> pa.Array:
+    return pc.utf8_lpad(text(values), width, "0")
+
+
+def address_batch(
+    rng, towns: pd.DataFrame, names: np.ndarray, first: int, rows: int
+) -> pa.Table:
+    """`rows` raw CNEFE rows of the municipalities `towns`, numbered from
+    `first`."""
+    share = towns["share"].to_numpy()
+    town = np.sort(rng.choice(len(towns), rows, p=share / share.sum()))
+    towns = towns.iloc[town]
+    codes = towns["code"].to_numpy()
+
+    district = (rng.random(rows) * towns["districts"].to_numpy()).astype(int) * 5 + 5
+    has_subdistricts = (towns["subdistricts"].to_numpy() > 0) & (district == 5)
+    subdistrict = np.where(has_subdistricts, rng.integers(1, 4, rows), 0)
+    district_code = join(text(codes), digits(district, 2))
+    subdistrict_code = join(district_code, digits(subdistrict, 2))
+
+    # Streets grow with the town; a CEP per street, but one per small town
+    streets = np.maximum(1, towns["streets"].to_numpy())
+    street = (rng.random(rows) * streets).astype(int)
+    name = (town * 7_919 + street * 104_729) % len(names)
+    generic = towns["generic"].to_numpy()
+    prefix = towns["first_cep"].to_numpy() + (
+        (town * 7 + np.where(generic, 0, street // 1_000)) % towns["ceps"].to_numpy()
+    )
+    cep = prefix * 1_000 + np.where(generic, 0, street % 1_000)
+    invalid = rng.random(rows) < INVALID_RATE
+
+    species = rng.choice(np.arange(1, 9), rows, p=SPECIES_SHARE)
+    apartment = (species == 1) & (rng.random(rows) < APARTMENT_SHARE)
+    geocoding = rng.choice(np.arange(1, 7), rows, p=GEOCODING_SHARE)
+    geocoding[apartment] = 2
+    establishment = np.isin(species, [4, 5, 6, 8])
+    no_number = rng.random(rows) < 0.06
+    block = apartment & (rng.random(rows) < 0.4)
+    other = ~apartment & (rng.random(rows) < COMPLEMENT_SHARE)
+    kind = rng.choice(COMPLEMENTS, rows)
+    first_element = np.where(apartment, "APARTAMENTO", kind)
+    first_value = np.where(
+        apartment, rng.integers(1, 2_000, rows), rng.integers(1, 50, rows)
+    )
+
+    columns = {
+        "COD_UNICO_ENDERECO": join(
+            text(towns["uf"].to_numpy()), digits(np.arange(first, first + rows), 13)
+        ),
+        "COD_UF": text(towns["uf"].to_numpy()),
+        "COD_MUNICIPIO": text(codes),
+        "COD_DISTRITO": district_code,
+        "COD_SUBDISTRITO": subdistrict_code,
+        "COD_SETOR": join(subdistrict_code, digits(street // 40, 4), "P"),
+        "NUM_QUADRA": text(rng.integers(1, 200, rows)),
+        "NUM_FACE": text(rng.integers(1, 8, rows)),
+        "CEP": pc.if_else(invalid, "0000", digits(cep, 8)),
+        "DSC_LOCALIDADE": text(names[(town * 13 + street // 50) % len(names)]),
+        "NOM_TIPO_SEGLOGR": text(
+            rng.choice(list(STREET_TYPES), rows, p=list(STREET_TYPES.values()))
+        ),
+        "NOM_TITULO_SEGLOGR": text(
+            rng.choice(TITLES, rows), mask=rng.random(rows) > 0.1
+        ),
+        "NOM_SEGLOGR": text(names[name]),
+        "NUM_ENDERECO": text(
+            np.exp(rng.normal(5, 1.3, rows)).astype(int) + 1, mask=no_number
+        ),
+        "DSC_MODIFICADOR": text(np.full(rows, "SN"), mask=~no_number),
+        "NOM_COMP_ELEM1": text(first_element, mask=~(apartment | other)),
+        "VAL_COMP_ELEM1": text(
+            first_value, mask=~(apartment | other) | (first_element == "FUNDOS")
+        ),
+        "NOM_COMP_ELEM2": text(np.full(rows, "BLOCO"), mask=~block),
+        "VAL_COMP_ELEM2": text(rng.choice(list("ABCDEF"), rows), mask=~block),
+        "LATITUDE": pa.array(
+            towns["lat"].to_numpy() + rng.normal(0, 0.03, rows), mask=invalid
+        ),
+        "LONGITUDE": pa.array(towns["lon"].to_numpy() + rng.normal(0, 0.03, rows)),
+        "NV_GEO_COORD": text(geocoding),
+        "COD_ESPECIE": text(species),
+        "DSC_ESTABELECIMENTO": join(
+            "ESTABELECIMENTO ", text(names[name // 3], mask=~establishment)
+        ),
+        "COD_INDICADOR_ESTAB_ENDERECO": text(np.ones(rows, int), mask=~establishment),
+        "COD_INDICADOR_CONST_ENDERECO": text(np.ones(rows, int), mask=species != 7),
+        "COD_INDICADOR_FINALIDADE_CONST": text(np.ones(rows, int), mask=species != 7),
+        "COD_TIPO_ESPECI": text(np.where(apartment, 103, 101), mask=species != 1),
+    }
+    return pa.table(
+        [columns.get(c, pa.nulls(rows, pa.string())) for c in COLUMNS], schema=SCHEMA
+    )
+
+
+def write_addresses(
+    directory: Path, municipalities: pd.DataFrame, names, rows: int, seed: int = 0
+) -> Dict[str, int]:
+    """Write a ZIP holding the CSV of each UF, as in the CNEFE release.
+    Returns the rows written per archive."""
+    rng = np.random.default_rng(seed)
+    municipalities = municipalities.assign(
+        streets=(municipalities["share"] * rows / ROWS_PER_STREET).astype(int)
+    )
+    written = {}
+    for uf, abbreviation, *_ in UFS:
+        towns = municipalities[municipalities["uf"] == str(uf)]
+        total = int(round(towns["share"].sum() * rows))
+        name = f"{uf}_{abbreviation}"
+        with (
+            ZipFile(
+                directory / f"{name}.zip", "w", ZIP_DEFLATED, compresslevel=1
+            ) as archive,
+            archive.open(f"{name}.csv", "w", force_zip64=True) as handle,
+        ):
+            writer = pacsv.CSVWriter(
+                handle,
+                SCHEMA,
+                write_options=pacsv.WriteOptions(
+                    delimiter=";", quoting_style="none", quoting_header="none"
+                ),
+            )
+            for first in range(0, total, BATCH_ROWS):
+                size = min(BATCH_ROWS, total - first)
+                writer.write_table(address_batch(rng, towns, names, first, size))
+            writer.close()
+        written[f"{name}.zip"] = total
+    return written
+
+
+def write_release(root: Path, rows: int, seed: int = 0) -> Dict[str, int]:
+    """
+    Write a synthetic release of about `rows` addresses under `root`, at the
+    paths of the IBGE servers. Returns the row count of each file, keyed by
+    the path download.py and metadata.py fetch.
+    """
+    rng = np.random.default_rng(seed)
+    names = vocabulary(rng, 50_000)
+    municipalities = territory(rng, names)
+
+    cnefe = root / download.FTP_DIR.lstrip("/")
+    (cnefe / download.ADDRESSES_PATH).mkdir(parents=True, exist_ok=True)
+    (cnefe / download.DICTIONARY_PATH).write_bytes(b"Dicionario CNEFE 2022\n")
+    written = {
+        f"{download.ADDRESSES_PATH}/{name}": count
+        for name, count in write_addresses(
+            cnefe / download.ADDRESSES_PATH, municipalities, names, rows, seed
+        ).items()
+    }
+
+    dtb = root / metadata.FTP_DIR.lstrip("/")
+    dtb.mkdir(parents=True, exist_ok=True)
+    written[metadata.DTB_PATH] = write_dtb(dtb / metadata.DTB_PATH, municipalities)
+    return written
+
+
+if __name__ == "__main__":
+    root = Path(sys.argv[1])
+    written = write_release(root, *map(int, sys.argv[2:]))
+    print(f"Wrote {sum(written.values()):,} rows in {len(written)} files to {root}")
@@ -0,0 +1,162 @@
+"""
+Benchmark resolving the four territorial codes of a chunk into categorical
+names: the codes parsed as numbers and looked up with a binary search, as
+process_chunk does, against the previous strings mapped through dicts. Also
+times loading the lookups of a run, from the JSON mappings and from the
+compiled territory file.
+
+Usage: python benchmarks/territorial_lookup.py [rows] [repeat]
+"""
+
+import io
+import json
+import sys
+import tempfile
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.process_addresses import (
+    TERRITORIAL_COLUMNS,
+    build_lookups,
+    load_lookups,
+    load_mappings,
+    mapping_paths,
+)
+from scripts.territory import TERRITORY_FILENAME, write_territory
+
+# Territorial units in the 2024 DTB
+MUNICIPALITIES = 5_570
+DISTRICTS_PER_MUNICIPALITY = 2
+SUBDIVIDED = 0.05  # Share of districts divided into subdistricts
+
+CODE_COLUMNS = [code_column for code_column, _ in TERRITORIAL_COLUMNS.values()]
+
+
+def make_codes(rows: int, seed: int = 0):
+    """Mappings with the cardinality of the DTB and a CSV of the four code
+    columns of a chunk, skewed towards large municipalities."""
+    rng = np.random.default_rng(seed)
+    ufs = np.array([11, 12, 13, 14, 15, 16, 17, 21, 22, 23, 24, 25, 26, 27, 28])
+    ufs = np.concatenate([ufs, [29, 31, 32, 33, 35, 41, 42, 43, 50, 51, 52, 53]])
+    municipalities = rng.choice(ufs, MUNICIPALITIES) * 100_000 + np.arange(
+        MUNICIPALITIES
+    )
+    districts = (
+        municipalities[:, None] * 100 + 5 * np.arange(1, DISTRICTS_PER_MUNICIPALITY + 1)
+    ).ravel()
+    subdistricts = (
+        districts[rng.random(len(districts)) < SUBDIVIDED, None] * 100 + np.arange(1, 4)
+    ).ravel()
+    mappings = {
+        name: {str(code): f"{name} {code}" for code in codes}
+        for name, codes in [
+            ("state", ufs),
+            ("municipality", municipalities),
+            ("distrital", districts),
+            ("subdistrital", subdistricts),
+        ]
+    }
+
+    weights = rng.zipf(1.5, MUNICIPALITIES).astype(float)
+    municipality = rng.choice(municipalities, rows, p=weights / weights.sum())
+    district = municipality * 100 + 5 * rng.integers(1, 3, rows)
+    # Districts without subdistricts are coded with 00 in the CNEFE
+    subdistrict = district * 100 + np.where(
+        np.isin(district, subdistricts // 100), rng.integers(1, 4, rows), 0
+    )
+    frame = pd.DataFrame(
+        {
+            "COD_UF": municipality // 100_000,
+            "COD_MUNICIPIO": municipality,
+            "COD_DISTRITO": district,
+            "COD_SUBDISTRITO": subdistrict,
+        }
+    )
+    return mappings, frame.to_csv(sep=";", index=False)
+
+
+def build_dict_lookups(mappings):
+    """Previous lookups: string code -> category code, built once per run."""
+    lookups = {}
+    for column, (code_column, name) in TERRITORIAL_COLUMNS.items():
+        names = sorted(set(mappings[name].values()))
+        position = {value: index for index, value in enumerate(names)}
+        categories = {code: position[value] for code, value in mappings[name].items()}
+        lookups[column] = (code_column, categories, pd.CategoricalDtype(names))
+    return lookups
+
+
+def resolve_with_dicts(df: pd.DataFrame, lookups) -> pd.DataFrame:
+    """Previous implementation: string codes hashed into per-level dicts."""
+    result = {}
+    for column, (code_column, categories, dtype) in lookups.items():
+        codes = df[code_column].map(categories).fillna(-1)
+        result[column] = pd.Categorical.from_codes(codes.astype("int32"), dtype=dtype)
+    return pd.DataFrame(result)
+
+
+def resolve_with_search(df: pd.DataFrame, lookups) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            column: pd.Categorical.from_codes(
+                lookup.category_codes(df[lookup.code_column]), dtype=lookup.dtype
+            )
+            for column, lookup in lookups.items()
+        }
+    )
+
+
+def main(rows: int = 250_000, repeat: int = 5):
+    mappings, text = make_codes(rows)
+    lookups, dict_lookups = build_lookups(mappings), build_dict_lookups(mappings)
+
+    def read(dtype: str) -> pd.DataFrame:
+        return pd.read_csv(
+            io.StringIO(text), sep=";", dtype={c: dtype for c in CODE_COLUMNS}
+        )
+
+    strings, numbers = read("string"), read("float")
+    assert resolve_with_dicts(strings, dict_lookups).equals(
+        resolve_with_search(numbers, lookups)
+    )
+
+    def best(step) -> float:
+        return min(timeit.repeat(step, number=1, repeat=repeat))
+
+    parse = {
+        dtype: best(lambda dtype=dtype: read(dtype))
+        for dtype in ["string", "Int64", "float"]
+    }
+    previous = best(lambda: resolve_with_dicts(strings, dict_lookups))
+    current = best(lambda: resolve_with_search(numbers, lookups))
+
+    with tempfile.TemporaryDirectory() as metadata:
+        metadata = Path(metadata)
+        for name, path in mapping_paths(metadata).items():
+            path.write_text(json.dumps(mappings[name]), encoding="utf-8")
+        from_json = best(lambda: build_lookups(load_mappings(metadata)))
+        write_territory(mappings, metadata / TERRITORY_FILENAME)
+        compiled = best(lambda: load_lookups(metadata))
+
+    print(f"rows per chunk: {rows:,}")
+    print(
+        f"parse   string {parse['string']:.3f} s, Int64 {parse['Int64']:.3f} s, "
+        f"float {parse['float']:.3f} s"
+    )
+    print(f"resolve dict   {previous:.3f} s, search {current:.3f} s")
+    print(
+        f"load    json   {from_json * 1000:.1f} ms, territory {compiled * 1000:.1f} ms"
+    )
+    print(
+        f"total   {parse['string'] + previous:.3f} s -> "
+        f"{parse['float'] + current:.3f} s "
+        f"({(parse['string'] + previous) / (parse['float'] + current):.1f}x)"
+    )
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
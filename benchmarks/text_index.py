@@ -0,0 +1,141 @@
+"""
+Benchmark the build time and search latency of the text index on synthetic
+processed CSVs with a national number of streets.
+
+Usage: python benchmarks/text_index.py [documents] [queries]
+"""
+
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from addresses.infrastructure import text_index
+
+FILES = 27
+MUNICIPALITIES = 5_570
+ROWS_PER_DOCUMENT = 2  # Few, to keep the store small: rows do not affect search
+STREET_TYPES = ["RUA"] * 14 + ["AVENIDA", "AVENIDA", "TRAVESSA", "ESTRADA"]
+CONNECTORS = ["DE", "DA", "DO", "DAS", "DOS"]
+ONSETS = "b c d f g j l m n p r s t v x z ch lh nh qu gu br tr pr cr gr fl pl".split()
+VOWELS = list("aeiouãõáéíóúâêô")
+CODAS = ["", "", "", "s", "r", "l", "n", "m"]
+
+
+def words(rng, count: int):
+    """Distinct made-up words of 2 to 4 syllables."""
+    syllables = [o + v + c for o in ONSETS for v in VOWELS for c in CODAS]
+    syllables += VOWELS
+    lengths = rng.integers(2, 5, count)
+    unique = sorted({"".join(rng.choice(syllables, n)).upper() for n in lengths})
+    return rng.permutation(unique)
+
+
+def documents_frame(rng, vocabulary, cities: np.ndarray, count: int):
+    # Skewed like real names: a few words (SÃO, SANTA...) are everywhere
+    ranks = np.minimum(rng.zipf(1.2, (count, 3)), len(vocabulary)) - 1
+    sizes = rng.choice([1, 2, 3], count, p=[0.3, 0.5, 0.2])
+    connectors = rng.choice(CONNECTORS, count)
+    names = [
+        " ".join(
+            [vocabulary[ranks[i, 0]], connectors[i], *vocabulary[ranks[i, 1:size]]]
+            if size > 1
+            else [vocabulary[ranks[i, 0]]]
+        )
+        for i, size in enumerate(sizes.tolist())
+    ]
+    return pd.DataFrame(
+        {
+            "ESTADO": "São Paulo",
+            "MUNICIPIO": np.sort(rng.choice(cities, count)),
+            "BAIRRO": vocabulary[rng.integers(0, 2_000, count)],
+            "TIPO_LOGRADOURO": rng.choice(STREET_TYPES, count),
+            "RUA": names,
+        }
+    )
+
+
+def write_store(store: Path, documents: int, sample: int, seed: int = 0):
+    """Write FILES processed CSVs, each with its own municipalities, and
+    return `sample` of their documents."""
+    rng = np.random.default_rng(seed)
+    vocabulary = words(rng, 40_000)
+    cities = np.array(
+        [f"{a} {b}" for a, b in rng.choice(vocabulary, (MUNICIPALITIES, 2))]
+    )
+
+    samples, first = [], 0
+    for number, part in enumerate(np.array_split(cities, FILES)):
+        frame = documents_frame(rng, vocabulary, part, documents // FILES)
+        rows = frame.loc[frame.index.repeat(ROWS_PER_DOCUMENT)]
+        rows.insert(0, "ID_ENDERECO", np.arange(first, first + len(rows)).astype(str))
+        rows.to_csv(store / f"{number:02d}.csv", index=False)
+        samples.append(frame.sample(-(-sample // FILES), random_state=number))
+        first += len(rows)
+    return pd.concat(samples).sample(sample, random_state=0)
+
+
+def typo(text: str, rng) -> str:
+    """Swap two adjacent letters."""
+    at, letters = rng.integers(0, len(text) - 1), list(text)
+    letters[at], letters[at + 1] = letters[at + 1], letters[at]
+    return "".join(letters)
+
+
+def measure(index, queries):
+    """Latency percentiles, and how often the street is in the top 10."""
+    seconds, hits = [], 0
+    for expected, text, municipality in queries:
+        start = time.perf_counter()
+        found = index.search(text, municipality=municipality)
+        seconds.append(time.perf_counter() - start)
+        hits += any((m.street, m.municipality) == expected for m in found)
+    return np.percentile(np.array(seconds) * 1000, [50, 95, 99]), hits / len(queries)
+
+
+def main(documents: int = 4_000_000, queries: int = 300):
+    workdir = Path(tempfile.mkdtemp())
+    try:
+        store = workdir / "processed"
+        store.mkdir()
+        sample = write_store(store, documents, queries)
+
+        start = time.perf_counter()
+        index = text_index.build(store, workdir / "index")
+        print(
+            f"build: {time.perf_counter() - start:.1f} s for {documents:,} "
+            f"documents, {documents * ROWS_PER_DOCUMENT:,} rows"
+        )
+        size = sum(f.stat().st_size for f in (workdir / "index").iterdir())
+        print(f"index size: {size / 1024**2:.0f} MB")
+
+        rng = np.random.default_rng(1)
+        for label, mistakes in [("exact", False), ("one typo", True)]:
+            streets = sample["RUA"].map(lambda street: typo(street, rng))
+            streets = streets if mistakes else sample["RUA"]
+            expected = list(zip(sample["RUA"], sample["MUNICIPIO"]))
+            # The city in the text, or as a filter
+            for scope, cases in [
+                (
+                    "city in text",
+                    zip(
+                        expected, streets + " " + sample["MUNICIPIO"], [None] * queries
+                    ),
+                ),
+                ("city filter", zip(expected, streets, sample["MUNICIPIO"])),
+            ]:
+                (p50, p95, p99), recall = measure(index, list(cases))
+                print(
+                    f"{label}, {scope}: p50 {p50:.1f} ms | p95 {p95:.1f} ms | "
+                    f"p99 {p99:.1f} ms | found in top 10: {recall:.0%}"
+                )
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
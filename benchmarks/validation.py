@@ -0,0 +1,102 @@
+"""
+Measure the cost of the validation rules relative to processing a chunk.
+
+Usage: python benchmarks/validation.py [rows] [repeat]
+"""
+
+import io
+import sys
+import timeit
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from complement import make_chunk as make_complements
+
+from scripts.process_addresses import (
+    DTYPES,
+    build_lookups,
+    check_rules,
+    process_chunk,
+    rejection_reasons,
+)
+
+INVALID_RATE = 0.01  # Share of rows breaking some rule
+
+
+def make_chunk(rows: int, seed: int = 0):
+    """A raw CNEFE chunk, typed as read_chunks returns it, and its mappings."""
+    rng = np.random.default_rng(seed)
+    municipalities = [f"11{i:05d}" for i in range(50)]
+    mappings = {
+        "state": {"11": "Rondônia"},
+        "municipality": {code: f"Município {code}" for code in municipalities},
+        "distrital": {f"{code}05": f"Distrito {code}" for code in municipalities},
+        "subdistrital": {},
+    }
+    municipality = rng.choice(municipalities, rows)
+    invalid = rng.random(rows) < INVALID_RATE
+
+    df = pd.DataFrame(
+        {
+            "COD_UNICO_ENDERECO": np.arange(rows).astype(str),
+            "COD_UF": "11",
+            "COD_MUNICIPIO": municipality,
+            "COD_DISTRITO": np.char.add(municipality.astype(str), "05"),
+            "COD_SUBDISTRITO": np.char.add(municipality.astype(str), "0500"),
+            "NUM_ENDERECO": np.where(invalid, None, rng.integers(1, 3000, rows)),
+            "LATITUDE": rng.uniform(-13, -8, rows),
+            "DSC_MODIFICADOR": np.where(rng.random(rows) < 0.05, "SN", None),
+            "DSC_LOCALIDADE": "CENTRO",
+            "CEP": np.where(invalid, "7680", "76801000"),
+            "NOM_TIPO_SEGLOGR": rng.choice(["RUA", "AVENIDA"], rows),
+            "LONGITUDE": rng.uniform(-66, -60, rows),
+            "NOM_SEGLOGR": rng.choice(5000, rows).astype(str),
+            "COD_ESPECIE": rng.integers(1, 9, rows),
+            "NV_GEO_COORD": rng.integers(1, 7, rows),
+        }
+    )
+    df = pd.concat([df, make_complements(rows, seed)], axis=1)
+    df = df.astype({column: DTYPES[column] for column in df if column in DTYPES})
+    return df, mappings
+
+
+def main(rows: int = 250_000, repeat: int = 5):
+    chunk, mappings = make_chunk(rows)
+    lookups = build_lookups(mappings)
+
+    def process():
+        return process_chunk(chunk.copy(), lookups)
+
+    def process_and_validate():
+        processed = process()
+        reasons = rejection_reasons(check_rules(processed))
+        return processed.drop(index=reasons.index)
+
+    assert len(process()) - len(process_and_validate()) > 0
+
+    print(f"rows per chunk: {rows:,}")
+    for name, step in [
+        ("process_chunk", lambda processed: processed),
+        ("with CSV write", lambda processed: processed.to_csv(io.StringIO())),
+    ]:
+        baseline = min(
+            timeit.repeat(lambda step=step: step(process()), number=1, repeat=repeat)
+        )
+        validated = min(
+            timeit.repeat(
+                lambda step=step: step(process_and_validate()),
+                number=1,
+                repeat=repeat,
+            )
+        )
+        print(
+            f"{name:<15} {baseline:.3f} s -> {validated:.3f} s with validation "
+            f"({(validated - baseline) / baseline:+.1%})"
+        )
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
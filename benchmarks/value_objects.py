@@ -0,0 +1,92 @@
+"""
+Memory held by Address aggregates built one by one versus with interned
+TerritorialDivision and PostalCode instances.
+
+Usage: python benchmarks/value_objects.py [addresses] [--no-intern]
+"""
+
+import sys
+import time
+import tracemalloc
+
+import numpy as np
+
+from addresses.domain import value_objects
+from addresses.domain.aggregates import Address
+from addresses.domain.value_objects import (
+    AddressSpecies,
+    Coordinate,
+    GeocodingLevel,
+    PostalCode,
+    StreetAddress,
+    TerritorialDivision,
+)
+
+MUNICIPALITIES = 5_570
+POSTAL_CODES = 900_000
+
+
+def build(addresses: int, intern: bool):
+    # Start from empty caches, so their memory is counted in each run
+    value_objects._DIVISIONS.clear()
+    value_objects._POSTAL_CODES.clear()
+
+    rng = np.random.default_rng(0)
+    municipality = rng.choice(MUNICIPALITIES, addresses).tolist()
+    postal_code = rng.choice(POSTAL_CODES, addresses).tolist()
+    latitude = rng.uniform(-33, 5, addresses).tolist()
+    longitude = rng.uniform(-73, -35, addresses).tolist()
+    division = TerritorialDivision.of if intern else TerritorialDivision
+    cep = PostalCode.of if intern else PostalCode
+
+    # Names are read from a file in practice: new strings for every row
+    return [
+        Address(
+            id=str(i),
+            territorial_division=division(
+                "SP",
+                f"Município {municipality[i]}",
+                f"Distrito {municipality[i]}",
+                "",
+            ),
+            street_address=StreetAddress(
+                street=f"RUA {i % 20_000}",
+                street_type="RUA",
+                number=str(i % 3_000),
+                complement="",
+                neighborhood=f"BAIRRO {i % 2_000}",
+            ),
+            postal_code=cep(f"{postal_code[i] + 10_000_000:08d}"[:5] + "-000"),
+            coordinate=Coordinate(
+                latitude=latitude[i],
+                longitude=longitude[i],
+                precision=GeocodingLevel.ORIGINAL,
+            ),
+            species=AddressSpecies.RESIDENTIAL,
+        )
+        for i in range(addresses)
+    ]
+
+
+def main(addresses: int = 1_000_000, intern: bool = True):
+    # Timed apart: tracemalloc slows every allocation down
+    start = time.perf_counter()
+    aggregates = build(addresses, intern)
+    elapsed = time.perf_counter() - start
+    del aggregates
+
+    tracemalloc.start()
+    aggregates = build(addresses, intern)
+    megabytes = tracemalloc.get_traced_memory()[0] / 1024**2
+    tracemalloc.stop()
+    del aggregates
+    print(f"addresses: {addresses:,} ({'interned' if intern else 'plain'})")
+    print(
+        f"held:      {megabytes:.0f} MB ({megabytes * 1024**2 / addresses:.0f} B each)"
+    )
+    print(f"build:     {elapsed:.1f} s")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith("--")]
+    main(*(int(arg) for arg in args[:1]), intern="--no-intern" not in sys.argv)
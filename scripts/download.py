@@ -1,10 +1,17 @@
-import sys
+import argparse
+import ftplib
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from ftplib import FTP
-from pathlib import Path
+from pathlib import Path, PurePosixPath
+from typing import List, Optional
 
 from tqdm import tqdm
 
+from scripts import instrumentation
+
 FTP_HOST = "ftp.ibge.gov.br"
+FTP_PORT = 21
 FTP_DIR = (
     "/Cadastro_Nacional_de_Enderecos_para_Fins_Estatisticos/"
     "Censo_Demografico_2022/Arquivos_CNEFE/CSV"
@@ -12,20 +19,114 @@ FTP_DIR = (
 DICTIONARY_PATH = "Dicionario_CNEFE_Censo_2022.xls"
 ADDRESSES_PATH = "UF"
 CHUNK_SIZE = 1024 * 1024 * 100  # 100 MB
+PARTIAL_SUFFIX = ".part"
+
+WORKERS = 4  # Concurrent FTP sessions
+MAX_RETRIES = 3  # Attempts per file, reconnecting after each failure
 
 
-def download_file(ftp: FTP, remote_path: str, local_path: Path):
-    """Download a file with tqdm progress bar."""
+def connect() -> FTP:
+    """Open an anonymous session in the CNEFE directory."""
+    ftp = FTP(timeout=60)
+    ftp.connect(FTP_HOST, FTP_PORT)
+    ftp.login()
+    ftp.cwd(FTP_DIR)
+    return ftp
+
+
+class ConnectionPool:
+    """
+    Bounded pool of FTP sessions, one per worker thread.
+
+    Each thread also gets a fixed slot, used as the position of its tqdm bar.
+    """
+
+    def __init__(self):
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._connections: List[FTP] = []
+        self._slots = 0
+
+    def get(self) -> FTP:
+        """Return the session of the calling thread, connecting if needed."""
+        if getattr(self._local, "ftp", None) is None:
+            self._local.ftp = connect()
+            with self._lock:
+                self._connections.append(self._local.ftp)
+        return self._local.ftp
+
+    def discard(self):
+        """Drop the session of the calling thread after a failure."""
+        ftp = getattr(self._local, "ftp", None)
+        if ftp is None:
+            return
+        self._local.ftp = None
+        with self._lock:
+            self._connections.remove(ftp)
+        ftp.close()
+
+    def slot(self) -> int:
+        if getattr(self._local, "slot", None) is None:
+            with self._lock:
+                self._slots += 1
+                self._local.slot = self._slots
+        return self._local.slot
+
+    def close(self):
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for ftp in connections:
+            try:
+                ftp.quit()
+            except ftplib.all_errors:
+                ftp.close()
+
+
+def is_downloaded(local_path: Path, size: Optional[int]) -> bool:
+    """
+    Whether `local_path` exists with the `size` of the remote file. A file
+    whose size the server did not report (None) is downloaded again.
+    """
+    return (
+        size is not None and local_path.exists() and local_path.stat().st_size == size
+    )
+
+
+def download_file(
+    ftp: FTP, remote_path: str, local_path: Path, position: Optional[int] = None
+):
+    """
+    Download a file with tqdm progress bar.
+
+    Data goes to a ".part" file that is resumed from its current size when a
+    previous transfer was interrupted, and only renamed to `local_path` once
+    its size matches the remote one. Without a remote size, neither can be
+    checked, so the file is downloaded in full and renamed as is.
+    """
     total_size = ftp.size(remote_path)
+    partial_path = local_path.with_name(local_path.name + PARTIAL_SUFFIX)
+
+    offset = partial_path.stat().st_size if partial_path.exists() else 0
+    if total_size is None or offset > total_size:
+        # Unknown size, or left over from a different version of the remote file
+        offset = 0
+    elif offset and offset == total_size:
+        # Interrupted before the rename: many servers refuse a REST at the end
+        partial_path.replace(local_path)
+        return
+
     with (
-        open(local_path, "wb") as f,
+        instrumentation.measure("download_file", file=local_path.name) as measured,
+        open(partial_path, "ab" if offset else "wb") as f,
         tqdm(
             total=total_size,
+            initial=offset,
             unit="B",
             unit_scale=True,
             unit_divisor=1024,
             desc=local_path.name,
             leave=False,
+            position=position,
         ) as pbar,
     ):
 
@@ -33,43 +134,103 @@ def download_file(ftp: FTP, remote_path: str, local_path: Path):
             f.write(data)
             pbar.update(len(data))
 
-        ftp.retrbinary(f"RETR {remote_path}", callback, blocksize=CHUNK_SIZE)
+        ftp.retrbinary(
+            f"RETR {remote_path}", callback, blocksize=CHUNK_SIZE, rest=offset or None
+        )
+        measured.nbytes = pbar.n - offset
+
+    downloaded_size = partial_path.stat().st_size
+    if total_size is not None and downloaded_size != total_size:
+        raise OSError(f"{remote_path}: got {downloaded_size} of {total_size} bytes")
+    partial_path.replace(local_path)
+
+
+def fetch(pool: ConnectionPool, remote_path: str, local_path: Path):
+    """Download a file through the pool, reconnecting after failures."""
+    for attempt in range(1, MAX_RETRIES + 1):
+        try:
+            ftp = pool.get()
+            # SIZE is refused in ASCII mode by some servers
+            ftp.voidcmd("TYPE I")
+            download_file(ftp, remote_path, local_path, position=pool.slot())
+            return
+        except ftplib.all_errors:
+            pool.discard()
+            if attempt == MAX_RETRIES:
+                raise
+
+
+def remote_files(ftp: FTP) -> List[str]:
+    """
+    Paths of the dictionary and the UF ZIPs on the server. Servers differ on
+    whether NLST returns full paths or bare names, so the path is rebuilt.
+    """
+    return [DICTIONARY_PATH] + [
+        f"{ADDRESSES_PATH}/{PurePosixPath(name).name}"
+        for name in ftp.nlst(ADDRESSES_PATH)
+    ]
 
 
-def main(destination: Path):
-    ftp = FTP(FTP_HOST, timeout=60)
-    ftp.login()
-    ftp.cwd(FTP_DIR)
+def download_all(destination: Path, workers: int = WORKERS) -> int:
+    """Download the files missing from `destination`; returns their size."""
+    ftp = connect()
 
     Path(destination).mkdir(exist_ok=True, parents=True)
 
-    # Already downloaded files
-    downloaded = [f.name for f in Path(destination).rglob("*")]
-
-    # Collect all files to download (dictionary + ZIPs)
-    files_to_download = [DICTIONARY_PATH]
-    addresses_zip_files = ftp.nlst(ADDRESSES_PATH)
-    files_to_download.extend(addresses_zip_files)
+    files_to_download = remote_files(ftp)
 
-    # Filter out already downloaded
+    # Filter out files already downloaded in full
+    ftp.voidcmd("TYPE I")
     files_to_download = [
-        f for f in files_to_download if Path(destination, f).name not in downloaded
+        f
+        for f in files_to_download
+        if not is_downloaded(Path(destination, f), ftp.size(f))
     ]
+    ftp.quit()
 
     print(f"Downloading {len(files_to_download)} files...")
 
+    pool = ConnectionPool()
+
     # Overall progress bar
-    with tqdm(total=len(files_to_download), desc="Total", unit="file") as overall_pbar:
-        for filename in files_to_download:
-            local_path = Path(destination, filename)
-            local_path.parent.mkdir(exist_ok=True, parents=True)
-            download_file(ftp, filename, local_path)
-            overall_pbar.update(1)
+    try:
+        with (
+            tqdm(
+                total=len(files_to_download), desc="Total", unit="file", position=0
+            ) as overall_pbar,
+            ThreadPoolExecutor(max_workers=workers) as executor,
+        ):
+            futures = []
+            for filename in files_to_download:
+                local_path = Path(destination, filename)
+                local_path.parent.mkdir(exist_ok=True, parents=True)
+                futures.append(executor.submit(fetch, pool, filename, local_path))
 
-    ftp.quit()
+            for future in as_completed(futures):
+                future.result()
+                overall_pbar.update(1)
+    finally:
+        pool.close()
+
+    return sum(Path(destination, f).stat().st_size for f in files_to_download)
+
+
+def main(destination: Path, workers: int = WORKERS):
+    with instrumentation.stage("download") as measured:
+        measured.nbytes = download_all(destination, workers)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        sys.exit("Usage: python download_cnefe.py <destination>")
-    main(Path(sys.argv[1]))
+    parser = argparse.ArgumentParser(description="Download the CNEFE files.")
+    parser.add_argument("destination", type=Path)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=WORKERS,
+        help=f"Number of concurrent FTP sessions (default: {WORKERS})",
+    )
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrumentation.configure(args.metrics, args.profile)
+    main(args.destination, workers=args.workers)
@@ -1,39 +1,167 @@
-import sys
+import argparse
+import json
+import multiprocessing
+import os
+import zlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from pathlib import Path
-from zipfile import BadZipFile, ZipFile
+from typing import Dict, Optional
+from zipfile import BadZipFile, ZipFile, ZipInfo
 
+from scripts import instrumentation
 
-def main(source: Path, destination: Path, extension=None):
+# Members verified in previous runs, kept at the root of the destination
+MANIFEST_FILENAME = ".extracted.json"
+READ_SIZE = 1024 * 1024  # 1 MB
+
+
+def load_manifest(destination: Path) -> Dict[str, Dict[str, int]]:
+    path = Path(destination, MANIFEST_FILENAME)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_manifest(destination: Path, manifest: Dict[str, Dict[str, int]]):
+    path = Path(destination, MANIFEST_FILENAME)
+    tmp_path = path.with_name(path.name + ".tmp")
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    tmp_path.replace(path)
+
+
+def file_crc32(path: Path) -> int:
+    crc = 0
+    with open(path, "rb") as f:
+        while data := f.read(READ_SIZE):
+            crc = zlib.crc32(data, crc)
+    return crc
+
+
+def is_extracted(info: ZipInfo, target: Path, entry: Optional[Dict[str, int]]) -> bool:
+    """
+    Whether `target` already holds the content of the `info` member.
+
+    A file recorded in the manifest and untouched since is trusted without
+    reading it; any other file is checked against the CRC in the ZIP directory.
+    """
+    if not target.exists():
+        return False
+    stat = target.stat()
+    if stat.st_size != info.file_size:
+        return False
+    if entry == {"size": info.file_size, "crc": info.CRC, "mtime": stat.st_mtime_ns}:
+        return True
+    return file_crc32(target) == info.CRC
+
+
+def extract_archive(
+    file_path: Path,
+    destination: Path,
+    extension: Optional[str],
+    manifest: Dict[str, Dict[str, int]],
+) -> Dict[str, Dict[str, int]]:
+    """
+    Extract the members of one archive matching `extension` and return their
+    manifest entries. The CRC of every inflated member is checked by
+    `zipfile`, which raises `BadZipFile` on mismatch.
+    """
+    entries = {}
+    with ZipFile(file_path, "r") as ref:
+        for info in ref.infolist():
+            if info.is_dir():
+                continue
+            if (
+                extension is not None
+                and Path(info.filename).suffix.lower() != extension
+            ):
+                continue
+
+            target = Path(destination, info.filename)
+            if not is_extracted(info, target, manifest.get(info.filename)):
+                with instrumentation.measure(
+                    "extract_member", file=info.filename
+                ) as measured:
+                    ref.extract(info, destination)
+                    measured.nbytes = info.file_size
+
+            entries[info.filename] = {
+                "size": info.file_size,
+                "crc": info.CRC,
+                "mtime": target.stat().st_mtime_ns,
+            }
+    return entries
+
+
+def extract_all(
+    source: Path, destination: Path, extension=None, workers: Optional[int] = None
+) -> int:
     """
     Extract files from zip archives in `source` to `destination`.
-    Only extracts files with specified `extensions`.
+    Only extracts files with specified `extensions`. Returns the size of the
+    archives. By default, one archive is extracted per CPU.
     """
     Path(destination).mkdir(exist_ok=True, parents=True)
 
     # List all zip files in source recursively
     files = [file for file in Path(source).rglob("*.zip")]
+    if workers is None:
+        workers = min(os.cpu_count() or 1, len(files))
+
+    # Members already extracted and verified, to avoid duplicates
+    manifest = load_manifest(destination)
+
+    if workers <= 1:
+        for file_path in files:
+            try:
+                manifest.update(
+                    extract_archive(file_path, destination, extension, manifest)
+                )
+            except BadZipFile:
+                print(f"{file_path} file is corrupted.")
+        save_manifest(destination, manifest)
+        return sum(file_path.stat().st_size for file_path in files)
 
-    # List already extracted files to avoid duplicates
-    extracted = [file.name for file in Path(destination).rglob("*")]
+    with ProcessPoolExecutor(
+        max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+    ) as executor:
+        futures = {
+            executor.submit(
+                extract_archive, file_path, destination, extension, manifest
+            ): file_path
+            for file_path in files
+        }
+        for future in as_completed(futures):
+            try:
+                manifest.update(future.result())
+            except BadZipFile:
+                print(f"{futures[future]} file is corrupted.")
 
-    for file_path in files:
-        try:
-            with ZipFile(file_path, "r") as ref:
-                content_list = ref.namelist()
-                # Filter files by extension and skip already extracted
-                extract_files = [
-                    content
-                    for content in content_list
-                    if Path(content).suffix.lower() == extension
-                    and Path(content).name not in extracted
-                ]
+    save_manifest(destination, manifest)
+    return sum(file_path.stat().st_size for file_path in files)
 
-                for file in extract_files:
-                    ref.extract(file, destination)
-        except BadZipFile:
-            print(f"{file_path} file is corrupted.")
-            continue
+
+def main(
+    source: Path, destination: Path, extension=None, workers: Optional[int] = None
+):
+    with instrumentation.stage("extract") as measured:
+        measured.nbytes = extract_all(source, destination, extension, workers)
 
 
 if __name__ == "__main__":
-    main(Path(sys.argv[1]), Path(sys.argv[2]), str(sys.argv[3]))
+    parser = argparse.ArgumentParser(description="Extract files from ZIP archives.")
+    parser.add_argument("source", type=Path)
+    parser.add_argument("destination", type=Path)
+    parser.add_argument("extension", help="Extension of the members, e.g. .csv")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        help="Number of archives extracted concurrently (default: one per CPU, "
+        "at most one per archive)",
+    )
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrumentation.configure(args.metrics, args.profile)
+    main(args.source, args.destination, args.extension, workers=args.workers)
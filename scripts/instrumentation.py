@@ -0,0 +1,194 @@
+"""
+Structured metrics of the pipeline: wall time, bytes, rows per second and peak
+memory of each stage and of its hot functions, appended to a JSON-lines file.
+
+Nothing is recorded unless `configure` is given a metrics file. The settings
+live in environment variables, so the worker processes spawned by a stage
+inherit them and append their own records to the same file.
+"""
+
+import argparse
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, Optional, TypeVar
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+METRICS_ENV = "CNEFE_METRICS"  # JSON-lines file the records are appended to
+PROFILE_ENV = "CNEFE_PROFILE"  # Directory of the cProfile dump of each stage
+STAGE_ENV = "CNEFE_STAGE"  # Stage running, recorded with every span
+
+T = TypeVar("T")
+
+# Download threads share the file
+_lock = threading.Lock()
+
+
+@dataclass
+class Measurement:
+    """Counts of the work done in a measured block, set by the block itself."""
+
+    rows: Optional[int] = None
+    nbytes: Optional[int] = None
+
+
+def configure(metrics: Optional[Path], profile: Optional[Path] = None):
+    """
+    Record metrics to `metrics` and dump a profile of each stage to `profile`,
+    in this process and the workers it starts. None disables either.
+    """
+    for name, path in [(METRICS_ENV, metrics), (PROFILE_ENV, profile)]:
+        if path is None:
+            os.environ.pop(name, None)
+        else:
+            os.environ[name] = str(Path(path).resolve())
+    if metrics is not None:
+        Path(metrics).parent.mkdir(exist_ok=True, parents=True)
+    if profile is not None:
+        Path(profile).mkdir(exist_ok=True, parents=True)
+
+
+def add_arguments(parser: argparse.ArgumentParser):
+    """The `--metrics` and `--profile` options of a stage, for `configure`."""
+    parser.add_argument(
+        "--metrics", type=Path, help="Append JSON-lines metrics of the run here"
+    )
+    parser.add_argument(
+        "--profile", type=Path, help="Directory for a cProfile dump of the stage"
+    )
+
+
+def enabled() -> bool:
+    return METRICS_ENV in os.environ
+
+
+def peak_rss_mb() -> Optional[float]:
+    """
+    Peak RSS of this process so far. Linux keeps ru_maxrss across exec, so a
+    spawned worker would report the peak of its parent if it were higher; the
+    VmHWM of /proc is the worker's own.
+    """
+    try:
+        with open("/proc/self/status", encoding="ascii") as status:
+            for line in status:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _rate(count: Optional[int], seconds: float) -> Optional[float]:
+    return count / seconds if count is not None and seconds > 0 else None
+
+
+def _write(
+    name: str,
+    start: float,
+    seconds: float,
+    measurement: Measurement,
+    attributes: Dict[str, object],
+):
+    record = {
+        "name": name,
+        "stage": os.environ.get(STAGE_ENV),
+        "pid": os.getpid(),
+        "start": start,
+        "seconds": seconds,
+        "rows": measurement.rows,
+        "bytes": measurement.nbytes,
+        "rows_per_second": _rate(measurement.rows, seconds),
+        "bytes_per_second": _rate(measurement.nbytes, seconds),
+        "peak_rss_mb": peak_rss_mb(),
+        **attributes,
+    }
+    line = json.dumps(record, default=str) + "\n"
+    # A single write per record keeps lines of concurrent processes whole
+    with _lock, open(os.environ[METRICS_ENV], "a", encoding="utf-8") as f:
+        f.write(line)
+
+
+@contextmanager
+def measure(name: str, **attributes) -> Iterator[Measurement]:
+    """
+    Time the block and, when metrics are enabled, record it with the counts
+    it sets on the yielded `Measurement` and the given attributes. Blocks
+    raising an exception are not recorded.
+    """
+    measurement = Measurement()
+    if not enabled():
+        yield measurement
+        return
+
+    start, begin = time.time(), time.perf_counter()
+    yield measurement
+    _write(name, start, time.perf_counter() - begin, measurement, attributes)
+
+
+def iterate(
+    name: str,
+    items: Iterable[T],
+    position: Optional[Callable[[], int]] = None,
+    **attributes,
+) -> Iterator[T]:
+    """
+    Yield the items of `items`, recording the time taken to produce each one
+    and its length as rows. `position`, e.g. the `tell` of the file being
+    parsed, gives the bytes consumed for each item.
+    """
+    if not enabled():
+        yield from items
+        return
+
+    iterator = iter(items)
+    while True:
+        start, begin = time.time(), time.perf_counter()
+        offset = position() if position else None
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        seconds = time.perf_counter() - begin
+        measurement = Measurement(
+            rows=len(item), nbytes=position() - offset if position else None
+        )
+        _write(name, start, seconds, measurement, attributes)
+        yield item
+
+
+@contextmanager
+def stage(name: str) -> Iterator[Measurement]:
+    """
+    Measure a whole stage of the pipeline, as `measure`. Spans recorded
+    meanwhile, here or in workers started by the stage, carry its name. With
+    a profile directory configured, the stage is run under cProfile and the
+    statistics dumped to `<directory>/<name>.prof`; work done in worker
+    processes is not part of it.
+    """
+    previous = os.environ.get(STAGE_ENV)
+    os.environ[STAGE_ENV] = name
+    profiler = cProfile.Profile() if PROFILE_ENV in os.environ else None
+    try:
+        if profiler is not None:
+            profiler.enable()
+        with measure(name) as measurement:
+            yield measurement
+    finally:
+        if profiler is not None:
+            profiler.disable()
+            profiler.dump_stats(Path(os.environ[PROFILE_ENV], f"{name}.prof"))
+        if previous is None:
+            os.environ.pop(STAGE_ENV, None)
+        else:
+            os.environ[STAGE_ENV] = previous
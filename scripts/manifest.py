@@ -0,0 +1,116 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, Iterable, Optional
+
+# Leading underscore: ignored by Parquet dataset readers sharing the directory
+MANIFEST_FILENAME = "_manifest.json"
+READ_SIZE = 1024 * 1024  # 1 MB
+
+Fingerprint = Dict[str, object]
+
+
+def code_version(*sources: Path, **options) -> str:
+    """Hash of a stage's source code and of the options shaping its outputs."""
+    digest = hashlib.sha256()
+    for source in sources:
+        digest.update(Path(source).read_bytes())
+    digest.update(json.dumps(options, sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def fingerprint(
+    path: Path, previous: Optional[Fingerprint] = None
+) -> Optional[Fingerprint]:
+    """
+    Size, mtime and SHA-256 of `path`, or None if it does not exist.
+
+    The hash of `previous` is reused when size and mtime are unchanged, so
+    untouched inputs are not read again on every run.
+    """
+    path = Path(path)
+    if not path.exists():
+        return None
+
+    stat = path.stat()
+    if (
+        previous is not None
+        and previous.get("size") == stat.st_size
+        and previous.get("mtime") == stat.st_mtime_ns
+    ):
+        return previous
+
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while data := f.read(READ_SIZE):
+            digest.update(data)
+    return {
+        "size": stat.st_size,
+        "mtime": stat.st_mtime_ns,
+        "sha256": digest.hexdigest(),
+    }
+
+
+def _content(inputs: Dict[str, Optional[Fingerprint]]) -> Dict[str, Fingerprint]:
+    # A touched but identical input (new mtime, same hash) is still current
+    return {
+        name: fp and {key: value for key, value in fp.items() if key != "mtime"}
+        for name, fp in inputs.items()
+    }
+
+
+class Manifest:
+    """
+    Inputs, code version and outputs of each unit of work of a stage (e.g.
+    one UF file), stored as JSON next to the stage outputs.
+    """
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.entries: Dict[str, Dict] = {}
+        if self.path.exists():
+            with open(self.path, "r", encoding="utf-8") as f:
+                self.entries = json.load(f)
+
+    def previous_inputs(self, key: str) -> Dict[str, Fingerprint]:
+        return self.entries.get(key, {}).get("inputs", {})
+
+    def is_current(
+        self, key: str, inputs: Dict[str, Optional[Fingerprint]], version: str
+    ) -> bool:
+        """Whether `key` was built from the same inputs and code, and its
+        outputs are still in place."""
+        entry = self.entries.get(key)
+        if entry is None or entry["version"] != version:
+            return False
+        if any(fp is None for fp in inputs.values()):
+            return False
+        if _content(entry["inputs"]) != _content(inputs):
+            return False
+        return all((self.path.parent / output).exists() for output in entry["outputs"])
+
+    def record(
+        self,
+        key: str,
+        inputs: Dict[str, Optional[Fingerprint]],
+        version: str,
+        outputs: Iterable[Path],
+    ):
+        """Store the entry of `key` and save the manifest right away, so an
+        interrupted run keeps the work already done."""
+        self.entries[key] = {
+            "inputs": inputs,
+            "version": version,
+            "outputs": sorted(
+                Path(output).relative_to(self.path.parent).as_posix()
+                for output in outputs
+            ),
+        }
+        self.save()
+
+    def save(self):
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        tmp_path = self.path.with_name(self.path.name + ".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.entries, f, indent=2, sort_keys=True)
+        tmp_path.replace(self.path)
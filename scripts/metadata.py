@@ -1,24 +1,48 @@
-import sys
+import argparse
 from ftplib import FTP
 from pathlib import Path
 
+from scripts import download, instrumentation
+
 FTP_HOST = "geoftp.ibge.gov.br"
+FTP_PORT = 21
 FTP_DIR = "/organizacao_do_territorio/estrutura_territorial/divisao_territorial/2024/"
 DTB_PATH = "DTB_2024.zip"
 
 
-def main(destination: Path):
-    ftp = FTP(FTP_HOST, timeout=30)
+def download_dtb(destination: Path) -> int:
+    """Download the DTB archive unless it is already in `destination`;
+    returns the bytes downloaded."""
+    ftp = FTP(timeout=30)
+    ftp.connect(FTP_HOST, FTP_PORT)
     ftp.login()
 
     ftp.cwd(FTP_DIR)
     Path(destination).mkdir(exist_ok=True, parents=True)
 
-    with open(Path(destination, DTB_PATH), "wb") as f:
+    local_path = Path(destination, DTB_PATH)
+    # SIZE is refused in ASCII mode by some servers
+    ftp.voidcmd("TYPE I")
+    if download.is_downloaded(local_path, ftp.size(DTB_PATH)):
+        ftp.quit()
+        return 0
+
+    with open(local_path, "wb") as f:
         ftp.retrbinary(f"RETR {DTB_PATH}", f.write)
+    ftp.quit()
+    return local_path.stat().st_size
+
+
+def main(destination: Path):
+    with instrumentation.stage("metadata") as measured:
+        measured.nbytes = download_dtb(destination)
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 2:
-        sys.exit(1)
-    main(Path(sys.argv[1]))
+    parser = argparse.ArgumentParser(description="Download the DTB spreadsheets.")
+    parser.add_argument("destination", type=Path)
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrumentation.configure(args.metrics, args.profile)
+    main(args.destination)
@@ -0,0 +1,346 @@
+"""
+Run the whole pipeline with its stages overlapped: each UF ZIP is processed
+as soon as it is downloaded and the territorial mappings are ready, while the
+other downloads go on.
+
+The work is a graph of tasks, each started on the executor of its stage once
+the tasks it depends on are done, so every stage has its own bound on
+concurrency: FTP sessions for the downloads, one thread for the metadata and
+worker processes for the addresses.
+"""
+
+import argparse
+import multiprocessing
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Tuple
+
+from tqdm import tqdm
+
+from scripts import (
+    download,
+    extract,
+    instrumentation,
+    metadata,
+    process_addresses,
+    process_metadata,
+)
+from scripts.manifest import MANIFEST_FILENAME, Fingerprint, Manifest
+
+# Directories under the data root, as laid out by the Makefile
+RAW_DIR = "raw"
+METADATA_DIR = "metadata"
+EXTRACTED_METADATA_DIR = "extracted/metadata"
+MAPPINGS_DIR = "processed/metadata"
+ADDRESSES_DIR = "processed/addresses"
+
+# Name, inputs, outputs and rejected rows of a CSV processed by a worker
+Processed = Tuple[str, Dict[str, Optional[Fingerprint]], List[Path], Dict[str, int]]
+
+
+@dataclass
+class Task:
+    """
+    A unit of work: `func(*args)`, run on the executor of `stage` once the
+    tasks named in `after` are done. `done` is then called with its result in
+    the scheduling thread.
+    """
+
+    name: str
+    stage: str
+    func: Callable
+    args: Tuple = ()
+    after: List[str] = field(default_factory=list)
+    done: Optional[Callable[[object], None]] = None
+
+
+def run_tasks(
+    tasks: List[Task], executors: Dict[str, Executor], progress: bool = True
+) -> Dict[str, object]:
+    """
+    Run `tasks`, each as soon as the tasks it depends on are done, in the
+    order given among those ready. Returns their results by name.
+
+    Once a task fails no other is started: the running ones are waited for
+    and the first error is raised.
+    """
+    waiting = {task.name: task for task in tasks}
+    unknown = {name for task in tasks for name in task.after} - waiting.keys()
+    if unknown:
+        raise ValueError(f"Unknown dependencies: {sorted(unknown)}")
+
+    results = {}
+    running = {}
+    error = None
+    with tqdm(
+        total=len(tasks), desc="Pipeline", unit="task", position=0, disable=not progress
+    ) as pbar:
+        while True:
+            if error is None:
+                ready = [
+                    task
+                    for task in waiting.values()
+                    if all(name in results for name in task.after)
+                ]
+                for task in ready:
+                    del waiting[task.name]
+                    future = executors[task.stage].submit(task.func, *task.args)
+                    running[future] = task
+            if not running:
+                break
+
+            finished, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in finished:
+                task = running.pop(future)
+                try:
+                    results[task.name] = future.result()
+                    if task.done is not None:
+                        task.done(results[task.name])
+                except Exception as exc:
+                    if error is None:
+                        error = exc
+                pbar.update(1)
+
+    if error is not None:
+        raise error
+    if waiting:
+        raise ValueError(f"Circular dependencies between {sorted(waiting)}")
+    return results
+
+
+def process_archive(
+    path: Path,
+    mappings: Path,
+    destination: Path,
+    output_format: str,
+    engine: str,
+    force: bool,
+    memory_budget: Optional[int] = None,
+) -> List[Processed]:
+    """
+    Process the CSVs of a downloaded ZIP, except those the manifest of
+    `destination` shows to be up to date. The manifest is only read here: the
+    scheduling process records the CSVs returned.
+    """
+    lookups = process_addresses.load_lookups(mappings)
+    manifest = Manifest(destination / MANIFEST_FILENAME)
+    version = process_addresses.processing_version(output_format, engine)
+
+    processed = []
+    for csv_source in process_addresses.archive_sources(path):
+        inputs = process_addresses.source_inputs(csv_source, mappings, manifest)
+        if not force and manifest.is_current(csv_source.name, inputs, version):
+            continue
+        outputs, rejected = process_addresses.process_file(
+            csv_source,
+            destination,
+            lookups,
+            progress=False,
+            output_format=output_format,
+            engine=engine,
+            memory_budget=memory_budget,
+        )
+        processed.append((csv_source.name, inputs, outputs, rejected))
+    return processed
+
+
+def run_pipeline(
+    root: Path,
+    download_workers: int = download.WORKERS,
+    workers: int = 1,
+    output_format: str = "csv",
+    engine: str = "c",
+    force: bool = False,
+    memory_budget: Optional[int] = None,
+):
+    """
+    Download, extract and process the CNEFE release into `root`. Address CSVs
+    are streamed from their ZIPs, so only the DTB spreadsheets are extracted.
+    A `memory_budget` in bytes is shared evenly by the worker processes.
+    """
+    raw = root / RAW_DIR
+    mappings = root / MAPPINGS_DIR
+    destination = root / ADDRESSES_DIR
+    destination.mkdir(exist_ok=True, parents=True)
+
+    ftp = download.connect()
+    files = download.remote_files(ftp)
+    # SIZE is refused in ASCII mode, in which NLST leaves the session
+    ftp.voidcmd("TYPE I")
+    # One SIZE per file, both to order and to skip the downloads
+    sizes = {f: ftp.size(f) for f in files}
+    # Largest first, so a big UF (e.g. SP) does not become the tail
+    files.sort(key=lambda f: sizes[f] or 0, reverse=True)
+    missing = {f for f in files if not download.is_downloaded(raw / f, sizes[f])}
+    ftp.quit()
+
+    manifest = Manifest(destination / MANIFEST_FILENAME)
+    version = process_addresses.processing_version(output_format, engine)
+    rejected = dict.fromkeys(process_addresses.RULES, 0)
+
+    def record(processed: List[Processed]):
+        for name, inputs, outputs, file_rejected in processed:
+            manifest.record(name, inputs, version, outputs)
+            for rule, count in file_rejected.items():
+                rejected[rule] += count
+
+    dtb = f"download:{metadata.DTB_PATH}"
+    tasks = [
+        Task(dtb, "download", metadata.download_dtb, (root / METADATA_DIR,)),
+        Task(
+            "extract_metadata",
+            "metadata",
+            extract.extract_all,
+            (root / METADATA_DIR, root / EXTRACTED_METADATA_DIR, ".xls"),
+            [dtb],
+        ),
+        Task(
+            "process_metadata",
+            "metadata",
+            process_metadata.build_mappings,
+            (root / EXTRACTED_METADATA_DIR, mappings, force),
+            ["extract_metadata"],
+        ),
+    ]
+
+    worker_budget = memory_budget // workers if memory_budget else None
+    pool = download.ConnectionPool()
+    for remote_path in files:
+        local_path = raw / remote_path
+        local_path.parent.mkdir(exist_ok=True, parents=True)
+        after = ["process_metadata"]
+        if remote_path in missing:
+            tasks.append(
+                Task(
+                    f"download:{remote_path}",
+                    "download",
+                    download.fetch,
+                    (pool, remote_path, local_path),
+                )
+            )
+            after.append(f"download:{remote_path}")
+        if local_path.suffix == ".zip":
+            tasks.append(
+                Task(
+                    f"process:{remote_path}",
+                    "process",
+                    process_archive,
+                    (
+                        local_path,
+                        mappings,
+                        destination,
+                        output_format,
+                        engine,
+                        force,
+                        worker_budget,
+                    ),
+                    after,
+                    record,
+                )
+            )
+
+    archives = sum(1 for task in tasks if task.stage == "process")
+    print(f"Downloading {len(missing)} files, processing {archives} archives...")
+    try:
+        with (
+            ThreadPoolExecutor(max_workers=download_workers) as downloads,
+            ThreadPoolExecutor(max_workers=1) as metadata_executor,
+            ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ) as processing,
+        ):
+            run_tasks(
+                tasks,
+                {
+                    "download": downloads,
+                    "metadata": metadata_executor,
+                    "process": processing,
+                },
+            )
+    finally:
+        pool.close()
+    process_addresses.report_rejections(rejected)
+
+
+def main(
+    root: Path,
+    download_workers: int = download.WORKERS,
+    workers: int = 1,
+    output_format: str = "csv",
+    engine: str = "c",
+    force: bool = False,
+    memory_budget: Optional[int] = None,
+):
+    with instrumentation.stage("pipeline"):
+        run_pipeline(
+            root,
+            download_workers,
+            workers,
+            output_format,
+            engine,
+            force,
+            memory_budget,
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the overlapped CNEFE pipeline.")
+    parser.add_argument("root", type=Path, help="Data directory, e.g. data")
+    parser.add_argument(
+        "--download-workers",
+        type=int,
+        default=download.WORKERS,
+        help=f"Number of concurrent FTP sessions (default: {download.WORKERS})",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of UF files processed concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=process_addresses.OUTPUT_FORMATS,
+        default="csv",
+        help="csv: one file per UF; parquet: dataset partitioned by "
+        "ESTADO/MUNICIPIO (default: csv)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=process_addresses.ENGINES,
+        default="c",
+        help="CSV reader: pandas C parser or multithreaded Arrow (default: c)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reprocess every file, even those the manifest marks as up to date",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        help="Peak memory (MB) of the address processing, shared by the workers "
+        f"(default: {process_addresses.CHUNKSIZE:,} rows per chunk)",
+    )
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrumentation.configure(args.metrics, args.profile)
+    main(
+        args.root,
+        download_workers=args.download_workers,
+        workers=args.workers,
+        output_format=args.output_format,
+        engine=args.engine,
+        force=args.force,
+        memory_budget=(
+            args.memory_budget * process_addresses.MB if args.memory_budget else None
+        ),
+    )
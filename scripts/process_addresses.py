@@ -1,12 +1,52 @@
+import argparse
 import json
-import sys
-from pathlib import Path
-from typing import Dict, Iterator
+import multiprocessing
+import warnings
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import contextmanager, nullcontext
+from dataclasses import dataclass, field
+from pathlib import Path, PurePosixPath
+from typing import BinaryIO, Callable, Dict, Iterator, List, Optional, Tuple
+from zipfile import BadZipFile, ZipFile
 
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
 from tqdm import tqdm
 
+from scripts import instrumentation
+from scripts.manifest import MANIFEST_FILENAME, Fingerprint, Manifest, code_version
+from scripts.manifest import fingerprint as file_fingerprint
+from scripts.territory import TERRITORY_FILENAME, Territory
+
 CHUNKSIZE = 250_000
+MB = 1024 * 1024
+
+# Under a memory budget, chunk sizes are measured from PROBE_ROWS rows up, over
+# the first MEASURED_CHUNKS chunks of a process (see ChunkSizer)
+PROBE_ROWS = 10_000
+MEASURED_CHUNKS = 3
+MIN_CHUNKSIZE = 1_000
+MAX_CHUNKSIZE = 4_000_000
+# Share of the budget chunks are sized for: over a file the RSS creeps above
+# the peaks measured, as the allocator fragments
+BUDGET_MARGIN = 0.85
+
+ENGINES = ["c", "pyarrow"]
+
+# Bytes handed to each Arrow parsing thread
+ARROW_BLOCK_SIZE = 1 << 24  # 16 MB
+
+OUTPUT_FORMATS = ["csv", "parquet"]
+
+# Parquet output is laid out as ESTADO=<name>/MUNICIPIO=<name>/ directories
+PARTITION_COLUMNS = ["ESTADO", "MUNICIPIO"]
+# Rows held back across partitions to fill row groups of CHUNKSIZE rows
+PARQUET_BUFFER_ROWS = 2 * CHUNKSIZE
 
 COLUMNS = [
     "COD_UNICO_ENDERECO",
@@ -17,6 +57,14 @@ COLUMNS = [
     "NUM_ENDERECO",
     "NOM_COMP_ELEM1",
     "VAL_COMP_ELEM1",
+    "NOM_COMP_ELEM2",
+    "VAL_COMP_ELEM2",
+    "NOM_COMP_ELEM3",
+    "VAL_COMP_ELEM3",
+    "NOM_COMP_ELEM4",
+    "VAL_COMP_ELEM4",
+    "NOM_COMP_ELEM5",
+    "VAL_COMP_ELEM5",
     "LATITUDE",
     "DSC_MODIFICADOR",
     "DSC_LOCALIDADE",
@@ -24,50 +72,410 @@ COLUMNS = [
     "NOM_TIPO_SEGLOGR",
     "LONGITUDE",
     "NOM_SEGLOGR",
+    "COD_ESPECIE",
+    "NV_GEO_COORD",
+]
+
+COMPLEMENT_COLUMNS = [
+    f"{prefix}_COMP_ELEM{element}"
+    for element in range(1, 6)
+    for prefix in ["NOM", "VAL"]
 ]
 
 DTYPES = {
-    "COD_UF": "string",
-    "COD_MUNICIPIO": "string",
-    "COD_DISTRITO": "string",
-    "COD_SUBDISTRITO": "string",
+    # IBGE codes are numeric and cheaper to look up as numbers than strings.
+    # Parsed as floats, which hold their 11 digits exactly: the C parser is
+    # several times slower with the nullable Int64.
+    "COD_UF": "float",
+    "COD_MUNICIPIO": "float",
+    "COD_DISTRITO": "float",
+    "COD_SUBDISTRITO": "float",
     "NUM_ENDERECO": "string",
     "LATITUDE": "float",
     "LONGITUDE": "float",
+    "CEP": "string",  # Leading zeros are significant
+    "COD_ESPECIE": "Int8",
+    "NV_GEO_COORD": "Int8",
+    **{column: "string" for column in COMPLEMENT_COLUMNS},
+}
+
+MAPPING_NAMES = ["state", "municipality", "distrital", "subdistrital"]
+
+# Output column, code column and mapping name of each territorial level
+TERRITORIAL_COLUMNS = {
+    "ESTADO": ("COD_UF", "state"),
+    "MUNICIPIO": ("COD_MUNICIPIO", "municipality"),
+    "DISTRITO": ("COD_DISTRITO", "distrital"),
+    "SUBDISTRITO": ("COD_SUBDISTRITO", "subdistrital"),
 }
 
+# Rows failing a rule go to REJECTS_DIR/<file>.csv with the failed reason codes.
+# The leading underscore keeps the directory out of Parquet dataset reads.
+REJECTS_DIR = "_rejects"
+REASON_COLUMN = "MOTIVO_REJEICAO"
+RULES = {
+    "latitude": "LATITUDE missing or outside [-90, 90]",
+    "longitude": "LONGITUDE missing or outside [-180, 180]",
+    "cep": "CEP not in the XXXXXXXX or XXXXX-XXX format",
+    "numero": "NUM_ENDERECO missing without the SN modifier",
+    "territorio": "state, municipality or district code missing or unknown",
+    "especie": "COD_ESPECIE missing or unknown",
+    "nivel_geo": "NV_GEO_COORD missing or unknown",
+}
+CEP_PATTERN = r"^\d{5}-?\d{3}$"
+
+ARROW_TYPES = {
+    "string": pa.string(),
+    "float": pa.float64(),
+    "Int8": pa.int8(),
+}
+
+
+@dataclass(frozen=True)
+class CsvSource:
+    """A CNEFE CSV, either a file on disk or a member of a ZIP archive."""
+
+    path: Path
+    member: Optional[str] = None
+    size: int = 0  # Uncompressed size in bytes
+    crc: Optional[int] = None  # CRC-32 from the ZIP directory, for members
+
+    @property
+    def name(self) -> str:
+        return PurePosixPath(self.member).name if self.member else self.path.name
+
+    def fingerprint(self, previous: Optional[Fingerprint] = None) -> Fingerprint:
+        """Content fingerprint; ZIP members reuse the CRC of the archive."""
+        if self.member is None:
+            return file_fingerprint(self.path, previous)
+        return {"size": self.size, "crc": self.crc}
+
+    @contextmanager
+    def open(self) -> Iterator[BinaryIO]:
+        """Open the CSV for binary reading, inflating ZIP members on the fly."""
+        if self.member is None:
+            with open(self.path, "rb") as handle:
+                yield handle
+        else:
+            with ZipFile(self.path) as archive, archive.open(self.member) as handle:
+                yield handle
+
+
+def archive_sources(path: Path) -> List[CsvSource]:
+    """The CSV members of the ZIP archive at `path`."""
+    with ZipFile(path) as archive:
+        return [
+            CsvSource(path, info.filename, info.file_size, info.CRC)
+            for info in archive.infolist()
+            if PurePosixPath(info.filename).suffix.lower() == ".csv"
+        ]
+
+
+def find_sources(source: Path) -> List[CsvSource]:
+    """
+    List the CSVs under `source`, both plain files and members of ZIP
+    archives, so the raw downloads can be processed without extracting them.
+    """
+    sources = [
+        CsvSource(path, size=path.stat().st_size)
+        for path in Path(source).rglob("*.csv")
+    ]
+    for path in Path(source).rglob("*.zip"):
+        try:
+            sources.extend(archive_sources(path))
+        except BadZipFile:
+            print(f"{path} file is corrupted.")
+    return sources
+
+
+def mapping_paths(metadata: Path) -> Dict[str, Path]:
+    return {name: metadata / f"{name}_mapping.json" for name in MAPPING_NAMES}
+
+
+def source_inputs(
+    csv_source: CsvSource, metadata: Path, manifest: Manifest
+) -> Dict[str, Optional[Fingerprint]]:
+    """Fingerprints of the inputs of `csv_source`'s output: the CSV itself and
+    mappings and the compiled territory."""
+    paths = list(mapping_paths(metadata).values())
+    if (metadata / TERRITORY_FILENAME).exists():
+        paths.append(metadata / TERRITORY_FILENAME)
+    previous = manifest.previous_inputs(csv_source.name)
+    inputs = {
+        path.name: file_fingerprint(path, previous.get(path.name)) for path in paths
+    }
+    inputs[csv_source.name] = csv_source.fingerprint(previous.get(csv_source.name))
+    return inputs
+
+
+# Code the outputs depend on: the lookups read the compiled territory, and the
+# manifest decides what is skipped
+VERSION_SOURCES = [
+    Path(__file__),
+    Path(__file__).with_name("territory.py"),
+    Path(__file__).with_name("manifest.py"),
+]
+
+
+def processing_version(output_format: str, engine: str) -> str:
+    """Version of the processing code and of the options shaping its output."""
+    return code_version(*VERSION_SOURCES, output_format=output_format, engine=engine)
+
 
 def load_mappings(metadata: Path) -> Dict[str, Dict[str, str]]:
     """Load all mapping JSON files from metadata directory."""
     mappings = {}
-    for name in ["state", "municipality", "distrital", "subdistrital"]:
-        path = metadata / f"{name}_mapping.json"
+    for name, path in mapping_paths(metadata).items():
         with open(path, "r", encoding="utf-8") as f:
             mappings[name] = json.load(f)
     return mappings
 
 
+@dataclass(frozen=True)
+class TerritorialLookup:
+    """Resolves IBGE codes of one territorial level into categorical names."""
+
+    code_column: str
+    codes: np.ndarray  # Sorted IBGE codes of the level
+    positions: np.ndarray  # Position in `dtype` of the name of each code
+    dtype: pd.CategoricalDtype
+
+    def category_codes(self, values: pd.Series) -> np.ndarray:
+        """Category codes of the IBGE codes in `values`, found by binary search
+        instead of hashing each value; -1 where missing or unknown."""
+        values = values.to_numpy(dtype="float64", na_value=-1)
+        if not len(self.codes):
+            return np.full(len(values), -1, dtype="int32")
+        index = np.searchsorted(self.codes, values).clip(max=len(self.codes) - 1)
+        return np.where(self.codes[index] == values, self.positions[index], -1)
+
+
+def build_lookups(mappings: Dict[str, Dict[str, str]]) -> Dict[str, TerritorialLookup]:
+    """
+    Build the categorical lookups of every territorial column.
+
+    Categories are the sorted names of the mapping, so every chunk and every
+    UF file shares the same dictionary.
+    """
+    lookups = {}
+    for column, (code_column, name) in TERRITORIAL_COLUMNS.items():
+        names = sorted(set(mappings[name].values()))
+        position = {value: index for index, value in enumerate(names)}
+        codes = np.array([int(code) for code in mappings[name]], dtype="int64")
+        positions = np.array(
+            [position[value] for value in mappings[name].values()], dtype="int32"
+        )
+        order = np.argsort(codes)
+        lookups[column] = TerritorialLookup(
+            code_column=code_column,
+            codes=codes[order],
+            positions=positions[order],
+            dtype=pd.CategoricalDtype(names),
+        )
+    return lookups
+
+
+def territory_lookups(territory: Territory) -> Dict[str, TerritorialLookup]:
+    """Lookups over the mapped arrays of a compiled territory, as `build_lookups`
+    builds from the mappings, without copying them."""
+    return {
+        column: TerritorialLookup(
+            code_column=code_column,
+            codes=territory[name].codes,
+            positions=territory[name].name_ids,
+            dtype=pd.CategoricalDtype(territory[name].names),
+        )
+        for column, (code_column, name) in TERRITORIAL_COLUMNS.items()
+    }
+
+
+def load_lookups(metadata: Path) -> Dict[str, TerritorialLookup]:
+    """Lookups of the compiled territory in `metadata`, or of the JSON mappings
+    when it was processed before the territory was compiled."""
+    if (metadata / TERRITORY_FILENAME).exists():
+        return territory_lookups(Territory(metadata / TERRITORY_FILENAME))
+    return build_lookups(load_mappings(metadata))
+
+
+@dataclass
+class ChunkSizer:
+    """
+    Rows per chunk keeping this process under `budget` bytes of peak RSS.
+
+    Starting from PROBE_ROWS, chunks grow until the peak RSS rises with them:
+    the rise between the two largest chunks gives the bytes each row takes
+    through reading, processing and writing, and the size is then the number
+    of rows the rest of the budget holds.
+    """
+
+    budget: int
+    size: int = PROBE_ROWS
+    bytes_per_row: Optional[float] = None
+    samples: List[Tuple[int, int]] = field(default_factory=list)
+    settled: bool = False
+
+    def observe(self, rows: int):
+        """Record the peak RSS after a chunk of `rows` was handled."""
+        if self.settled or not rows:
+            return
+        peak = instrumentation.peak_rss_mb()
+        if peak is None:  # Nothing to measure it with: keep the default size
+            self.size, self.settled = CHUNKSIZE, True
+            return
+        peak = int(peak * MB)
+        target = self.budget * BUDGET_MARGIN
+        self.samples.append((rows, peak))
+        self.settled = len(self.samples) >= MEASURED_CHUNKS
+
+        # By rows, since the last chunk of a file may be smaller
+        largest = sorted(set(self.samples))[-2:]
+        (small_rows, small_peak), (large_rows, large_peak) = largest[0], largest[-1]
+        if large_rows > small_rows and large_peak > small_peak:
+            self.bytes_per_row = (large_peak - small_peak) / (large_rows - small_rows)
+
+        if self.bytes_per_row is None:
+            # The peak has not risen with the rows yet: it is made of fixed
+            # costs, e.g. the Arrow read buffers, so larger chunks are free.
+            # Measuring goes on until it rises, unless nothing is left to grow.
+            if peak < target and self.size < MAX_CHUNKSIZE:
+                self.size = min(large_rows * 4, MAX_CHUNKSIZE)
+                self.settled = False
+            return
+        rows = large_rows + (target - peak) / self.bytes_per_row
+        if not self.settled:
+            rows = min(rows, large_rows * 4)  # Grow gradually while measuring
+        self.size = int(min(max(rows, MIN_CHUNKSIZE), MAX_CHUNKSIZE))
+
+
+# Sizers of this process by budget, so files after the first one start with
+# the size it measured: once the peak RSS is high, it no longer rises
+_sizers: Dict[int, ChunkSizer] = {}
+
+
+def chunk_sizer(budget: int) -> ChunkSizer:
+    """
+    The sizer of `budget` in this process. Raises ValueError if the process
+    already takes more than the budget before reading any rows, e.g. for the
+    interpreter and the lookups, since no chunk size could then meet it.
+    """
+    if budget not in _sizers:
+        peak = instrumentation.peak_rss_mb()
+        if peak is not None and peak * MB >= budget:
+            raise ValueError(
+                f"The memory budget of {budget / MB:,.0f} MB is below the "
+                f"{peak:,.0f} MB taken before reading any rows"
+            )
+        _sizers[budget] = ChunkSizer(budget)
+    return _sizers[budget]
+
+
+def read_chunks(
+    handle: BinaryIO,
+    engine: str = "c",
+    chunksize: int = CHUNKSIZE,
+    next_size: Optional[Callable[[], int]] = None,
+) -> Iterator[pd.DataFrame]:
+    """
+    Read a CNEFE CSV in chunks of `chunksize` rows, or of `next_size()` rows
+    for each chunk when given, e.g. by a `ChunkSizer`.
+
+    The "c" engine uses the pandas C parser. The "pyarrow" engine parses the
+    file with Arrow's multithreaded CSV reader, streaming record batches and
+    returning Arrow-backed string columns instead of Python objects.
+    """
+    if next_size is None:
+
+        def next_size() -> int:
+            return chunksize
+
+    if engine == "c":
+        reader = pd.read_csv(
+            handle,
+            sep=";",
+            usecols=COLUMNS,
+            dtype=DTYPES,
+            chunksize=chunksize,
+            low_memory=False,
+        )
+        while True:
+            try:
+                chunk = reader.get_chunk(next_size())
+            except StopIteration:
+                reader.close()
+                return
+            yield chunk
+
+    reader = pacsv.open_csv(
+        handle,
+        read_options=pacsv.ReadOptions(use_threads=True, block_size=ARROW_BLOCK_SIZE),
+        parse_options=pacsv.ParseOptions(delimiter=";"),
+        convert_options=pacsv.ConvertOptions(
+            include_columns=COLUMNS,
+            # Columns without a declared dtype are read as strings, since
+            # types inferred on the first block may not hold for later ones
+            column_types={
+                column: ARROW_TYPES[DTYPES.get(column, "string")] for column in COLUMNS
+            },
+            strings_can_be_null=True,
+        ),
+    )
+
+    def to_pandas(table: pa.Table) -> pd.DataFrame:
+        return table.to_pandas(
+            types_mapper={
+                pa.string(): pd.StringDtype("pyarrow"),
+                pa.int8(): pd.Int8Dtype(),
+            }.get
+        )
+
+    pending = None
+    for batch in reader:
+        batch_table = pa.Table.from_batches([batch])
+        pending = (
+            batch_table if pending is None else pa.concat_tables([pending, batch_table])
+        )
+        while pending.num_rows >= (size := next_size()):
+            yield to_pandas(pending.slice(0, size))
+            pending = pending.slice(size)
+
+    if pending is not None and pending.num_rows:
+        yield to_pandas(pending)
+
+
+def build_complement(df: pd.DataFrame) -> pd.Series:
+    """
+    Merge the five complement elements (name and value) into a single string
+    with normalized whitespace, using column-wise Arrow kernels.
+    """
+    elements = [
+        pc.fill_null(pa.array(df[column], type=pa.string(), from_pandas=True), "")
+        for column in COMPLEMENT_COLUMNS
+    ]
+    complement = pc.binary_join_element_wise(*elements, " ")
+    complement = pc.utf8_trim_whitespace(
+        pc.replace_substring_regex(complement, pattern=r"\s+", replacement=" ")
+    )
+    return pd.Series(complement.to_numpy(zero_copy_only=False), index=df.index)
+
+
 def process_chunk(
-    df: pd.DataFrame, mappings: Dict[str, Dict[str, str]]
+    df: pd.DataFrame, lookups: Dict[str, TerritorialLookup]
 ) -> pd.DataFrame:
     """Process a single dataframe chunk and return cleaned dataframe."""
-    df["ESTADO"] = df["COD_UF"].map(mappings["state"])
-    df["MUNICIPIO"] = df["COD_MUNICIPIO"].map(mappings["municipality"])
-    df["DISTRITO"] = df["COD_DISTRITO"].map(mappings["distrital"])
-    df["SUBDISTRITO"] = df["COD_SUBDISTRITO"].map(mappings["subdistrital"])
+    # Territorial names are dictionary-encoded; unknown codes become missing
+    for column, lookup in lookups.items():
+        df[column] = pd.Categorical.from_codes(
+            lookup.category_codes(df[lookup.code_column]), dtype=lookup.dtype
+        )
+
+    # Few distinct street types, but no metadata to derive a shared dictionary
+    df["NOM_TIPO_SEGLOGR"] = df["NOM_TIPO_SEGLOGR"].astype("category")
 
     # Clean complemento fields
-    df["COMPLEMENTO"] = (
-        df[["NOM_COMP_ELEM1", "VAL_COMP_ELEM1"]]
-        .fillna("")
-        .astype(str)
-        .agg(" ".join, axis=1)
-        .str.split()
-        .str.join(" ")
-    )
+    df["COMPLEMENTO"] = build_complement(df)
 
     # Replace by SN (sem número)
-    df.loc[df["DSC_MODIFICADOR"] == "SN", "NUM_ENDERECO"] = "SN"
+    df.loc[df["DSC_MODIFICADOR"].eq("SN").fillna(False), "NUM_ENDERECO"] = "SN"
 
     # Filter only required columns
     df = df.filter(
@@ -85,6 +493,8 @@ def process_chunk(
             "COMPLEMENTO",
             "LATITUDE",
             "LONGITUDE",
+            "COD_ESPECIE",
+            "NV_GEO_COORD",
         ]
     )
 
@@ -95,63 +505,524 @@ def process_chunk(
             "NOM_SEGLOGR": "RUA",
             "NOM_TIPO_SEGLOGR": "TIPO_LOGRADOURO",
             "NUM_ENDERECO": "NUMERO",
+            "COD_ESPECIE": "ESPECIE",
+            "NV_GEO_COORD": "NIVEL_GEOCODIFICACAO",
         }
     )
 
 
-def process_file(
-    filepath: Path, destination: Path, mappings: Dict[str, Dict[str, str]]
-):
-    """Process a single CSV file in chunks and save results."""
-    output_file = destination / filepath.name
-    first_chunk = True
+def check_rules(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Evaluate every rule on a processed chunk at once. Returns one boolean
+    column per rule in RULES, set where the row fails it.
 
-    # Count lines for progress bar estimation
-    total_lines = (
-        sum(1 for _ in open(filepath, "r", encoding="utf-8")) - 1
-    )  # skip header
-    total_chunks = (total_lines // CHUNKSIZE) + 1
-
-    chunk_iter: Iterator[pd.DataFrame] = pd.read_csv(
-        filepath,
-        sep=";",
-        usecols=COLUMNS,
-        dtype=DTYPES,
-        chunksize=CHUNKSIZE,
-        low_memory=False,
+    Subdistricts are not required: the DTB only lists them for municipalities
+    that are divided into subdistricts.
+    """
+    latitude, longitude = df["LATITUDE"], df["LONGITUDE"]
+    # Matched by Arrow in C, not per value as with the pandas str accessor
+    cep = pc.match_substring_regex(
+        pa.array(df["CEP"], type=pa.string(), from_pandas=True), CEP_PATTERN
+    )
+    return pd.DataFrame(
+        {
+            "latitude": ~latitude.between(-90, 90),
+            "longitude": ~longitude.between(-180, 180),
+            "cep": ~pc.fill_null(cep, False).to_numpy(zero_copy_only=False),
+            "numero": df["NUMERO"].isna(),
+            "territorio": df[["ESTADO", "MUNICIPIO", "DISTRITO"]].isna().any(axis=1),
+            "especie": ~df["ESPECIE"].isin(range(1, 9)).fillna(False).astype(bool),
+            "nivel_geo": ~df["NIVEL_GEOCODIFICACAO"]
+            .isin(range(1, 7))
+            .fillna(False)
+            .astype(bool),
+        },
+        index=df.index,
     )
 
-    with tqdm(
-        total=total_chunks, desc=f"Processing {filepath.name}", unit="chunk"
-    ) as pbar:
-        for chunk in chunk_iter:
-            processed = process_chunk(chunk, mappings)
-            processed.to_csv(
-                output_file,
-                index=False,
-                mode="w" if first_chunk else "a",
-                header=first_chunk,
+
+def rejection_reasons(failures: pd.DataFrame) -> pd.Series:
+    """Comma-separated reason codes of the failing rows of `failures`."""
+    failed = failures[failures.any(axis=1)]
+    reasons = pd.Series("", index=failed.index)
+    for rule in failed.columns:
+        reasons = reasons.where(~failed[rule], reasons + "," + rule)
+    return reasons.str.lstrip(",")
+
+
+class ParquetPartitions:
+    """
+    The Parquet output of one processed file: one file per state and
+    municipality partition, kept open across chunks. Rows are buffered per
+    partition and written in row groups of `row_group_size`, so a municipality
+    spread over many chunks is not split into a small file per chunk.
+
+    At most `buffer_rows` rows are held back: past them, the largest buffers
+    are written out early, in smaller row groups. Under a memory budget, both
+    follow the chunk size instead (see `fit`).
+    """
+
+    def __init__(
+        self,
+        destination: Path,
+        basename: str,
+        row_group_size: int = CHUNKSIZE,
+        buffer_rows: int = PARQUET_BUFFER_ROWS,
+    ):
+        self.destination = destination
+        self.filename = f"{basename}.parquet"
+        self.row_group_size = row_group_size
+        self.buffer_rows = buffer_rows
+        self.partitioning = ds.partitioning(
+            pa.schema([(column, pa.string()) for column in PARTITION_COLUMNS]),
+            flavor="hive",
+        )
+        self.schema: Optional[pa.Schema] = None
+        self.buffers: Dict[Path, List[pa.Table]] = {}
+        self.buffered: Dict[Path, int] = {}
+        self.files: Dict[Path, Tuple[pa.OSFile, pq.ParquetWriter]] = {}
+
+    @property
+    def paths(self) -> List[Path]:
+        return list(self.files)
+
+    def fit(self, chunk_rows: int):
+        """Write row groups of a chunk's rows, and hold back no more than one
+        chunk: the rows a ChunkSizer found the memory budget to hold."""
+        self.row_group_size = self.buffer_rows = chunk_rows
+
+    def _table(self, df: pd.DataFrame) -> pa.Table:
+        """The chunk as Arrow, cast to the schema of the first chunk written."""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        if self.schema is None:
+            # Categories become dictionaries whose index width follows their
+            # count; a wide one fits the chunks to come
+            self.schema = pa.schema(
+                [
+                    (
+                        pa.field(f.name, pa.dictionary(pa.int32(), f.type.value_type))
+                        if pa.types.is_dictionary(f.type)
+                        else f
+                    )
+                    for f in table.schema
+                ],
+                metadata=table.schema.metadata,
             )
+        return table.cast(self.schema)
+
+    def _path(self, values: Tuple) -> Path:
+        # Formatted by pyarrow, so directories are escaped as by write_dataset
+        condition = None
+        for column, value in zip(PARTITION_COLUMNS, values):
+            term = ds.field(column) == str(value)
+            condition = term if condition is None else condition & term
+        directory, _ = self.partitioning.format(condition)
+        return self.destination / directory / self.filename
+
+    def _write(self, path: Path, rows: int) -> int:
+        """Write the first `rows` buffered rows of a partition; returns the
+        bytes written."""
+        table = pa.concat_tables(self.buffers.pop(path))
+        if rows < len(table):
+            self.buffers[path] = [table.slice(rows)]
+        self.buffered[path] = len(table) - rows
+        if not self.buffered[path]:
+            del self.buffered[path]
+
+        if path not in self.files:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            sink = pa.OSFile(str(path), "wb")
+            self.files[path] = sink, pq.ParquetWriter(sink, table.schema)
+        sink, writer = self.files[path]
+        start = sink.tell()
+        writer.write_table(table.slice(0, rows), row_group_size=self.row_group_size)
+        return sink.tell() - start
+
+    def write(self, df: pd.DataFrame) -> int:
+        """Add a processed chunk; returns the bytes written out meanwhile."""
+        if df.empty:
+            return 0
+        table = self._table(df)
+        groups = df.groupby(PARTITION_COLUMNS, observed=True, sort=False).indices
+        for values, positions in groups.items():
+            path = self._path(values)
+            self.buffers.setdefault(path, []).append(
+                table.take(positions).drop_columns(PARTITION_COLUMNS)
+            )
+            self.buffered[path] = self.buffered.get(path, 0) + len(positions)
+
+        nbytes = 0
+        for path, rows in list(self.buffered.items()):
+            full = rows - rows % self.row_group_size
+            if full:
+                nbytes += self._write(path, full)
+        while sum(self.buffered.values()) > self.buffer_rows:
+            path = max(self.buffered, key=self.buffered.get)
+            nbytes += self._write(path, self.buffered[path])
+        return nbytes
+
+    def flush(self) -> int:
+        """Write out every buffered row; returns the bytes written."""
+        return sum(
+            self._write(path, rows) for path, rows in list(self.buffered.items())
+        )
+
+    def close(self):
+        """Close the files, dropping the rows not flushed."""
+        for sink, writer in self.files.values():
+            writer.close()
+            sink.close()
+        self.buffers.clear()
+        self.buffered.clear()
+
+    def __enter__(self) -> "ParquetPartitions":
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def process_file(
+    source: CsvSource,
+    destination: Path,
+    lookups: Dict[str, TerritorialLookup],
+    progress: bool = True,
+    output_format: str = "csv",
+    engine: str = "c",
+    memory_budget: Optional[int] = None,
+) -> Tuple[List[Path], Dict[str, int]]:
+    """
+    Process a single CSV file in chunks and save results. Rows failing a rule
+    are written to the rejects file instead. Returns the output files and the
+    number of rows failing each rule.
+
+    With a `memory_budget` in bytes, chunks are sized by a `ChunkSizer` to
+    keep the process under it instead of holding CHUNKSIZE rows. A warning is
+    issued if the peak RSS still exceeds it.
+    """
+    sizer = chunk_sizer(memory_budget) if memory_budget else None
+    output_file = destination / source.name
+    stem = Path(source.name).stem
+    first_chunk = True
+    rows = 0
+
+    rejects_file = destination / REJECTS_DIR / f"{stem}.csv"
+    rejects_file.unlink(missing_ok=True)
+    rejected = dict.fromkeys(RULES, 0)
+
+    partitions = None
+    if output_format == "parquet":
+        # Parts from a previous run of this file would otherwise be mixed in
+        for pattern in [f"{stem}.parquet", f"{stem}.*.parquet"]:
+            for stale in destination.rglob(pattern):
+                stale.unlink()
+        partitions = ParquetPartitions(destination, stem)
+        if sizer is not None:
+            partitions.fit(sizer.size)
+    else:
+        # Only rewritten if the file yields a chunk
+        output_file.unlink(missing_ok=True)
+
+    # Progress is measured in bytes consumed from the file, so each CSV is read
+    # only once instead of being pre-scanned to count its lines
+    with (
+        instrumentation.measure("process_file", file=source.name) as measured_file,
+        source.open() as handle,
+        tqdm(
+            total=source.size,
+            desc=f"Processing {source.name}",
+            unit="B",
+            unit_scale=True,
+            unit_divisor=1024,
+            disable=not progress,
+        ) as pbar,
+        partitions or nullcontext(),
+    ):
+        chunks = read_chunks(
+            handle, engine, next_size=(lambda: sizer.size) if sizer else None
+        )
+        chunks = instrumentation.iterate(
+            "read_chunk", chunks, handle.tell, file=source.name
+        )
+        for chunk in chunks:
+            with instrumentation.measure("process_chunk", file=source.name) as measured:
+                processed = process_chunk(chunk, lookups)
+                measured.rows = len(processed)
+            rows += len(processed)
+
+            failures = check_rules(processed)
+            for rule, count in failures.sum().items():
+                rejected[rule] += int(count)
+            reasons = rejection_reasons(failures)
+            if len(reasons):
+                rejects = processed.loc[reasons.index].assign(
+                    **{REASON_COLUMN: reasons}
+                )
+                rejects_file.parent.mkdir(exist_ok=True)
+                rejects.to_csv(
+                    rejects_file,
+                    index=False,
+                    mode="a" if rejects_file.exists() else "w",
+                    header=not rejects_file.exists(),
+                )
+                processed = processed.drop(index=reasons.index)
+
+            with instrumentation.measure(
+                "write_chunk", file=source.name, format=output_format
+            ) as measured:
+                if partitions is not None:
+                    measured.nbytes = partitions.write(processed)
+                else:
+                    size = 0 if first_chunk else output_file.stat().st_size
+                    processed.to_csv(
+                        output_file,
+                        index=False,
+                        mode="w" if first_chunk else "a",
+                        header=first_chunk,
+                    )
+                    measured.nbytes = output_file.stat().st_size - size
+                measured.rows = len(processed)
             first_chunk = False
-            pbar.update(1)
+            rows_read = len(chunk)
+            # Dropped before the next chunk is read, so the peak does not hold both
+            del chunk, processed, failures, reasons
+            if sizer is not None:
+                sizer.observe(rows_read)
+                if partitions is not None:
+                    partitions.fit(sizer.size)
+            pbar.update(handle.tell() - pbar.n)
+
+        if partitions is not None:
+            with instrumentation.measure(
+                "write_chunk", file=source.name, format=output_format
+            ) as measured:
+                measured.rows = sum(partitions.buffered.values())
+                measured.nbytes = partitions.flush()
+            outputs = partitions.paths
+        else:
+            # Only the files written, so the manifest finds them all next time
+            outputs = [] if first_chunk else [output_file]
+
+        measured_file.rows, measured_file.nbytes = rows, source.size
+
+    if sizer is not None:
+        peak = instrumentation.peak_rss_mb()
+        per_row = f"{sizer.bytes_per_row:,.0f} B" if sizer.bytes_per_row else "unknown"
+        tqdm.write(
+            f"{source.name}: {sizer.size:,} rows per chunk ({per_row} per row), "
+            f"peak RSS {peak or 0:,.0f} MB"
+        )
+        if peak is not None and peak * MB > memory_budget:
+            # e.g. the buffers of the Arrow reader, whatever the chunk size
+            warnings.warn(
+                f"{source.name}: peak RSS of {peak:,.0f} MB is over the memory "
+                f"budget of {memory_budget / MB:,.0f} MB",
+                RuntimeWarning,
+                stacklevel=2,
+            )
+
+    if rejects_file.exists():
+        outputs.append(rejects_file)
+    return outputs, rejected
+
+
+# Lookups shared by every file handled in a worker process, loaded once by
+# `_init_worker`: the compiled territory is mapped, so its pages are shared
+# with the other workers instead of being pickled to each of them.
+_worker_lookups: Optional[Dict[str, TerritorialLookup]] = None
+
+
+def _init_worker(metadata: Path):
+    global _worker_lookups
+    _worker_lookups = load_lookups(metadata)
+
+
+def _process_file_in_worker(
+    source: CsvSource,
+    destination: Path,
+    output_format: str,
+    engine: str,
+    memory_budget: Optional[int],
+) -> Tuple[List[Path], Dict[str, int]]:
+    return process_file(
+        source,
+        destination,
+        _worker_lookups,
+        progress=False,
+        output_format=output_format,
+        engine=engine,
+        memory_budget=memory_budget,
+    )
+
+
+def report_rejections(rejected: Dict[str, int]):
+    if not any(rejected.values()):
+        return
+    print("Rows rejected by rule:")
+    for rule, count in rejected.items():
+        if count:
+            print(f"  {rule}: {count:,} ({RULES[rule]})")
 
 
-def main(source: Path, metadata: Path, destination: Path):
-    """Main pipeline for processing multiple CSV files."""
+def process_all(
+    source: Path,
+    metadata: Path,
+    destination: Path,
+    workers: int = 1,
+    output_format: str = "csv",
+    engine: str = "c",
+    force: bool = False,
+    memory_budget: Optional[int] = None,
+) -> int:
+    """
+    Main pipeline for processing multiple CSV files. `source` may hold the
+    extracted CSVs or the downloaded ZIP archives themselves. A
+    `memory_budget` in bytes is shared evenly by the worker processes.
+
+    Files whose content, mappings and processing code are unchanged since the
+    last run, according to the manifest in `destination`, are skipped unless
+    `force` is set. Returns the size of the files processed.
+    """
     destination.mkdir(exist_ok=True, parents=True)
 
-    mappings = load_mappings(metadata)
-    files = sorted(Path(source).rglob("*.csv"))
+    lookups = load_lookups(metadata)
+
+    # Largest files first, so a big UF (e.g. SP) does not become the tail
+    files = sorted(find_sources(source), key=lambda f: f.size, reverse=True)
+
+    manifest = Manifest(destination / MANIFEST_FILENAME)
+    version = processing_version(output_format, engine)
 
-    with tqdm(total=len(files), desc="Overall Progress", unit="file") as pbar:
-        for filepath in files:
-            process_file(filepath, destination, mappings)
-            pbar.update(1)
+    pending = []
+    for csv_source in files:
+        inputs = source_inputs(csv_source, metadata, manifest)
+        if force or not manifest.is_current(csv_source.name, inputs, version):
+            pending.append((csv_source, inputs))
+
+    print(f"{len(files) - len(pending)} files up to date, processing {len(pending)}...")
+    size = sum(csv_source.size for csv_source, _ in pending)
+
+    with tqdm(
+        total=len(files),
+        initial=len(files) - len(pending),
+        desc="Overall Progress",
+        unit="file",
+    ) as pbar:
+        rejected = dict.fromkeys(RULES, 0)
+        if workers <= 1:
+            for csv_source, inputs in pending:
+                outputs, file_rejected = process_file(
+                    csv_source,
+                    destination,
+                    lookups,
+                    output_format=output_format,
+                    engine=engine,
+                    memory_budget=memory_budget,
+                )
+                manifest.record(csv_source.name, inputs, version, outputs)
+                for rule, count in file_rejected.items():
+                    rejected[rule] += count
+                pbar.update(1)
+            report_rejections(rejected)
+            return size
+
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(metadata,),
+        ) as executor:
+            futures = {
+                executor.submit(
+                    _process_file_in_worker,
+                    csv_source,
+                    destination,
+                    output_format,
+                    engine,
+                    memory_budget // workers if memory_budget else None,
+                ): (csv_source, inputs)
+                for csv_source, inputs in pending
+            }
+            for future in as_completed(futures):
+                csv_source, inputs = futures[future]
+                outputs, file_rejected = future.result()
+                manifest.record(csv_source.name, inputs, version, outputs)
+                for rule, count in file_rejected.items():
+                    rejected[rule] += count
+                pbar.update(1)
+        report_rejections(rejected)
+    return size
+
+
+def main(
+    source: Path,
+    metadata: Path,
+    destination: Path,
+    workers: int = 1,
+    output_format: str = "csv",
+    engine: str = "c",
+    force: bool = False,
+    memory_budget: Optional[int] = None,
+):
+    with instrumentation.stage("process_addresses") as measured:
+        measured.nbytes = process_all(
+            source,
+            metadata,
+            destination,
+            workers,
+            output_format,
+            engine,
+            force,
+            memory_budget,
+        )
 
 
 if __name__ == "__main__":
-    if len(sys.argv) < 4:
-        print("Usage: python script.py <source> <metadata> <destination>")
-        sys.exit(1)
+    parser = argparse.ArgumentParser(description="Process CNEFE address files.")
+    parser.add_argument("source", type=Path)
+    parser.add_argument("metadata", type=Path)
+    parser.add_argument("destination", type=Path)
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of UF files processed concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--output-format",
+        choices=OUTPUT_FORMATS,
+        default="csv",
+        help="csv: one file per UF; parquet: dataset partitioned by "
+        "ESTADO/MUNICIPIO (default: csv)",
+    )
+    parser.add_argument(
+        "--engine",
+        choices=ENGINES,
+        default="c",
+        help="CSV reader: pandas C parser or multithreaded Arrow (default: c)",
+    )
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Reprocess every file, even those the manifest marks as up to date",
+    )
+    parser.add_argument(
+        "--memory-budget",
+        type=int,
+        help="Peak memory (MB) of the processing, shared by the workers: chunk "
+        f"sizes are measured to fit it (default: {CHUNKSIZE:,} rows per chunk)",
+    )
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
 
-    main(Path(sys.argv[1]), Path(sys.argv[2]), Path(sys.argv[3]))
+    instrumentation.configure(args.metrics, args.profile)
+    main(
+        args.source,
+        args.metadata,
+        args.destination,
+        workers=args.workers,
+        output_format=args.output_format,
+        engine=args.engine,
+        force=args.force,
+        memory_budget=args.memory_budget * MB if args.memory_budget else None,
+    )
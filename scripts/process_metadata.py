@@ -1,9 +1,13 @@
+import argparse
 import json
-import sys
 from pathlib import Path
 
 import pandas as pd
 
+from scripts import instrumentation
+from scripts.manifest import MANIFEST_FILENAME, Manifest, code_version, fingerprint
+from scripts.territory import TERRITORY_FILENAME, write_territory
+
 HEADER_POS = 6
 
 STATE_MUNICIPALITY_FILE = "RELATORIO_DTB_BRASIL_2024_MUNICIPIOS.xls"
@@ -36,11 +40,31 @@ SUBDISTRITAL_COLUMNS = [
 ]
 SUBDISTRITAL_MAPPING_FILENAME = "subdistrital_mapping.json"
 
+# Code the outputs depend on: the territory file is written by territory.py,
+# and the manifest decides what is skipped
+VERSION_SOURCES = [
+    Path(__file__),
+    Path(__file__).with_name("territory.py"),
+    Path(__file__).with_name("manifest.py"),
+]
 
-def main(source: Path, output_dir: Path):
 
+def build_mappings(source: Path, output_dir: Path, force: bool = False) -> int:
+    """Write the mappings of the DTB files in `source`, returning the bytes read."""
     Path(output_dir).mkdir(parents=True, exist_ok=True)
 
+    # Skip the slow XLS parsing when the DTB files and the code are unchanged
+    manifest = Manifest(Path(output_dir, MANIFEST_FILENAME))
+    previous = manifest.previous_inputs("metadata")
+    inputs = {
+        name: fingerprint(Path(source, name), previous.get(name))
+        for name in [STATE_MUNICIPALITY_FILE, DISTRITAL_FILE, SUBDISTRITAL_FILE]
+    }
+    version = code_version(*VERSION_SOURCES)
+    if not force and manifest.is_current("metadata", inputs, version):
+        print("Metadata mappings are up to date.")
+        return 0
+
     mun_filepath = Path(source, STATE_MUNICIPALITY_FILE)
     df_sta_and_mun = pd.read_excel(
         mun_filepath,
@@ -90,6 +114,52 @@ def main(source: Path, output_dir: Path):
         print(f"Creating subdistrital mapping file...")
         json.dump(subdistrital_mapping, file, ensure_ascii=False)
 
+    # The same mappings, compiled for workers to map instead of parsing JSON
+    print("Compiling territory file...")
+    write_territory(
+        {
+            "state": state_mapping,
+            "municipality": municipality_mapping,
+            "distrital": distrital_mapping,
+            "subdistrital": subdistrital_mapping,
+        },
+        output_dir / TERRITORY_FILENAME,
+    )
+
+    manifest.record(
+        "metadata",
+        inputs,
+        version,
+        [
+            Path(output_dir, filename)
+            for filename in [
+                STATE_MAPPING_FILENAME,
+                MUNICIPALITY_MAPPING_FILENAME,
+                DISTRITAL_MAPPING_FILENAME,
+                SUBDISTRITAL_MAPPING_FILENAME,
+                TERRITORY_FILENAME,
+            ]
+        ],
+    )
+    return sum(fp["size"] for fp in inputs.values() if fp is not None)
+
+
+def main(source: Path, output_dir: Path, force: bool = False):
+    with instrumentation.stage("process_metadata") as measured:
+        measured.nbytes = build_mappings(source, output_dir, force)
+
 
 if __name__ == "__main__":
-    main(Path(sys.argv[1]), Path(sys.argv[2]))
+    parser = argparse.ArgumentParser(description="Build the territorial mappings.")
+    parser.add_argument("source", type=Path)
+    parser.add_argument("output_dir", type=Path)
+    parser.add_argument(
+        "--force",
+        action="store_true",
+        help="Rebuild the mappings even if the manifest marks them up to date",
+    )
+    instrumentation.add_arguments(parser)
+    args = parser.parse_args()
+
+    instrumentation.configure(args.metrics, args.profile)
+    main(args.source, args.output_dir, force=args.force)
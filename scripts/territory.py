@@ -0,0 +1,166 @@
+"""
+Compiled territorial metadata: the codes and names of the four DTB levels and
+their hierarchy, in one binary file written by `process_metadata`.
+
+The file is a sequence of `.npy` arrays, four per level in `LEVELS` order:
+
+    codes         IBGE codes of the level, sorted (int64)
+    parents       position in the level above of each code's parent (int32),
+                  -1 for states and orphans
+    name_ids      position in the names of each code's name (int32)
+    name_bytes    sorted distinct names, one per line, UTF-8 encoded (uint8)
+
+Opening it only reads the array headers: the arrays are mapped, so worker
+processes share the pages of one file instead of parsing the JSON mappings,
+and the names are decoded when first asked for.
+"""
+
+import mmap
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+TERRITORY_FILENAME = "territory.bin"
+FORMAT_VERSION = 1
+
+LEVELS = ["state", "municipality", "distrital", "subdistrital"]
+
+# Level above and the divisor giving the parent's code: a municipality's code
+# is its UF's followed by 5 digits, districts and subdistricts add 2
+PARENTS = {
+    "municipality": ("state", 100_000),
+    "distrital": ("municipality", 100),
+    "subdistrital": ("distrital", 100),
+}
+
+ARRAYS = ["codes", "parents", "name_ids", "name_bytes"]
+
+HEADER_READERS = {
+    (1, 0): np.lib.format.read_array_header_1_0,
+    (2, 0): np.lib.format.read_array_header_2_0,
+}
+
+
+def find_codes(codes: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Positions of `values` in the sorted `codes`, -1 for those missing."""
+    values = np.asarray(values, dtype="int64")
+    if not len(codes):
+        return np.full(values.shape, -1, dtype="int64")
+    index = np.searchsorted(codes, values).clip(max=len(codes) - 1)
+    return np.where(codes[index] == values, index, -1)
+
+
+@dataclass
+class Level:
+    """The codes and names of one territorial level, backed by the file."""
+
+    codes: np.ndarray
+    parents: np.ndarray
+    name_ids: np.ndarray
+    name_bytes: np.ndarray
+    _names: Optional[List[str]] = field(default=None, repr=False)
+
+    @property
+    def names(self) -> List[str]:
+        """Sorted distinct names of the level, decoded on first use."""
+        if self._names is None:
+            # Split in one go: much faster than decoding each name on its own
+            text = self.name_bytes.tobytes().decode("utf-8")
+            self._names = text.split("\n") if len(self.name_ids) else []
+        return self._names
+
+    def mapping(self) -> Dict[str, str]:
+        """The level as a code -> name dict, as in the JSON mappings."""
+        names = self.names
+        return {
+            str(code): names[name_id]
+            for code, name_id in zip(self.codes.tolist(), self.name_ids.tolist())
+        }
+
+
+def _compile_level(mapping: Dict, parent: Optional[np.ndarray], divisor: int):
+    codes = np.array([int(code) for code in mapping], dtype="int64")
+    values = [str(name) for name in mapping.values()]
+    names = sorted(set(values))
+    if any("\n" in name for name in names):
+        raise ValueError("Territorial names cannot hold line breaks")
+    position = {name: index for index, name in enumerate(names)}
+    name_ids = np.array([position[name] for name in values], dtype="int32")
+
+    order = np.argsort(codes)
+    codes, name_ids = codes[order], name_ids[order]
+    if parent is None:
+        parents = np.full(len(codes), -1, dtype="int32")
+    else:
+        parents = find_codes(parent, codes // divisor).astype("int32")
+
+    name_bytes = np.frombuffer("\n".join(names).encode("utf-8"), dtype="uint8")
+    return codes, parents, name_ids, name_bytes
+
+
+def write_territory(mappings: Dict[str, Dict], path: Path):
+    """
+    Compile the code -> name mappings of every level into the file at `path`.
+    Parents are found from the codes themselves, which nest as in `PARENTS`.
+    """
+    compiled = {}
+    for name in LEVELS:
+        parent, divisor = PARENTS.get(name, (None, 1))
+        parent_codes = compiled[parent][0] if parent else None
+        compiled[name] = _compile_level(mappings[name], parent_codes, divisor)
+
+    # Written to a temporary name, so workers never map a partial file
+    partial = Path(path).with_suffix(".partial")
+    with open(partial, "wb") as f:
+        np.save(f, np.array([FORMAT_VERSION]))
+        for name in LEVELS:
+            for array in compiled[name]:
+                np.save(f, array)
+    partial.replace(path)
+
+
+def _map_arrays(path: Path) -> List[np.ndarray]:
+    """Views of every array of the file over one read-only map of it."""
+    with open(path, "rb") as f:
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        arrays = []
+        while f.tell() < len(data):
+            reader = HEADER_READERS.get(np.lib.format.read_magic(f))
+            if reader is None:
+                raise ValueError("Unsupported .npy version")
+            shape, _, dtype = reader(f)
+            count = int(np.prod(shape))
+            arrays.append(np.frombuffer(data, dtype, count, f.tell()).reshape(shape))
+            f.seek(count * dtype.itemsize, 1)
+    return arrays
+
+
+class Territory:
+    """The territorial levels of a compiled file, mapped read-only."""
+
+    def __init__(self, path: Path):
+        path = Path(path)
+        try:
+            version, *arrays = _map_arrays(path)
+        except ValueError as exc:
+            raise ValueError(f"{path} is not a compiled territory file") from exc
+        if version.tolist() != [FORMAT_VERSION]:
+            raise ValueError(f"{path} has format {version}, not {FORMAT_VERSION}")
+        if len(arrays) != len(LEVELS) * len(ARRAYS):
+            raise ValueError(f"{path} is not a compiled territory file")
+
+        groups = zip(*[iter(arrays)] * len(ARRAYS))
+        self.levels = {name: Level(*group) for name, group in zip(LEVELS, groups)}
+
+    def __getitem__(self, name: str) -> Level:
+        return self.levels[name]
+
+    def parent(self, name: str, code: int) -> Optional[int]:
+        """Code of the parent of `code` of level `name`, None if it has none."""
+        level = self.levels[name]
+        (position,) = find_codes(level.codes, [code])
+        if position < 0 or name not in PARENTS or level.parents[position] < 0:
+            return None
+        return int(self.levels[PARENTS[name][0]].codes[level.parents[position]])
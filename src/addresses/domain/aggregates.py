@@ -9,7 +9,7 @@ from addresses.domain.value_objects import (
 )
 
 
-@dataclass
+@dataclass(slots=True)
 class Address:
     id: str
     territorial_division: TerritorialDivision
@@ -0,0 +1,195 @@
+from dataclasses import dataclass, fields
+from typing import Iterator, List
+
+import numpy as np
+import pandas as pd
+
+from addresses.domain.aggregates import Address
+from addresses.domain.value_objects import (
+    AddressSpecies,
+    Coordinate,
+    GeocodingLevel,
+    PostalCode,
+    StreetAddress,
+    TerritorialDivision,
+)
+
+TEXT_FIELDS = [
+    "uf",
+    "municipality",
+    "district",
+    "subdistrict",
+    "street",
+    "street_type",
+    "number",
+    "complement",
+    "neighborhood",
+    "postal_code",
+]
+
+POSTAL_CODE_PATTERN = r"^\d{5}-\d{3}$"
+SPECIES_VALUES = [species.value for species in AddressSpecies]
+GEOCODING_VALUES = [level.value for level in GeocodingLevel]
+
+
+def _categorical(values) -> pd.Categorical:
+    if isinstance(values, pd.Categorical):
+        return values
+    return pd.Categorical(values)
+
+
+def _invalid(message: str, rows: np.ndarray):
+    raise ValueError(f"{message} ({int(rows.sum())} rows)")
+
+
+@dataclass(frozen=True)
+class AddressBatch:
+    """
+    A chunk of addresses held as columns: float64 coordinates, int8 enums and
+    dictionary-encoded (categorical) text. Enforces the invariants of the
+    Address value objects for the whole chunk at once; `Address` objects are
+    only built when rows are accessed.
+    """
+
+    id: np.ndarray
+    uf: pd.Categorical
+    municipality: pd.Categorical
+    district: pd.Categorical
+    subdistrict: pd.Categorical
+    street: pd.Categorical
+    street_type: pd.Categorical
+    number: pd.Categorical
+    complement: pd.Categorical
+    neighborhood: pd.Categorical
+    postal_code: pd.Categorical
+    latitude: np.ndarray
+    longitude: np.ndarray
+    precision: np.ndarray
+    species: np.ndarray
+
+    def __post_init__(self):
+        # Normalize the column types, then validate them in bulk
+        set_field = object.__setattr__
+        set_field(self, "id", np.asarray(self.id, dtype=object))
+        for name in TEXT_FIELDS:
+            set_field(self, name, _categorical(getattr(self, name)))
+        for name in ["latitude", "longitude"]:
+            set_field(self, name, np.asarray(getattr(self, name), dtype=np.float64))
+        for name in ["precision", "species"]:
+            set_field(self, name, np.asarray(getattr(self, name), dtype=np.int8))
+        self.validate()
+
+    def validate(self):
+        lengths = {len(getattr(self, field.name)) for field in fields(self)}
+        if len(lengths) > 1:
+            raise ValueError("All columns should have the same length")
+
+        if pd.api.types.infer_dtype(self.id, skipna=False) not in ["string", "empty"]:
+            raise ValueError("ID should be a non-empty string")
+        invalid = self.id == ""
+        if invalid.any():
+            _invalid("ID should be a non-empty string", invalid)
+
+        # Text rules are checked once per distinct value
+        for name in TEXT_FIELDS:
+            column = getattr(self, name)
+            if pd.api.types.infer_dtype(column.categories) not in ["string", "empty"]:
+                raise ValueError(f"{name} should be of type str")
+            if (column.codes == -1).any():
+                _invalid(f"{name} should be of type str", column.codes == -1)
+
+        uf = self.uf.categories
+        valid = np.asarray((uf.str.len() == 2) & uf.str.isalpha(), dtype=bool)
+        invalid = ~valid[self.uf.codes]
+        if invalid.any():
+            _invalid("UF name should be 2 alphabetic characters", invalid)
+
+        # Arrow-backed strings match the pattern in C rather than per value
+        codes = self.postal_code.categories.astype("string[pyarrow]")
+        valid = np.asarray(codes.str.match(POSTAL_CODE_PATTERN), dtype=bool)
+        invalid = ~valid[self.postal_code.codes]
+        if invalid.any():
+            _invalid("Postal code should be in the format XXXXX-XXX", invalid)
+
+        # NaN fails both comparisons
+        invalid = ~((self.latitude >= -90) & (self.latitude <= 90))
+        if invalid.any():
+            _invalid("latitude should be between -90 and 90", invalid)
+        invalid = ~((self.longitude >= -180) & (self.longitude <= 180))
+        if invalid.any():
+            _invalid("longitude should be between -180 and 180", invalid)
+
+        invalid = ~np.isin(self.precision, GEOCODING_VALUES)
+        if invalid.any():
+            _invalid("precision should be a GeocodingLevel", invalid)
+        invalid = ~np.isin(self.species, SPECIES_VALUES)
+        if invalid.any():
+            _invalid("species should be an AddressSpecies", invalid)
+
+    @classmethod
+    def from_addresses(cls, addresses: List[Address]) -> "AddressBatch":
+        columns = {name: [] for name in [field.name for field in fields(cls)]}
+        for address in addresses:
+            division, street = address.territorial_division, address.street_address
+            values = {
+                "id": address.id,
+                "uf": division.uf,
+                "municipality": division.municipality,
+                "district": division.district,
+                "subdistrict": division.subdistrict,
+                "street": street.street,
+                "street_type": street.street_type,
+                "number": str(street.number),
+                "complement": street.complement,
+                "neighborhood": street.neighborhood,
+                "postal_code": address.postal_code.code,
+                "latitude": address.coordinate.latitude,
+                "longitude": address.coordinate.longitude,
+                "precision": address.coordinate.precision.value,
+                "species": address.species.value,
+            }
+            for name, value in values.items():
+                columns[name].append(value)
+        return cls(**columns)
+
+    def __len__(self) -> int:
+        return len(self.id)
+
+    def __getitem__(self, index: int) -> Address:
+        """The Address at `index`, built on demand."""
+        return Address(
+            id=self.id[index],
+            territorial_division=TerritorialDivision.of(
+                uf=self.uf[index],
+                municipality=self.municipality[index],
+                district=self.district[index],
+                subdistrict=self.subdistrict[index],
+            ),
+            street_address=StreetAddress(
+                street=self.street[index],
+                street_type=self.street_type[index],
+                number=self.number[index],
+                complement=self.complement[index],
+                neighborhood=self.neighborhood[index],
+            ),
+            postal_code=PostalCode.of(self.postal_code[index]),
+            coordinate=Coordinate(
+                latitude=float(self.latitude[index]),
+                longitude=float(self.longitude[index]),
+                precision=GeocodingLevel(int(self.precision[index])),
+            ),
+            species=AddressSpecies(int(self.species[index])),
+        )
+
+    def __iter__(self) -> Iterator[Address]:
+        for index in range(len(self)):
+            yield self[index]
+
+    def take(self, indices) -> "AddressBatch":
+        """A batch with the rows at `indices` (or where a boolean mask is set)."""
+        indices = np.asarray(indices)
+        if indices.dtype == bool:
+            indices = np.flatnonzero(indices)
+        return AddressBatch(
+            **{field.name: getattr(self, field.name)[indices] for field in fields(self)}
+        )
@@ -0,0 +1,16 @@
+from typing import List, Optional, Protocol
+
+from addresses.domain.aggregates import Address
+from addresses.domain.value_objects import PostalCode, TerritorialDivision
+
+
+class AddressRepository(Protocol):
+    def save_batch(self, addresses: List[Address]) -> None: ...
+
+    def find_by_id(self, address_id: str) -> Optional[Address]: ...
+
+    def find_by_territorial_division(
+        self, code: TerritorialDivision
+    ) -> List[Address]: ...
+
+    def find_by_postal_code(self, postal_code: PostalCode) -> List[Address]: ...
@@ -1,5 +1,11 @@
 from dataclasses import dataclass
 from enum import Enum
+from typing import Dict, Tuple
+
+# Interned value objects, see `of`. Never evicted: the distinct values of the
+# whole CNEFE fit in memory (about 900 thousand CEPs and 15 thousand divisions)
+_POSTAL_CODES: Dict[str, "PostalCode"] = {}
+_DIVISIONS: Dict[Tuple[str, str, str, str], "TerritorialDivision"] = {}
 
 
 class GeocodingLevel(Enum):
@@ -22,7 +28,7 @@ class AddressSpecies(Enum):
     RELIGIOUS = 8
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Coordinate:
     latitude: float
     longitude: float
@@ -40,7 +46,7 @@ class Coordinate:
             raise ValueError("longitude should be between -180 and 180")
 
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PostalCode:
     code: str  # Fomat: XXXXX-XXX
 
@@ -55,8 +61,16 @@ class PostalCode:
                 "Postal code should contain only digits in the format XXXXX-XXX"
             )
 
+    @classmethod
+    def of(cls, code: str) -> "PostalCode":
+        """Shared instance for `code`; about a hundred addresses share each CEP."""
+        postal_code = _POSTAL_CODES.get(code)
+        if postal_code is None:
+            postal_code = _POSTAL_CODES.setdefault(code, cls(code))
+        return postal_code
+
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class TerritorialDivision:
     uf: str
     municipality: str
@@ -77,8 +91,20 @@ class TerritorialDivision:
         if len(self.uf) != 2 or not self.uf.isalpha:
             raise ValueError("UF name should be 2 alphabetic characters")
 
+    @classmethod
+    def of(
+        cls, uf: str, municipality: str, district: str, subdistrict: str
+    ) -> "TerritorialDivision":
+        """Shared instance for these names: a few thousand divisions cover the
+        millions of addresses, so aggregates can point to the same one."""
+        key = (uf, municipality, district, subdistrict)
+        division = _DIVISIONS.get(key)
+        if division is None:
+            division = _DIVISIONS.setdefault(key, cls(*key))
+        return division
+
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class StreetAddress:
     street: str
     street_type: str
@@ -0,0 +1,352 @@
+"""
+Link address records, such as a customer list, to the rows of the processed CSV
+store.
+
+A record is only compared with the store rows of its block, those sharing its
+CEP and municipality, instead of the whole store. Each candidate is scored by
+the trigram similarity (as in text_index) of RUA, NUMERO and COMPLEMENTO,
+weighted by WEIGHTS, and the best candidate at or above the minimum score is
+the match. Candidates are scored in vectorized chunks of at most PAIRS pairs,
+and each UF file of the store is linked in its own task, so files run in
+parallel.
+"""
+
+import argparse
+import csv
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+from tqdm import tqdm
+
+from addresses.infrastructure.postal_code_index import (
+    postal_code_numbers,
+    postal_codes,
+)
+from addresses.infrastructure.text_index import TRIGRAMS, normalize, trigrams
+
+FIELDS = ["RUA", "NUMERO", "COMPLEMENTO"]
+WEIGHTS = [0.6, 0.3, 0.1]  # Of the similarity of each of FIELDS
+REQUIRED_COLUMNS = ["CEP", "MUNICIPIO", "RUA", "NUMERO"]  # COMPLEMENTO optional
+MIN_SCORE = 0.7
+PAIRS = 2_000_000  # Candidate pairs scored at once, bounding memory
+
+Trigrams = Tuple[np.ndarray, np.ndarray]
+
+
+def read_table(path: Path, columns: List[str]) -> pa.Table:
+    """Text columns of a CSV, null where missing from the file."""
+    return pacsv.read_csv(
+        path,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=columns,
+            include_missing_columns=True,
+            column_types={column: pa.string() for column in columns},
+            strings_can_be_null=True,
+        ),
+    )
+
+
+def read_records(path: Path, id_column: str) -> pa.Table:
+    """Records to link: an identifier, CEP, MUNICIPIO, RUA, NUMERO and
+    optionally COMPLEMENTO."""
+    with open(path, encoding="utf-8", newline="") as f:
+        header = next(csv.reader(f), [])
+    missing = [c for c in [id_column, *REQUIRED_COLUMNS] if c not in header]
+    if missing:
+        raise ValueError(f"{path} is missing the columns {missing}")
+    return read_table(path, [id_column, "CEP", "MUNICIPIO", *FIELDS])
+
+
+def encode(arrays: Sequence[pa.ChunkedArray]) -> Tuple[List[np.ndarray], pa.Array]:
+    """Codes of the values of each array in one shared dictionary."""
+    chunks = [chunk for array in arrays for chunk in array.cast(pa.string()).chunks]
+    encoded = pc.dictionary_encode(
+        pa.chunked_array(chunks, pa.string()).combine_chunks()
+    )
+    codes = encoded.indices.to_numpy(zero_copy_only=False).astype(np.int64)
+    return np.split(codes, np.cumsum([len(a) for a in arrays])[:-1]), encoded.dictionary
+
+
+def trigram_sets(texts: pa.Array) -> Trigrams:
+    """Sorted (text * TRIGRAMS + trigram) keys of normalized texts, and the
+    start of the keys of each text."""
+    ids, grams = trigrams(texts)
+    starts = np.searchsorted(ids, np.arange(len(texts) + 1))
+    return ids * TRIGRAMS + grams, starts
+
+
+def expand(starts: np.ndarray, counts: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Range and position of each element of the ranges [starts[k], starts[k] +
+    counts[k])."""
+    owner = np.repeat(np.arange(len(starts)), counts)
+    first = np.cumsum(counts) - counts
+    return owner, np.arange(len(owner)) + (starts - first)[owner]
+
+
+def jaccard(left: np.ndarray, right: np.ndarray, sets: Trigrams) -> np.ndarray:
+    """Shared over distinct trigrams of the texts left[k] and right[k], 1.0
+    when both have none."""
+    keys, starts = sets
+    sizes = np.diff(starts)
+    pair, at = expand(starts[left], sizes[left])
+    wanted = right[pair] * TRIGRAMS + keys[at] % TRIGRAMS
+    found = np.searchsorted(keys, wanted)
+    found = keys[np.minimum(found, len(keys) - 1)] == wanted if len(keys) else found
+    shared = np.bincount(pair, weights=found, minlength=len(left))
+    union = sizes[left] + sizes[right] - shared
+    return np.divide(shared, union, out=np.ones(len(left)), where=union > 0)
+
+
+def similarity(left, right) -> np.ndarray:
+    """Trigram similarity of each pair of aligned texts: "RUA DOM PEDRO" vs
+    "rua d. pedro" -> 0.73."""
+    (left, right), dictionary = encode(
+        [normalize(pa.chunked_array([left])), normalize(pa.chunked_array([right]))]
+    )
+    return jaccard(left, right, trigram_sets(dictionary))
+
+
+def pair_similarity(left: np.ndarray, right: np.ndarray, sets: Trigrams) -> np.ndarray:
+    """jaccard() of texts given by dictionary codes, computed once per distinct
+    pair: a block compares few distinct streets many times."""
+    scores = np.ones(len(left))
+    differ = np.flatnonzero(left != right)
+    size = len(sets[1]) - 1
+    pairs, inverse = np.unique(left[differ] * size + right[differ], return_inverse=True)
+    scores[differ] = jaccard(pairs // size, pairs % size, sets)[inverse]
+    return scores
+
+
+def blocks(records: pa.Table, reference: pa.Table) -> List[np.ndarray]:
+    """Block of each record and reference row, -1 without a CEP: rows share a
+    block when they have the same CEP and municipality."""
+    ceps = [postal_code_numbers(table["CEP"]) for table in (records, reference)]
+    keys = [
+        pc.binary_join_element_wise(
+            pa.array(cep).cast(pa.string()), normalize(table["MUNICIPIO"]), "|"
+        )
+        for cep, table in zip(ceps, (records, reference))
+    ]
+    codes, _ = encode(keys)
+    return [np.where(cep > 0, code, -1) for cep, code in zip(ceps, codes)]
+
+
+def link_tables(
+    records: pa.Table,
+    reference: pa.Table,
+    min_score: float = MIN_SCORE,
+    pairs: int = PAIRS,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Best reference row for each record among those of its block. Returns the
+    records matched with a score of at least `min_score`, their reference rows
+    and scores; ties go to the first reference row.
+    """
+    fields = []
+    for field in FIELDS:
+        codes, dictionary = encode(
+            [normalize(records[field]), normalize(reference[field])]
+        )
+        fields.append((*codes, trigram_sets(dictionary)))
+    record_streets, reference_streets, street_sets = fields[0]
+
+    # Reference rows by block, then street: a generic CEP covers a whole town,
+    # and only the rows of streets like the record's are worth scoring
+    record_blocks, reference_blocks = blocks(records, reference)
+    order = np.lexsort((reference_streets, reference_blocks))
+    order = order[reference_blocks[order] >= 0]
+    sorted_blocks, sorted_streets = reference_blocks[order], reference_streets[order]
+    group_starts = np.flatnonzero(
+        np.r_[
+            True,
+            (sorted_blocks[1:] != sorted_blocks[:-1])
+            | (sorted_streets[1:] != sorted_streets[:-1]),
+        ]
+    )
+    group_sizes = np.diff(np.r_[group_starts, len(order)])
+    first_group = np.searchsorted(sorted_blocks[group_starts], record_blocks, "left")
+    groups = (
+        np.searchsorted(sorted_blocks[group_starts], record_blocks, "right")
+        - first_group
+    )
+    # Rows of each record's block, bounding the pairs it may need
+    counts = np.searchsorted(sorted_blocks, record_blocks, "right") - np.searchsorted(
+        sorted_blocks, record_blocks, "left"
+    )
+    # Lowest street similarity that can still reach min_score
+    lowest = (min_score - sum(WEIGHTS[1:])) / WEIGHTS[0]
+
+    matched, rows, scores = [], [], []
+    candidates = np.flatnonzero(counts)
+    offsets = np.concatenate([[0], np.cumsum(counts[candidates])])
+    begin = 0
+    while begin < len(candidates):
+        # Records with at most `pairs` candidates in all, and at least one
+        end = np.searchsorted(offsets, offsets[begin] + pairs, "right") - 1
+        end = max(end, begin + 1)
+        chunk = candidates[begin:end]
+        begin = end
+
+        owner, group = expand(first_group[chunk], groups[chunk])
+        record = chunk[owner]
+        street = pair_similarity(
+            record_streets[record], sorted_streets[group_starts[group]], street_sets
+        )
+        kept = street >= lowest
+        record, group, street = record[kept], group[kept], street[kept]
+
+        owner, at = expand(group_starts[group], group_sizes[group])
+        record, row, score = record[owner], order[at], WEIGHTS[0] * street[owner]
+        for weight, (record_codes, reference_codes, sets) in zip(
+            WEIGHTS[1:], fields[1:]
+        ):
+            score += weight * pair_similarity(
+                record_codes[record], reference_codes[row], sets
+            )
+
+        if not len(record):
+            continue
+        # Pairs come grouped by record: reduce each group to its first row of
+        # highest score
+        new = np.diff(record, prepend=-1) != 0
+        first, group = np.flatnonzero(new), np.cumsum(new) - 1
+        top = np.maximum.reduceat(score, first)
+        best = np.minimum.reduceat(
+            np.where(score == top[group], row, len(reference)), first
+        )
+        kept = top >= min_score
+        matched.append(record[first][kept])
+        rows.append(best[kept])
+        scores.append(top[kept])
+
+    if not matched:
+        return np.empty(0, np.int64), np.empty(0, np.int64), np.empty(0)
+    return np.concatenate(matched), np.concatenate(rows), np.concatenate(scores)
+
+
+def link_file(
+    path: Path, records: pa.Table, min_score: float = MIN_SCORE
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """link_tables() against one processed CSV, with the ID_ENDERECO of the
+    matches instead of their rows."""
+    reference = read_table(path, ["ID_ENDERECO", "CEP", "MUNICIPIO", *FIELDS])
+    matched, rows, scores = link_tables(records, reference, min_score)
+    ids = reference["ID_ENDERECO"].take(rows).to_numpy(zero_copy_only=False)
+    return matched, ids, scores
+
+
+def link(
+    source: Path,
+    records_path: Path,
+    destination: Path,
+    id_column: str = "ID",
+    workers: int = 1,
+    min_score: float = MIN_SCORE,
+) -> int:
+    """
+    Link the records in `records_path` to the processed CSVs in `source` and
+    write their identifier, best-match ID_ENDERECO and SCORE to
+    `destination`, leaving both empty for records without a match. Returns
+    the number of records matched.
+    """
+    paths = sorted(Path(source).glob("*.csv"))
+    if not paths:
+        raise ValueError(f"No processed CSV files in {source}")
+    records = read_records(records_path, id_column)
+    ceps = postal_code_numbers(records["CEP"])
+
+    # Each file is only sent the records whose CEP it holds
+    tasks = []
+    for path in paths:
+        positions = np.flatnonzero(np.isin(ceps, postal_codes(path)) & (ceps > 0))
+        if len(positions):
+            tasks.append((path, positions))
+
+    ids = np.full(len(records), None, dtype=object)
+    scores = np.zeros(len(records))
+
+    def collect(positions, result):
+        matched, found, found_scores = result
+        at = positions[matched]
+        # A CEP may span two files: keep the best of both
+        better = found_scores > scores[at]
+        ids[at[better]] = found[better]
+        scores[at[better]] = found_scores[better]
+
+    with tqdm(total=len(tasks), desc="Linking", unit="file") as pbar:
+        if workers <= 1:
+            for path, positions in tasks:
+                collect(positions, link_file(path, records.take(positions), min_score))
+                pbar.update(1)
+        else:
+            with ProcessPoolExecutor(
+                max_workers=workers, mp_context=multiprocessing.get_context("spawn")
+            ) as executor:
+                futures = {
+                    executor.submit(
+                        link_file, path, records.take(positions), min_score
+                    ): positions
+                    for path, positions in tasks
+                }
+                for future in as_completed(futures):
+                    collect(futures[future], future.result())
+                    pbar.update(1)
+
+    linked = pd.notna(ids)
+    pd.DataFrame(
+        {
+            id_column: records[id_column].to_numpy(zero_copy_only=False),
+            "ID_ENDERECO": ids,
+            "SCORE": np.where(linked, scores.round(4), np.nan),
+        }
+    ).to_csv(destination, index=False)
+    return int(linked.sum())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Link address records to the processed addresses."
+    )
+    parser.add_argument("source", type=Path, help="CSV output of process_addresses")
+    parser.add_argument(
+        "records",
+        type=Path,
+        help="CSV with an identifier, CEP, MUNICIPIO, RUA, NUMERO and "
+        "optionally COMPLEMENTO",
+    )
+    parser.add_argument("destination", type=Path)
+    parser.add_argument(
+        "--id-column",
+        default="ID",
+        help="Column identifying the records (default: ID)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Number of UF files linked concurrently (default: 1)",
+    )
+    parser.add_argument(
+        "--min-score",
+        type=float,
+        default=MIN_SCORE,
+        help=f"Lowest score accepted as a match (default: {MIN_SCORE})",
+    )
+    args = parser.parse_args()
+
+    linked = link(
+        args.source,
+        args.records,
+        args.destination,
+        id_column=args.id_column,
+        workers=args.workers,
+        min_score=args.min_score,
+    )
+    print(f"Linked {linked:,} records.")
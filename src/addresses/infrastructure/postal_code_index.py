@@ -0,0 +1,196 @@
+"""
+Compiled CEP index over the processed CSV store.
+
+Rows are sorted by CEP and stored as three memory-mapped arrays, so a lookup
+is a binary search followed by one `pread` per matching row:
+
+    <directory>/index.json         store location, file names and sizes
+    <directory>/postal_codes.npy   CEP of each row as an integer, sorted
+    <directory>/files.npy          position of the row's file in index.json
+    <directory>/offsets.npy        byte offset of the row in its file
+
+Opening the index maps the arrays without reading them, and rows are read
+with `pread`, so the index is safe to use from forked workers.
+"""
+
+import argparse
+import csv
+import json
+import os
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from addresses.domain.aggregates import Address
+from addresses.domain.value_objects import PostalCode
+from addresses.infrastructure.records import to_address
+
+INDEX_FILENAME = "index.json"
+READ_SIZE = 64 * 1024 * 1024  # 64 MB, scanned for line starts
+LINE_SIZE = 4096  # Bytes read per pread, more than a processed row
+
+
+def line_offsets(path: Path) -> np.ndarray:
+    """Byte offsets of the data lines of a CSV file, header excluded."""
+    starts = [np.zeros(1, dtype=np.uint64)]
+    position = 0
+    with open(path, "rb") as f:
+        while block := f.read(READ_SIZE):
+            newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == 10)
+            starts.append((newlines + position + 1).astype(np.uint64))
+            position += len(block)
+    starts = np.concatenate(starts)
+    # Drop the header line and the start past the final newline
+    return starts[1:][starts[1:] < position]
+
+
+def postal_code_numbers(values) -> np.ndarray:
+    """CEPs as uint32 ("76801-000" -> 76801000), 0 where missing or longer
+    than 8 digits."""
+    digits = pc.replace_substring_regex(values, "[^0-9]", "")
+    length = pc.utf8_length(digits)
+    invalid = pc.or_(pc.equal(length, 0), pc.greater(length, 8))
+    digits = pc.if_else(invalid, None, digits)
+    return pc.fill_null(digits.cast(pa.uint32()), 0).to_numpy()
+
+
+def postal_codes(path: Path) -> np.ndarray:
+    """CEP of each row of a processed CSV as uint32, 0 where missing."""
+    column = pacsv.read_csv(
+        path,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=["CEP"],
+            column_types={"CEP": pa.string()},
+            strings_can_be_null=True,
+        ),
+    )["CEP"]
+    return postal_code_numbers(column)
+
+
+def build(source: Path, directory: Path) -> "PostalCodeIndex":
+    """Build the CEP index of the processed CSVs in `source` into `directory`."""
+    source, directory = Path(source).resolve(), Path(directory)
+    paths = sorted(source.glob("*.csv"))
+    if not paths:
+        raise ValueError(f"No processed CSV files in {source}")
+
+    codes, files, offsets = [], [], []
+    for number, path in enumerate(paths):
+        file_codes, file_offsets = postal_codes(path), line_offsets(path)
+        if len(file_codes) != len(file_offsets):
+            raise ValueError(f"{path}: rows do not match lines (quoted newlines?)")
+        found = file_codes > 0
+        codes.append(file_codes[found])
+        offsets.append(file_offsets[found])
+        files.append(np.full(found.sum(), number, dtype=np.uint16))
+
+    codes, files, offsets = map(np.concatenate, (codes, files, offsets))
+    # By CEP, then in file order for sequential reads
+    order = np.lexsort((offsets, files, codes))
+
+    directory.mkdir(exist_ok=True, parents=True)
+    np.save(directory / "postal_codes.npy", codes[order])
+    np.save(directory / "files.npy", files[order])
+    np.save(directory / "offsets.npy", offsets[order])
+    with open(directory / INDEX_FILENAME, "w", encoding="utf-8") as f:
+        json.dump(store_entry(source, paths), f, indent=2)
+    return PostalCodeIndex(directory)
+
+
+def store_entry(source: Path, paths: List[Path]) -> Dict:
+    """Location, file names and sizes of the indexed store, for index.json."""
+    return {
+        "store": str(source),
+        "files": [{"name": path.name, "size": path.stat().st_size} for path in paths],
+    }
+
+
+def store_paths(index: Dict, store: Optional[Path] = None) -> List[Path]:
+    """Paths of the files recorded by `store_entry`, checked to be unchanged."""
+    store = Path(store or index["store"])
+    paths = [store / entry["name"] for entry in index["files"]]
+    for path, entry in zip(paths, index["files"]):
+        if not path.exists() or path.stat().st_size != entry["size"]:
+            raise ValueError(f"{path} changed since the index was built")
+    return paths
+
+
+class RowReader:
+    """
+    Reads rows of the processed CSVs by byte offset, with one `pread` each.
+    `pread` does not move a shared file position, so readers are safe to use
+    from forked workers.
+    """
+
+    def __init__(self, paths: List[Path]):
+        self.paths = paths
+        self._descriptors: Dict[int, int] = {}
+        self._headers: Dict[int, List[str]] = {}
+
+    def close(self):
+        for fd in self._descriptors.values():
+            os.close(fd)
+        self._descriptors.clear()
+
+    def _descriptor(self, number: int) -> int:
+        if number not in self._descriptors:
+            self._descriptors[number] = os.open(self.paths[number], os.O_RDONLY)
+            with open(self.paths[number], "r", encoding="utf-8", newline="") as f:
+                self._headers[number] = next(csv.reader(f))
+        return self._descriptors[number]
+
+    def _read_line(self, number: int, offset: int) -> bytes:
+        fd, line = self._descriptor(number), b""
+        while True:
+            data = os.pread(fd, LINE_SIZE, offset + len(line))
+            end = data.find(b"\n")
+            if end >= 0 or not data:
+                return line + (data if end < 0 else data[:end])
+            line += data
+
+    def read(self, files: np.ndarray, offsets: np.ndarray) -> List[Address]:
+        """Addresses of the rows at `offsets` of the files numbered `files`."""
+        addresses = []
+        for number, offset in zip(files.tolist(), offsets.tolist()):
+            line = self._read_line(number, offset).decode("utf-8")
+            (values,) = csv.reader([line])
+            addresses.append(to_address(dict(zip(self._headers[number], values))))
+        return addresses
+
+
+class PostalCodeIndex:
+    """Serves `AddressRepository.find_by_postal_code` from a built index."""
+
+    def __init__(self, directory: Path, store: Optional[Path] = None):
+        directory = Path(directory)
+        with open(directory / INDEX_FILENAME, "r", encoding="utf-8") as f:
+            self.rows = RowReader(store_paths(json.load(f), store))
+
+        self.codes = np.load(directory / "postal_codes.npy", mmap_mode="r")
+        self.files = np.load(directory / "files.npy", mmap_mode="r")
+        self.offsets = np.load(directory / "offsets.npy", mmap_mode="r")
+
+    def close(self):
+        self.rows.close()
+
+    def find_by_postal_code(self, postal_code: PostalCode) -> List[Address]:
+        # Same dtype as the array, or numpy would cast all of it to compare
+        code = np.uint32(postal_code.code.replace("-", ""))
+        lo = np.searchsorted(self.codes, code, side="left")
+        hi = np.searchsorted(self.codes, code, side="right")
+        return self.rows.read(self.files[lo:hi], self.offsets[lo:hi])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the CEP index of the processed addresses."
+    )
+    parser.add_argument("source", type=Path, help="CSV output of process_addresses")
+    parser.add_argument("destination", type=Path)
+    args = parser.parse_args()
+
+    build(args.source, args.destination)
@@ -0,0 +1,177 @@
+from typing import Mapping
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from addresses.domain.aggregates import Address
+from addresses.domain.batch import AddressBatch
+from addresses.domain.value_objects import (
+    AddressSpecies,
+    Coordinate,
+    GeocodingLevel,
+    PostalCode,
+    StreetAddress,
+    TerritorialDivision,
+)
+
+# Names of the states in the territorial metadata (DTB) and their acronyms
+UF_ACRONYMS = {
+    "Rondônia": "RO",
+    "Acre": "AC",
+    "Amazonas": "AM",
+    "Roraima": "RR",
+    "Pará": "PA",
+    "Amapá": "AP",
+    "Tocantins": "TO",
+    "Maranhão": "MA",
+    "Piauí": "PI",
+    "Ceará": "CE",
+    "Rio Grande do Norte": "RN",
+    "Paraíba": "PB",
+    "Pernambuco": "PE",
+    "Alagoas": "AL",
+    "Sergipe": "SE",
+    "Bahia": "BA",
+    "Minas Gerais": "MG",
+    "Espírito Santo": "ES",
+    "Rio de Janeiro": "RJ",
+    "São Paulo": "SP",
+    "Paraná": "PR",
+    "Santa Catarina": "SC",
+    "Rio Grande do Sul": "RS",
+    "Mato Grosso do Sul": "MS",
+    "Mato Grosso": "MT",
+    "Goiás": "GO",
+    "Distrito Federal": "DF",
+}
+
+# Arrow types of the columns written by scripts/process_addresses.py
+PROCESSED_SCHEMA = pa.schema(
+    [
+        ("ID_ENDERECO", pa.string()),
+        ("ESTADO", pa.string()),
+        ("MUNICIPIO", pa.string()),
+        ("DISTRITO", pa.string()),
+        ("SUBDISTRITO", pa.string()),
+        ("BAIRRO", pa.string()),
+        ("CEP", pa.string()),
+        ("TIPO_LOGRADOURO", pa.string()),
+        ("RUA", pa.string()),
+        ("NUMERO", pa.string()),
+        ("COMPLEMENTO", pa.string()),
+        ("LATITUDE", pa.float64()),
+        ("LONGITUDE", pa.float64()),
+        ("ESPECIE", pa.int8()),
+        ("NIVEL_GEOCODIFICACAO", pa.int8()),
+    ]
+)
+
+
+def uf_acronym(name: str) -> str:
+    """Two-letter acronym of a state, given its name or acronym."""
+    if name in UF_ACRONYMS.values():
+        return name
+    try:
+        return UF_ACRONYMS[name]
+    except KeyError:
+        raise ValueError(f"Unknown UF: {name!r}") from None
+
+
+def format_postal_code(cep: object) -> str:
+    """Format a CEP as XXXXX-XXX, restoring leading zeros lost as integers."""
+    digits = "".join(c for c in str(cep) if c.isdigit()).zfill(8)
+    return f"{digits[:5]}-{digits[5:]}"
+
+
+def _text(value: object) -> str:
+    # Missing values come as None from Arrow and as NaN from pandas
+    return "" if value is None or value != value else str(value)
+
+
+def to_address(row: Mapping[str, object]) -> Address:
+    """Build an Address aggregate from a row of the processed output."""
+    return Address(
+        id=_text(row["ID_ENDERECO"]),
+        territorial_division=TerritorialDivision.of(
+            uf=uf_acronym(_text(row["ESTADO"])),
+            municipality=_text(row["MUNICIPIO"]),
+            district=_text(row["DISTRITO"]),
+            subdistrict=_text(row["SUBDISTRITO"]),
+        ),
+        street_address=StreetAddress(
+            street=_text(row["RUA"]),
+            street_type=_text(row["TIPO_LOGRADOURO"]),
+            number=_text(row["NUMERO"]),
+            complement=_text(row["COMPLEMENTO"]),
+            neighborhood=_text(row["BAIRRO"]),
+        ),
+        postal_code=PostalCode.of(format_postal_code(row["CEP"])),
+        coordinate=Coordinate(
+            latitude=float(row["LATITUDE"]),
+            longitude=float(row["LONGITUDE"]),
+            precision=GeocodingLevel(int(row["NIVEL_GEOCODIFICACAO"])),
+        ),
+        species=AddressSpecies(int(row["ESPECIE"])),
+    )
+
+
+def format_postal_codes(values: pa.Array) -> pa.Array:
+    """Vectorized `format_postal_code`."""
+    digits = pc.utf8_lpad(pc.replace_substring_regex(values, r"\D", ""), 8, "0")
+    return pc.binary_join_element_wise(
+        pc.utf8_slice_codeunits(digits, 0, 5),
+        pc.utf8_slice_codeunits(digits, 5, 8),
+        "-",
+    )
+
+
+def _categorical(values: pa.Array) -> pd.Categorical:
+    # Arrow keeps the first-seen order, sparing the sort of pd.Categorical
+    encoded = pc.fill_null(values.cast(pa.string()), "").dictionary_encode()
+    return pd.Categorical.from_codes(
+        encoded.indices.to_numpy(zero_copy_only=False),
+        categories=encoded.dictionary.to_numpy(zero_copy_only=False),
+    )
+
+
+def _text_column(column: pd.Series, recode=None) -> pd.Categorical:
+    """
+    Dictionary-encoded text column, missing values as "". `recode` maps the
+    distinct values as an Arrow array, e.g. to normalize their format.
+    """
+    if isinstance(column.dtype, pd.CategoricalDtype):
+        dictionary = pa.array(column.cat.categories.astype(object), pa.string())
+        indices = pa.array(column.cat.codes.to_numpy(), mask=column.isna().to_numpy())
+    else:
+        encoded = pa.array(column, from_pandas=True).dictionary_encode()
+        dictionary, indices = encoded.dictionary.cast(pa.string()), encoded.indices
+    if recode is not None:
+        dictionary = recode(dictionary)
+    return _categorical(dictionary.take(indices))
+
+
+def _uf_acronyms(names: pa.Array) -> pa.Array:
+    return pa.array([uf_acronym(name) for name in names.to_pylist()], pa.string())
+
+
+def to_batch(df: pd.DataFrame) -> AddressBatch:
+    """Build an AddressBatch from a chunk of the processed output."""
+    return AddressBatch(
+        id=df["ID_ENDERECO"].astype(str).to_numpy(dtype=object),
+        uf=_text_column(df["ESTADO"], recode=_uf_acronyms),
+        municipality=_text_column(df["MUNICIPIO"]),
+        district=_text_column(df["DISTRITO"]),
+        subdistrict=_text_column(df["SUBDISTRITO"]),
+        street=_text_column(df["RUA"]),
+        street_type=_text_column(df["TIPO_LOGRADOURO"]),
+        number=_text_column(df["NUMERO"]),
+        complement=_text_column(df["COMPLEMENTO"]),
+        neighborhood=_text_column(df["BAIRRO"]),
+        postal_code=_text_column(df["CEP"], recode=format_postal_codes),
+        latitude=df["LATITUDE"].to_numpy(dtype=np.float64),
+        longitude=df["LONGITUDE"].to_numpy(dtype=np.float64),
+        precision=df["NIVEL_GEOCODIFICACAO"].to_numpy(dtype=np.int8),
+        species=df["ESPECIE"].to_numpy(dtype=np.int8),
+    )
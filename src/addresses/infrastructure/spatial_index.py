@@ -0,0 +1,280 @@
+"""
+Persistent grid index over the coordinates of the processed addresses.
+
+Addresses are bucketed in cells of CELL_DEGREES and stored sorted by cell, so
+the points of a row of cells are a contiguous slice. Each UF is a shard:
+
+    <directory>/index.json          bounds and row count of each shard
+    <directory>/<shard>/cells.npy   sorted ids of the non-empty cells
+    <directory>/<shard>/starts.npy  position of the first point of each cell
+    <directory>/<shard>/latitude.npy, longitude.npy
+    <directory>/<shard>/records.parquet  the address rows, in the same order
+
+The arrays are memory-mapped, so opening the index is instant and queries only
+touch the pages of the cells they visit.
+"""
+
+import argparse
+import json
+import math
+from pathlib import Path
+from typing import Dict, Iterator, List, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+
+from addresses.domain.aggregates import Address
+from addresses.infrastructure.records import PROCESSED_SCHEMA, to_address
+
+INDEX_FILENAME = "index.json"
+CELL_DEGREES = 0.01  # About 1.1 km of latitude
+GRID_COLUMNS = round(360 / CELL_DEGREES)
+ROW_GROUP_SIZE = 4_096  # Rows read from records.parquet to serve a hit
+
+EARTH_RADIUS = 6_371_008.8  # Mean radius, in meters
+MAX_RADIUS = math.pi * EARTH_RADIUS  # Half the circumference covers the globe
+
+
+def haversine(lat: float, lon: float, lats: np.ndarray, lons: np.ndarray):
+    """Great-circle distances in meters from (lat, lon) to each point."""
+    lat, lon = math.radians(lat), math.radians(lon)
+    lats, lons = np.radians(lats), np.radians(lons)
+    a = (
+        np.sin((lats - lat) / 2) ** 2
+        + math.cos(lat) * np.cos(lats) * np.sin((lons - lon) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def cell_rows(lats) -> np.ndarray:
+    return np.floor((np.asarray(lats) + 90) / CELL_DEGREES).astype(np.int64)
+
+
+def cell_columns(lons) -> np.ndarray:
+    columns = np.floor((np.asarray(lons) + 180) / CELL_DEGREES).astype(np.int64)
+    return np.clip(columns, 0, GRID_COLUMNS - 1)
+
+
+def read_shards(source: Path) -> Iterator[Tuple[str, pa.Table]]:
+    """
+    Tables of the processed output in `source`, one per UF: each CSV file, or
+    each ESTADO= partition of a Parquet dataset. Rows without coordinates are
+    dropped batch by batch as they are scanned, so they are never held at once
+    with the rest of the UF.
+    """
+    source = Path(source)
+    located = ds.field("LATITUDE").is_valid() & ds.field("LONGITUDE").is_valid()
+    for path in sorted(source.glob("*.csv")):
+        reader = pacsv.open_csv(
+            path,
+            convert_options=pacsv.ConvertOptions(
+                column_types=PROCESSED_SCHEMA,
+                include_columns=PROCESSED_SCHEMA.names,
+                strings_can_be_null=True,
+            ),
+        )
+        batches = (batch.filter(located) for batch in reader)
+        yield path.stem, pa.Table.from_batches(batches, reader.schema)
+
+    if not any(source.glob("ESTADO=*")):
+        return
+    dataset = ds.dataset(source, format="parquet", partitioning="hive")
+    # The states are read from the partition paths, not from the files
+    states = {
+        ds.get_partition_keys(fragment.partition_expression).get("ESTADO")
+        for fragment in dataset.get_fragments()
+    }
+    for state in sorted(str(state) for state in states - {None}):
+        table = dataset.to_table(
+            columns=PROCESSED_SCHEMA.names,
+            filter=(ds.field("ESTADO") == state) & located,
+        )
+        yield state, table.cast(PROCESSED_SCHEMA)
+
+
+def build_shard(table: pa.Table, path: Path) -> Dict:
+    """Write the index files of one shard and return its index.json entry."""
+    lats = table["LATITUDE"].to_numpy(zero_copy_only=False)
+    lons = table["LONGITUDE"].to_numpy(zero_copy_only=False)
+    # NaN coordinates; missing ones are dropped by read_shards already
+    valid = ~(np.isnan(lats) | np.isnan(lons))
+    if not valid.all():
+        table, lats, lons = table.filter(pa.array(valid)), lats[valid], lons[valid]
+
+    cells = cell_rows(lats) * GRID_COLUMNS + cell_columns(lons)
+    order = np.argsort(cells, kind="stable")
+    cells, lats, lons = cells[order], lats[order], lons[order]
+    table = table.take(pa.array(order))
+
+    cell_ids, starts = np.unique(cells, return_index=True)
+
+    path.mkdir(exist_ok=True, parents=True)
+    np.save(path / "cells.npy", cell_ids)
+    np.save(path / "starts.npy", np.append(starts, len(cells)))
+    np.save(path / "latitude.npy", lats)
+    np.save(path / "longitude.npy", lons)
+    pq.write_table(table, path / "records.parquet", row_group_size=ROW_GROUP_SIZE)
+
+    if len(cells) == 0:
+        return {"path": path.name, "rows": 0, "bounds": None}
+    return {
+        "path": path.name,
+        "rows": len(cells),
+        "bounds": [lats.min(), lats.max(), lons.min(), lons.max()],
+    }
+
+
+def build(source: Path, directory: Path) -> "SpatialIndex":
+    """Build the index of the processed output in `source` into `directory`."""
+    directory = Path(directory)
+    directory.mkdir(exist_ok=True, parents=True)
+
+    shards = {}
+    for number, (name, table) in enumerate(read_shards(source)):
+        shards[name] = build_shard(table, directory / f"{number:02d}")
+
+    with open(directory / INDEX_FILENAME, "w", encoding="utf-8") as f:
+        json.dump({"cell_degrees": CELL_DEGREES, "shards": shards}, f, indent=2)
+    return SpatialIndex(directory)
+
+
+class Shard:
+    """Memory-mapped arrays and records of the addresses of one UF."""
+
+    def __init__(self, path: Path, bounds: List[float]):
+        self.bounds = bounds
+        self.cells = np.load(path / "cells.npy", mmap_mode="r")
+        self.starts = np.load(path / "starts.npy", mmap_mode="r")
+        self.lats = np.load(path / "latitude.npy", mmap_mode="r")
+        self.lons = np.load(path / "longitude.npy", mmap_mode="r")
+        self.records = pq.ParquetFile(path / "records.parquet")
+        metadata = self.records.metadata
+        self.group_starts = np.cumsum(
+            [0]
+            + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        )
+
+    def intersects(self, south: float, north: float, west: float, east: float):
+        if self.bounds is None:
+            return False
+        min_lat, max_lat, min_lon, max_lon = self.bounds
+        return (
+            south <= max_lat
+            and north >= min_lat
+            and west <= max_lon
+            and east >= min_lon
+        )
+
+    def candidates(
+        self, south: float, north: float, west: float, east: float
+    ) -> np.ndarray:
+        """Positions of the points in the cells overlapping the box."""
+        rows = np.arange(cell_rows(south), cell_rows(north) + 1)
+        first, last = cell_columns(west), cell_columns(east)
+        lo = np.searchsorted(self.cells, rows * GRID_COLUMNS + first, side="left")
+        hi = np.searchsorted(self.cells, rows * GRID_COLUMNS + last, side="right")
+        ranges = [
+            np.arange(self.starts[a], self.starts[b]) for a, b in zip(lo, hi) if a < b
+        ]
+        return np.concatenate(ranges) if ranges else np.empty(0, dtype=np.int64)
+
+    def read(self, positions: np.ndarray) -> List[Address]:
+        """Addresses at `positions`, reading only the row groups holding them."""
+        groups = np.searchsorted(self.group_starts, positions, side="right") - 1
+        selected = np.unique(groups)
+        table = self.records.read_row_groups(selected.tolist())
+        # Offset of each selected group within the concatenated table
+        offsets = np.cumsum(
+            [0] + [self.group_starts[g + 1] - self.group_starts[g] for g in selected]
+        )
+        local = offsets[np.searchsorted(selected, groups)] + (
+            positions - self.group_starts[groups]
+        )
+        return [to_address(row) for row in table.take(pa.array(local)).to_pylist()]
+
+
+class SpatialIndex:
+    """Nearest-neighbour and radius queries over a built index."""
+
+    def __init__(self, directory: Path):
+        directory = Path(directory)
+        with open(directory / INDEX_FILENAME, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self.shards = [
+            Shard(directory / entry["path"], entry["bounds"])
+            for entry in index["shards"].values()
+        ]
+
+    def _search(self, lat: float, lon: float, meters: float):
+        """Distances, shard numbers and positions of the points within
+        `meters`, sorted by distance."""
+        lat_delta = math.degrees(meters / EARTH_RADIUS)
+        # Degrees of longitude shrink towards the poles; use the widest span
+        widest = min(abs(lat) + lat_delta, 90.0)
+        cos = math.cos(math.radians(widest))
+        lon_delta = 180.0 if cos < 1e-9 else min(lat_delta / cos, 180.0)
+        box = (
+            max(lat - lat_delta, -90.0),
+            min(lat + lat_delta, 90.0 - CELL_DEGREES),
+            max(lon - lon_delta, -180.0),
+            min(lon + lon_delta, 180.0),
+        )
+
+        distances, shard_numbers, positions = [], [], []
+        for number, shard in enumerate(self.shards):
+            if not shard.intersects(*box):
+                continue
+            candidates = shard.candidates(*box)
+            found = haversine(lat, lon, shard.lats[candidates], shard.lons[candidates])
+            hits = found <= meters
+            distances.append(found[hits])
+            positions.append(candidates[hits])
+            shard_numbers.append(np.full(hits.sum(), number))
+
+        if not distances:
+            return np.empty(0), np.empty(0, np.int64), np.empty(0, np.int64)
+        distances = np.concatenate(distances)
+        order = np.argsort(distances, kind="stable")
+        return (
+            distances[order],
+            np.concatenate(shard_numbers)[order],
+            np.concatenate(positions)[order],
+        )
+
+    def _addresses(self, shard_numbers: np.ndarray, positions: np.ndarray):
+        addresses = [None] * len(positions)
+        for number in np.unique(shard_numbers):
+            at = np.flatnonzero(shard_numbers == number)
+            for i, address in zip(at, self.shards[number].read(positions[at])):
+                addresses[i] = address
+        return addresses
+
+    def within_radius(self, lat: float, lon: float, meters: float) -> List[Address]:
+        """Addresses at most `meters` from (lat, lon), nearest first."""
+        _, shard_numbers, positions = self._search(lat, lon, meters)
+        return self._addresses(shard_numbers, positions)
+
+    def nearest(self, lat: float, lon: float, k: int = 1) -> List[Address]:
+        """The `k` addresses nearest to (lat, lon), nearest first."""
+        # Grow the radius until it holds k points; those are then the nearest
+        meters = CELL_DEGREES * 111_000
+        while True:
+            _, shard_numbers, positions = self._search(lat, lon, meters)
+            if len(positions) >= k or meters >= MAX_RADIUS:
+                break
+            meters = min(meters * 4, MAX_RADIUS)
+        return self._addresses(shard_numbers[:k], positions[:k])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the spatial index of the processed addresses."
+    )
+    parser.add_argument("source", type=Path, help="Output of process_addresses")
+    parser.add_argument("destination", type=Path)
+    args = parser.parse_args()
+
+    build(args.source, args.destination)
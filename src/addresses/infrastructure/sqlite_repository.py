@@ -0,0 +1,271 @@
+import argparse
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterable, Iterator, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from addresses.domain.aggregates import Address
+from addresses.domain.batch import AddressBatch
+from addresses.domain.value_objects import (
+    AddressSpecies,
+    Coordinate,
+    GeocodingLevel,
+    PostalCode,
+    StreetAddress,
+    TerritorialDivision,
+)
+from addresses.infrastructure.records import to_batch
+
+CHUNKSIZE = 250_000  # Rows per transaction when loading processed files
+
+# Columns of the processed CSVs stored as text, and those an Address requires
+TEXT_COLUMNS = [
+    "ID_ENDERECO",
+    "ESTADO",
+    "MUNICIPIO",
+    "DISTRITO",
+    "SUBDISTRITO",
+    "RUA",
+    "TIPO_LOGRADOURO",
+    "NUMERO",
+    "COMPLEMENTO",
+    "BAIRRO",
+    "CEP",
+]
+REQUIRED_COLUMNS = ["LATITUDE", "LONGITUDE", "ESPECIE", "NIVEL_GEOCODIFICACAO"]
+
+# Write-ahead log and relaxed fsync: a crash may lose the last transaction but
+# never corrupts the file, which is enough for a store rebuilt from the CSVs
+PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "temp_store": "MEMORY",
+    "cache_size": -256 * 1024,  # 256 MB, in KiB when negative
+    "mmap_size": 1 << 30,  # 1 GB
+}
+
+COLUMNS = [
+    "id",
+    "uf",
+    "municipality",
+    "district",
+    "subdistrict",
+    "street",
+    "street_type",
+    "number",
+    "complement",
+    "neighborhood",
+    "postal_code",
+    "latitude",
+    "longitude",
+    "precision",
+    "species",
+]
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS addresses (
+    id TEXT NOT NULL,
+    uf TEXT NOT NULL,
+    municipality TEXT NOT NULL,
+    district TEXT NOT NULL,
+    subdistrict TEXT NOT NULL,
+    street TEXT NOT NULL,
+    street_type TEXT NOT NULL,
+    number TEXT NOT NULL,
+    complement TEXT NOT NULL,
+    neighborhood TEXT NOT NULL,
+    postal_code TEXT NOT NULL,
+    latitude REAL NOT NULL,
+    longitude REAL NOT NULL,
+    precision INTEGER NOT NULL,
+    species INTEGER NOT NULL
+)
+"""
+
+INDEXES = {
+    "addresses_id": "CREATE UNIQUE INDEX IF NOT EXISTS addresses_id ON addresses (id)",
+    "addresses_division": (
+        "CREATE INDEX IF NOT EXISTS addresses_division "
+        "ON addresses (uf, municipality, district, subdistrict)"
+    ),
+    "addresses_postal_code": (
+        "CREATE INDEX IF NOT EXISTS addresses_postal_code ON addresses (postal_code)"
+    ),
+}
+
+INSERT = (
+    f"INSERT OR REPLACE INTO addresses ({', '.join(COLUMNS)}) "
+    f"VALUES ({', '.join('?' * len(COLUMNS))})"
+)
+SELECT = f"SELECT {', '.join(COLUMNS)} FROM addresses"
+
+Row = Tuple
+
+
+def to_row(address: Address) -> Row:
+    division, street = address.territorial_division, address.street_address
+    return (
+        address.id,
+        division.uf,
+        division.municipality,
+        division.district,
+        division.subdistrict,
+        street.street,
+        street.street_type,
+        str(street.number),
+        street.complement,
+        street.neighborhood,
+        address.postal_code.code,
+        address.coordinate.latitude,
+        address.coordinate.longitude,
+        address.coordinate.precision.value,
+        address.species.value,
+    )
+
+
+def from_row(row: Row) -> Address:
+    values = dict(zip(COLUMNS, row))
+    return Address(
+        id=values["id"],
+        territorial_division=TerritorialDivision.of(
+            uf=values["uf"],
+            municipality=values["municipality"],
+            district=values["district"],
+            subdistrict=values["subdistrict"],
+        ),
+        street_address=StreetAddress(
+            street=values["street"],
+            street_type=values["street_type"],
+            number=values["number"],
+            complement=values["complement"],
+            neighborhood=values["neighborhood"],
+        ),
+        postal_code=PostalCode.of(values["postal_code"]),
+        coordinate=Coordinate(
+            latitude=values["latitude"],
+            longitude=values["longitude"],
+            precision=GeocodingLevel(values["precision"]),
+        ),
+        species=AddressSpecies(values["species"]),
+    )
+
+
+def batch_rows(batch: AddressBatch) -> Iterator[Row]:
+    """Rows of a batch, read column-wise without building Address objects."""
+    return zip(
+        batch.id.tolist(),
+        *(np.asarray(getattr(batch, name)).tolist() for name in COLUMNS[1:]),
+    )
+
+
+class SqliteAddressRepository:
+    """AddressRepository stored in a single SQLite file."""
+
+    def __init__(self, path: Path):
+        self.path = Path(path)
+        self.connection = sqlite3.connect(self.path)
+        for name, value in PRAGMAS.items():
+            self.connection.execute(f"PRAGMA {name} = {value}")
+        self.connection.execute(SCHEMA)
+        self._create_indexes()
+
+    def close(self):
+        self.connection.close()
+
+    def _create_indexes(self):
+        with self.connection:
+            for statement in INDEXES.values():
+                self.connection.execute(statement)
+
+    @contextmanager
+    def bulk_load(self):
+        """
+        Drop the secondary indexes while loading, and build them once at the
+        end: sorting all rows once is much cheaper than updating the B-trees
+        on every insert. The unique id index stays, as `INSERT OR REPLACE`
+        needs it to replace rows loaded before instead of duplicating them.
+        """
+        with self.connection:
+            for name in INDEXES:
+                if name != "addresses_id":
+                    self.connection.execute(f"DROP INDEX IF EXISTS {name}")
+        try:
+            yield self
+        finally:
+            self._create_indexes()
+
+    def save_rows(self, rows: Iterable[Row]):
+        """Insert rows in a single transaction."""
+        with self.connection:
+            self.connection.executemany(INSERT, rows)
+
+    def save_batch(self, addresses: Union[List[Address], AddressBatch]) -> None:
+        if isinstance(addresses, AddressBatch):
+            self.save_rows(batch_rows(addresses))
+        else:
+            self.save_rows(to_row(address) for address in addresses)
+
+    def _select(self, where: str, *parameters) -> List[Address]:
+        cursor = self.connection.execute(f"{SELECT} WHERE {where}", parameters)
+        return [from_row(row) for row in cursor]
+
+    def find_by_id(self, address_id: str) -> Optional[Address]:
+        found = self._select("id = ?", address_id)
+        return found[0] if found else None
+
+    def find_by_territorial_division(self, code: TerritorialDivision) -> List[Address]:
+        return self._select(
+            "uf = ? AND municipality = ? AND district = ? AND subdistrict = ?",
+            code.uf,
+            code.municipality,
+            code.district,
+            code.subdistrict,
+        )
+
+    def find_by_postal_code(self, postal_code: PostalCode) -> List[Address]:
+        return self._select("postal_code = ?", postal_code.code)
+
+
+def load(source: Path, database: Path, chunksize: int = CHUNKSIZE) -> int:
+    """Load the processed CSVs in `source` into `database`. Returns the number
+    of rows loaded."""
+    repository = SqliteAddressRepository(database)
+    loaded = 0
+    try:
+        with repository.bulk_load():
+            for path in sorted(Path(source).glob("*.csv")):
+                for chunk in pd.read_csv(
+                    path,
+                    dtype={column: str for column in TEXT_COLUMNS},
+                    # Empty text stays "", only the required columns get NaN
+                    keep_default_na=False,
+                    na_values={column: [""] for column in REQUIRED_COLUMNS},
+                    chunksize=chunksize,
+                ):
+                    # Rows missing these cannot become Address aggregates
+                    chunk = chunk.dropna(subset=REQUIRED_COLUMNS)
+                    repository.save_batch(to_batch(chunk))
+                    loaded += len(chunk)
+    finally:
+        repository.close()
+    return loaded
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Load the processed addresses into a SQLite database."
+    )
+    parser.add_argument("source", type=Path, help="CSV output of process_addresses")
+    parser.add_argument("database", type=Path)
+    parser.add_argument(
+        "--chunksize",
+        type=int,
+        default=CHUNKSIZE,
+        help=f"Rows per transaction (default: {CHUNKSIZE})",
+    )
+    args = parser.parse_args()
+
+    print(f"Loaded {load(args.source, args.database, args.chunksize):,} rows.")
@@ -0,0 +1,427 @@
+"""
+Trigram index for free-text search of the streets of the processed CSV store.
+
+Rows sharing UF, municipality, neighborhood, street type and street are one
+document. Text is compared without accents, case or punctuation, as the
+trigrams of each word padded with two spaces before and one after, as in
+PostgreSQL's pg_trgm: a typo only changes the few trigrams around it.
+
+    <directory>/index.json           store files and the documents of each
+                                     municipality
+    <directory>/documents.parquet    the fields of each document
+    <directory>/trigram_starts.npy   start of the postings of each trigram
+    <directory>/postings.npy         documents holding each trigram, sorted
+    <directory>/trigram_counts.npy   distinct trigrams of each document
+    <directory>/row_starts.npy       start of the rows of each document
+    <directory>/files.npy, offsets.npy  location of the rows, as in the CEP
+                                     index
+
+Documents are numbered in (UF, municipality) order, so the documents of a
+municipality are a contiguous range of every posting list.
+"""
+
+import argparse
+import json
+import math
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+from addresses.domain.aggregates import Address
+from addresses.infrastructure.postal_code_index import (
+    RowReader,
+    line_offsets,
+    store_entry,
+    store_paths,
+)
+from addresses.infrastructure.records import uf_acronym
+
+INDEX_FILENAME = "index.json"
+FIELDS = ["ESTADO", "MUNICIPIO", "BAIRRO", "TIPO_LOGRADOURO", "RUA"]
+SEARCHED_FIELDS = ["TIPO_LOGRADOURO", "RUA", "BAIRRO", "MUNICIPIO"]
+SEPARATOR = "\x1f"  # Joins the fields of a document key
+ROW_GROUP_SIZE = 1_024  # Documents read from documents.parquet per match
+
+# Normalized text is made of these characters; "|" ends each padded word
+ALPHABET = " abcdefghijklmnopqrstuvwxyz0123456789"
+TRIGRAMS = len(ALPHABET) ** 3
+BOUNDARY = len(ALPHABET)
+CODES = np.full(256, BOUNDARY, dtype=np.int32)
+CODES[np.frombuffer(ALPHABET.encode(), dtype=np.uint8)] = np.arange(len(ALPHABET))
+
+MIN_SCORE = 0.5  # Share of the query trigrams a match must have
+SEEDS = 1_024  # Best candidates fully scored first to raise the bar of a search
+# Bounds on the work of a search: postings of the rarest query trigrams counted
+# to find the candidates, and candidates checked against the other trigrams
+COUNTED_POSTINGS = 524_288
+MAX_CANDIDATES = 65_536
+
+
+def normalize(values: pa.Array) -> pa.Array:
+    """Lowercase ASCII words split by single spaces: "São João-D'El" -> "sao
+    joao d el"."""
+    # Decomposed, accents are combining marks; matching their block rather
+    # than \p{Mn} spares compiling a large class on every query
+    values = pc.utf8_normalize(pc.fill_null(values, ""), "NFKD")
+    values = pc.replace_substring_regex(values, r"[\x{0300}-\x{036f}]", "")
+    values = pc.utf8_lower(values)
+    values = pc.replace_substring_regex(values, "[^a-z0-9]+", " ")
+    return pc.utf8_trim_whitespace(values)
+
+
+def trigrams(texts: pa.Array) -> Tuple[np.ndarray, np.ndarray]:
+    """Distinct trigrams of each normalized text, as (text, trigram) pairs
+    sorted by text then trigram."""
+    if len(texts) == 0:
+        return np.empty(0, np.int64), np.empty(0, np.uint16)
+    padded = pc.binary_join_element_wise(
+        "  ", pc.replace_substring(texts, " ", " |  "), " |", ""
+    ).cast(pa.large_string())
+    start, end = padded.offset, padded.offset + len(padded) + 1
+    offsets = np.frombuffer(padded.buffers()[1], dtype=np.int64)[start:end]
+    start, end = offsets[0], offsets[-1]
+    codes = CODES[np.frombuffer(padded.buffers()[2], dtype=np.uint8)[start:end]]
+
+    first, second, third = codes[:-2], codes[1:-1], codes[2:]
+    ids = (first * len(ALPHABET) + second) * len(ALPHABET) + third
+    # Trigrams crossing the end of a word, and the blank one of empty texts
+    valid = (first < BOUNDARY) & (second < BOUNDARY) & (third < BOUNDARY) & (ids > 0)
+    texts = np.repeat(np.arange(len(padded), dtype=np.int64), np.diff(offsets))
+
+    pairs = np.unique(texts[:-2][valid] * TRIGRAMS + ids[valid])
+    return pairs // TRIGRAMS, (pairs % TRIGRAMS).astype(np.uint16)
+
+
+def read_documents(path: Path) -> Tuple[pa.Table, np.ndarray]:
+    """Distinct documents of a processed CSV, sorted by their fields, and the
+    document of each row."""
+    table = pacsv.read_csv(
+        path,
+        convert_options=pacsv.ConvertOptions(
+            include_columns=FIELDS,
+            column_types={field: pa.string() for field in FIELDS},
+        ),
+    )
+    keys = pc.dictionary_encode(
+        pc.binary_join_element_wise(*(table[f] for f in FIELDS), SEPARATOR)
+    )
+    dictionary = keys.chunk(0).dictionary if keys.num_chunks else pa.array([], "string")
+    indices = [chunk.indices.to_numpy() for chunk in keys.chunks]
+    indices = np.concatenate(indices) if indices else np.empty(0, np.int32)
+
+    order = pc.sort_indices(dictionary).to_numpy()
+    rank = np.empty_like(order)
+    rank[order] = np.arange(len(order))
+
+    fields = pc.list_flatten(pc.split_pattern(dictionary.take(order), SEPARATOR))
+    documents = pa.table(
+        {
+            f: fields.take(np.arange(i, len(fields), len(FIELDS)))
+            for i, f in enumerate(FIELDS)
+        }
+    )
+    return documents, rank[indices]
+
+
+def municipalities(documents: pa.Table, first: int) -> List[Dict]:
+    """index.json entries of the municipalities of sorted `documents`,
+    numbered from `first`."""
+    states = documents["ESTADO"].to_numpy(zero_copy_only=False)
+    names = normalize(documents["MUNICIPIO"]).to_numpy(zero_copy_only=False)
+    changes = (states[1:] != states[:-1]) | (names[1:] != names[:-1])
+    starts = np.concatenate([[0], np.flatnonzero(changes) + 1]).astype(int)
+    ends = np.append(starts[1:], len(states))
+    return [
+        {
+            "uf": uf_acronym(states[start]),
+            "municipality": names[start],
+            "documents": [first + start, first + end],
+        }
+        for start, end in zip(starts.tolist(), ends.tolist())
+    ]
+
+
+def merge_postings(postings: List[Tuple[np.ndarray, np.ndarray]], directory: Path):
+    """
+    Write the posting lists from the (trigram, document) pairs of each file,
+    sorted by trigram. Files hold increasing documents, so placing the pairs
+    of each file after those of the previous ones keeps every list sorted,
+    without sorting all the pairs at once.
+    """
+    counts = [np.bincount(ids, minlength=TRIGRAMS) for ids, _ in postings]
+    starts = np.append(0, np.cumsum(np.sum(counts, axis=0)))
+    np.save(directory / "trigram_starts.npy", starts)
+
+    merged = np.lib.format.open_memmap(
+        directory / "postings.npy", mode="w+", dtype=np.uint32, shape=(int(starts[-1]),)
+    )
+    cursor = starts[:-1].copy()
+    for (ids, documents), file_counts in zip(postings, counts):
+        first = np.cumsum(file_counts) - file_counts
+        merged[cursor[ids] + np.arange(len(ids)) - first[ids]] = documents
+        cursor += file_counts
+    merged.flush()
+
+
+def build(source: Path, directory: Path) -> "TextIndex":
+    """Build the text index of the processed CSVs in `source` into
+    `directory`."""
+    source, directory = Path(source).resolve(), Path(directory)
+    paths = sorted(source.glob("*.csv"))
+    if not paths:
+        raise ValueError(f"No processed CSV files in {source}")
+    directory.mkdir(exist_ok=True, parents=True)
+
+    total, cities, postings, trigram_counts = 0, [], [], []
+    row_counts, files, offsets = [], [], []
+    schema = pa.schema([(field, pa.string()) for field in FIELDS])
+    with pq.ParquetWriter(directory / "documents.parquet", schema) as writer:
+        for number, path in enumerate(paths):
+            documents, rows = read_documents(path)
+            file_offsets = line_offsets(path)
+            if len(rows) != len(file_offsets):
+                raise ValueError(f"{path}: rows do not match lines (quoted newlines?)")
+
+            text = pc.binary_join_element_wise(
+                *(documents[f] for f in SEARCHED_FIELDS), " "
+            )
+            found, ids = trigrams(normalize(text.combine_chunks()))
+            order = np.argsort(ids, kind="stable")
+            postings.append((ids[order], (found[order] + total).astype(np.uint32)))
+            trigram_counts.append(np.bincount(found, minlength=len(documents)))
+
+            # Rows grouped by document; files follow each other in order
+            order = np.argsort(rows, kind="stable")
+            row_counts.append(np.bincount(rows, minlength=len(documents)))
+            files.append(np.full(len(rows), number, dtype=np.uint16))
+            offsets.append(file_offsets[order])
+
+            cities.extend(municipalities(documents, total))
+            writer.write_table(documents, row_group_size=ROW_GROUP_SIZE)
+            total += len(documents)
+
+    merge_postings(postings, directory)
+    np.save(
+        directory / "trigram_counts.npy",
+        np.concatenate(trigram_counts).astype(np.uint16),
+    )
+    np.save(
+        directory / "row_starts.npy",
+        np.append(0, np.cumsum(np.concatenate(row_counts))).astype(np.uint64),
+    )
+    np.save(directory / "files.npy", np.concatenate(files))
+    np.save(directory / "offsets.npy", np.concatenate(offsets))
+
+    with open(directory / INDEX_FILENAME, "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                **store_entry(source, paths),
+                "documents": total,
+                "municipalities": cities,
+            },
+            f,
+            indent=2,
+        )
+    return TextIndex(directory)
+
+
+@dataclass(frozen=True)
+class Match:
+    """A street of a neighborhood found by `TextIndex.search`."""
+
+    document: int
+    uf: str
+    municipality: str
+    neighborhood: str
+    street_type: str
+    street: str
+    score: float  # Share of the query trigrams found
+    rows: int  # Addresses on the street
+
+
+class TextIndex:
+    """Ranked, accent-insensitive and typo-tolerant search over a built
+    index."""
+
+    def __init__(self, directory: Path, store: Optional[Path] = None):
+        directory = Path(directory)
+        with open(directory / INDEX_FILENAME, "r", encoding="utf-8") as f:
+            index = json.load(f)
+        self.rows = RowReader(store_paths(index, store))
+        self.municipalities = index["municipalities"]
+
+        self.trigram_starts = np.load(directory / "trigram_starts.npy")
+        self.postings = np.load(directory / "postings.npy", mmap_mode="r")
+        self.trigram_counts = np.load(directory / "trigram_counts.npy", mmap_mode="r")
+        self.row_starts = np.load(directory / "row_starts.npy", mmap_mode="r")
+        self.files = np.load(directory / "files.npy", mmap_mode="r")
+        self.offsets = np.load(directory / "offsets.npy", mmap_mode="r")
+        self.documents = pq.ParquetFile(directory / "documents.parquet")
+        metadata = self.documents.metadata
+        self.group_starts = np.cumsum(
+            [0]
+            + [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        )
+
+    def close(self):
+        self.rows.close()
+
+    def _ranges(self, municipality: Optional[str], uf: Optional[str]):
+        """Document ranges of the municipality, or None for all of them."""
+        if municipality is None and uf is None:
+            return None
+        name = None
+        if municipality is not None:
+            name = normalize(pa.array([municipality])).to_pylist()[0]
+        return [
+            entry["documents"]
+            for entry in self.municipalities
+            if (name is None or entry["municipality"] == name)
+            and (uf is None or entry["uf"] == uf_acronym(uf))
+        ]
+
+    def _postings(self, trigram: int, ranges) -> np.ndarray:
+        start, end = self.trigram_starts[[trigram, trigram + 1]]
+        postings = self.postings[start:end]
+        if ranges is None:
+            return postings
+        if not ranges:
+            return postings[:0]
+        bounds = np.searchsorted(postings, np.array(ranges, dtype=np.uint32))
+        return np.concatenate([postings[lo:hi] for lo, hi in bounds])
+
+    def _count(self, documents: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Distinct documents and their counts."""
+        if len(documents) * 8 < len(self.trigram_counts):
+            return np.unique(documents, return_counts=True)
+        # Dense counting is linear, better than sorting many documents
+        counts = np.bincount(documents, minlength=len(self.trigram_counts))
+        candidates = np.flatnonzero(counts).astype(np.uint32)
+        return candidates, counts[candidates]
+
+    def _contains(self, postings: np.ndarray, documents: np.ndarray) -> np.ndarray:
+        """Whether each of `documents` is in `postings`."""
+        if not len(postings) or not len(documents):
+            return np.zeros(len(documents), dtype=bool)
+        if len(documents) * 16 < len(postings) or len(documents) <= SEEDS:
+            at = np.minimum(np.searchsorted(postings, documents), len(postings) - 1)
+            return postings[at] == documents
+        # Many documents: marking the postings beats a binary search each
+        marked = np.zeros(len(self.trigram_counts), dtype=bool)
+        marked[postings] = True
+        return marked[documents]
+
+    def _read(self, documents: np.ndarray) -> List[Dict]:
+        groups = np.searchsorted(self.group_starts, documents, side="right") - 1
+        selected = np.unique(groups)
+        table = self.documents.read_row_groups(selected.tolist())
+        offsets = np.cumsum(
+            [0] + [self.group_starts[g + 1] - self.group_starts[g] for g in selected]
+        )
+        local = offsets[np.searchsorted(selected, groups)] + (
+            documents - self.group_starts[groups]
+        )
+        return table.take(pa.array(local)).to_pylist()
+
+    def search(
+        self,
+        text: str,
+        municipality: Optional[str] = None,
+        uf: Optional[str] = None,
+        limit: int = 10,
+        min_score: float = MIN_SCORE,
+    ) -> List[Match]:
+        """
+        Streets matching `text`, best first: those with the most trigrams of
+        the query, then the fewest other trigrams. `municipality` and `uf`
+        restrict the search to the streets of a municipality or state.
+
+        Only the documents holding one of the rarest trigrams, up to
+        COUNTED_POSTINGS postings, are candidates, and at most MAX_CANDIDATES
+        of them are checked against the common ones: a match made mostly of
+        common trigrams may be missed, rather than counting millions of
+        documents in an unfiltered search.
+        """
+        _, query = trigrams(normalize(pa.array([text])))
+        if len(query) == 0:
+            return []
+        ranges = self._ranges(municipality, uf)
+        postings = sorted(
+            (self._postings(int(trigram), ranges) for trigram in query), key=len
+        )
+
+        # A match needs `needed` of the trigrams, so it holds at least one of
+        # the rarest len(query) - needed + 1: when those are all counted, the
+        # candidates hold every match
+        sizes = np.cumsum([len(posting) for posting in postings])
+        counted = max(1, int(np.searchsorted(sizes, COUNTED_POSTINGS, side="right")))
+        rare, common = postings[:counted], postings[counted:]
+        candidates, shared = self._count(np.concatenate(rare))
+
+        # The candidates holding the most rare trigrams, fully scored: at least
+        # `limit` matches have as many trigrams as the `limit`-th best of them
+        needed = max(1, math.ceil(min_score * len(query)))
+        seeds = np.arange(len(candidates))
+        if len(seeds) > SEEDS:
+            seeds = np.sort(np.argpartition(-shared, SEEDS - 1)[:SEEDS])
+        if len(seeds) >= limit:
+            found = shared[seeds] + sum(
+                self._contains(posting, candidates[seeds]) for posting in common
+            )
+            needed = max(needed, int(np.partition(found, -limit)[-limit]))
+
+        for remaining, posting in zip(range(len(common), 0, -1), common):
+            # Drop the candidates that can no longer reach `needed`, then those
+            # with the fewest trigrams so far
+            keep = shared + remaining >= needed
+            candidates, shared = candidates[keep], shared[keep]
+            if len(candidates) > MAX_CANDIDATES:
+                keep = np.argpartition(-shared, MAX_CANDIDATES - 1)[:MAX_CANDIDATES]
+                keep.sort()
+                candidates, shared = candidates[keep], shared[keep]
+            shared = shared + self._contains(posting, candidates)
+        keep = shared >= needed
+        candidates, shared = candidates[keep], shared[keep]
+
+        extra = self.trigram_counts[candidates].astype(np.int64) - shared
+        best = np.lexsort((candidates, extra, -shared))[:limit]
+        candidates, shared = candidates[best], shared[best]
+        if not len(candidates):
+            return []
+        return [
+            Match(
+                document=int(document),
+                uf=uf_acronym(fields["ESTADO"]),
+                municipality=fields["MUNICIPIO"],
+                neighborhood=fields["BAIRRO"],
+                street_type=fields["TIPO_LOGRADOURO"],
+                street=fields["RUA"],
+                score=float(found / len(query)),
+                rows=int(self.row_starts[document + 1] - self.row_starts[document]),
+            )
+            for document, found, fields in zip(
+                candidates, shared, self._read(candidates)
+            )
+        ]
+
+    def addresses(self, match: Match) -> List[Address]:
+        """The addresses on the street of `match`."""
+        lo, hi = self.row_starts[[match.document, match.document + 1]]
+        return self.rows.read(self.files[lo:hi], self.offsets[lo:hi])
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Build the text index of the processed addresses."
+    )
+    parser.add_argument("source", type=Path, help="CSV output of process_addresses")
+    parser.add_argument("destination", type=Path)
+    args = parser.parse_args()
+
+    build(args.source, args.destination)
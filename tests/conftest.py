@@ -0,0 +1,26 @@
+import pytest
+
+from scripts import instrumentation
+from tests.ftp_server import serve
+
+
+@pytest.fixture
+def ftp_server(tmp_path):
+    """Serve a temporary directory over anonymous FTP on a local port."""
+    root = tmp_path / "ftp"
+    root.mkdir()
+    with serve(root) as server:
+        host, port = server.address[:2]
+        yield host, port, root
+
+
+@pytest.fixture
+def metrics_file(tmp_path, monkeypatch):
+    """Record metrics to a temporary file, restoring the environment after."""
+    for name in [instrumentation.METRICS_ENV, instrumentation.PROFILE_ENV]:
+        monkeypatch.setenv(name, "")
+    monkeypatch.delenv(instrumentation.STAGE_ENV, raising=False)
+
+    path = tmp_path / "metrics" / "metrics.jsonl"
+    instrumentation.configure(path, tmp_path / "profiles")
+    return path
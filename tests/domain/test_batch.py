@@ -0,0 +1,101 @@
+import numpy as np
+import pytest
+
+from addresses.domain.aggregates import Address
+from addresses.domain.batch import AddressBatch
+from addresses.domain.value_objects import AddressSpecies, GeocodingLevel
+
+
+@pytest.fixture
+def columns():
+    return {
+        "id": ["1", "2", "3"],
+        "uf": ["SP", "SP", "RJ"],
+        "municipality": ["São Paulo", "São Paulo", "Rio de Janeiro"],
+        "district": ["Sé", "Sé", "Centro"],
+        "subdistrict": ["", "", ""],
+        "street": ["PAULISTA", "PAULISTA", "RIO BRANCO"],
+        "street_type": ["AVENIDA", "AVENIDA", "AVENIDA"],
+        "number": ["1000", "SN", "1"],
+        "complement": ["", "BLOCO A", ""],
+        "neighborhood": ["Bela Vista", "Bela Vista", "Centro"],
+        "postal_code": ["01310-100", "01310-100", "20090-003"],
+        "latitude": [-23.56, -23.57, -22.90],
+        "longitude": [-46.65, -46.66, -43.18],
+        "precision": [1, 2, 4],
+        "species": [1, 1, 6],
+    }
+
+
+def test_batch_holds_typed_columns(columns):
+    batch = AddressBatch(**columns)
+
+    assert len(batch) == 3
+    assert batch.latitude.dtype == np.float64
+    assert batch.species.dtype == np.int8
+    assert list(batch.postal_code.categories) == ["01310-100", "20090-003"]
+
+
+def test_batch_yields_addresses_on_demand(columns):
+    batch = AddressBatch(**columns)
+
+    address = batch[1]
+
+    assert isinstance(address, Address)
+    assert address.street_address.number == "SN"
+    assert address.street_address.complement == "BLOCO A"
+    assert address.coordinate.precision is GeocodingLevel.MODIFIED
+    assert [a.species for a in batch] == [
+        AddressSpecies.RESIDENTIAL,
+        AddressSpecies.RESIDENTIAL,
+        AddressSpecies.OTHER_ESTABLISHMENT,
+    ]
+
+
+def test_batch_round_trips_addresses(columns):
+    batch = AddressBatch(**columns)
+
+    assert list(AddressBatch.from_addresses(list(batch))) == list(batch)
+
+
+def test_take_rows_and_mask(columns):
+    batch = AddressBatch(**columns)
+
+    assert [a.id for a in batch.take([2, 0])] == ["3", "1"]
+    assert [a.id for a in batch.take(batch.latitude > -23)] == ["3"]
+
+
+@pytest.mark.parametrize(
+    "column, values, message",
+    [
+        ("id", ["1", "", "3"], "ID should be a non-empty string"),
+        ("id", ["1", 2, "3"], "ID should be a non-empty string"),
+        ("uf", ["SP", "SP", "Rio"], "UF name should be 2 alphabetic characters"),
+        ("street", ["A", None, "B"], "street should be of type str"),
+        ("number", [1, 2, 3], "number should be of type str"),
+        ("postal_code", ["01310100"] * 3, "Postal code should be in the format"),
+        ("latitude", [-23.5, 91.0, np.nan], "latitude should be between -90 and 90"),
+        ("longitude", [0.0, -181.0, 0.0], "longitude should be between -180 and 180"),
+        ("precision", [1, 7, 1], "precision should be a GeocodingLevel"),
+        ("species", [0, 1, 1], "species should be an AddressSpecies"),
+    ],
+)
+def test_invalid_batch(columns, column, values, message):
+    columns[column] = values
+
+    with pytest.raises(ValueError, match=message):
+        AddressBatch(**columns)
+
+
+def test_invalid_batch_reports_failing_rows(columns):
+    columns["latitude"] = [-23.5, 91.0, np.nan]
+
+    with pytest.raises(ValueError, match=r"\(2 rows\)"):
+        AddressBatch(**columns)
+
+
+def test_columns_of_different_lengths(columns):
+    columns["species"] = [1, 1]
+
+    with pytest.raises(ValueError, match="same length"):
+        AddressBatch(**columns)
@@ -192,3 +192,32 @@ def test_territorial_code_immutable():
     )
     with pytest.raises(FrozenInstanceError):
         code.uf = "RJ"
+
+
+def test_postal_code_interned():
+    code = PostalCode.of("12340-567")
+    assert PostalCode.of("12340-567") is code
+    assert code == PostalCode(code="12340-567")
+    with pytest.raises(ValueError, match="format XXXXX-XXX"):
+        PostalCode.of("12345670")
+
+
+def test_territorial_code_interned():
+    names = ("PB", "São João", "Cidade Nova", "Vila")
+    code = TerritorialDivision.of(*names)
+    assert TerritorialDivision.of(*names) is code
+    assert code == TerritorialDivision(*names)
+    assert TerritorialDivision.of("PB", "São João", "Cidade Nova", "") is not code
+    with pytest.raises(ValueError, match="UF name should be 2 alphabetic"):
+        TerritorialDivision.of("PBR", "São João", "Cidade Nova", "Vila")
+
+
+def test_value_objects_have_no_instance_dict():
+    for value in [
+        Coordinate(latitude=-7.1, longitude=-34.8, precision=GeocodingLevel.FACE),
+        PostalCode(code="12340-567"),
+        TerritorialDivision(
+            uf="PB", municipality="São João", district="Cidade Nova", subdistrict=""
+        ),
+    ]:
+        assert not hasattr(value, "__dict__")
@@ -0,0 +1,36 @@
+"""Local anonymous FTP server, standing in for the IBGE servers in the tests
+and the benchmarks."""
+
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator
+
+from pyftpdlib.authorizers import DummyAuthorizer
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import ThreadedFTPServer
+
+
+@contextmanager
+def serve(root: Path) -> Iterator[ThreadedFTPServer]:
+    """Serve `root` over anonymous FTP on a local port, in a thread."""
+    # Left unconfigured, pyftpdlib logs every command to stderr
+    logger = logging.getLogger("pyftpdlib")
+    logger.addHandler(logging.NullHandler())
+    logger.setLevel(logging.WARNING)
+
+    authorizer = DummyAuthorizer()
+    authorizer.add_anonymous(str(root))
+    handler = type("Handler", (FTPHandler,), {"authorizer": authorizer})
+
+    server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+    thread = threading.Thread(
+        target=server.serve_forever, kwargs={"handle_exit": False}, daemon=True
+    )
+    thread.start()
+    try:
+        yield server
+    finally:
+        server.close_all()
+        thread.join(timeout=5)
@@ -0,0 +1,32 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+
+@pytest.fixture
+def processed_frame():
+    """Factory of rows as written by scripts/process_addresses.py."""
+
+    def processed_frame(n, seed=0, center=(-8.76, -63.90)):
+        rng = np.random.default_rng(seed)
+        return pd.DataFrame(
+            {
+                "ID_ENDERECO": [str(i) for i in range(n)],
+                "ESTADO": "Rondônia",
+                "MUNICIPIO": "Porto Velho",
+                "DISTRITO": "Porto Velho",
+                "SUBDISTRITO": None,
+                "BAIRRO": "Centro",
+                "CEP": "76801000",
+                "TIPO_LOGRADOURO": "RUA",
+                "RUA": "DOM PEDRO II",
+                "NUMERO": [str(i) for i in range(n)],
+                "COMPLEMENTO": None,
+                "LATITUDE": center[0] + rng.normal(0, 0.05, n),
+                "LONGITUDE": center[1] + rng.normal(0, 0.05, n),
+                "ESPECIE": 1,
+                "NIVEL_GEOCODIFICACAO": 1,
+            }
+        )
+
+    return processed_frame
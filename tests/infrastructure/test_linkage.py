@@ -0,0 +1,90 @@
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from addresses.infrastructure import linkage
+
+RECORDS = [
+    # ID, CEP, MUNICIPIO, RUA, NUMERO, COMPLEMENTO
+    ("exact", "76801-000", "Porto Velho", "DOM PEDRO II", "12", None),
+    ("typo", "76801000", "PORTO VELHO", "Dom Pedro 2", "7", None),
+    ("complement", "76801000", "Porto Velho", "DOM PEDRO II", "3", "APTO 2"),
+    ("other street", "76801000", "Porto Velho", "AVENIDA BRASIL", "12", None),
+    ("other city", "76801000", "Candeias do Jamari", "DOM PEDRO II", "12", None),
+    ("no cep", None, "Porto Velho", "DOM PEDRO II", "12", None),
+    ("acre", "69900-000", "Rio Branco", "SAO JOAO", "5", None),
+]
+
+
+@pytest.fixture
+def store(processed_frame, tmp_path):
+    store = tmp_path / "processed"
+    store.mkdir()
+
+    ro = processed_frame(20)
+    ro.loc[ro["NUMERO"] == "3", "COMPLEMENTO"] = "APTO 1"
+    extra = ro[ro["NUMERO"] == "3"].assign(ID_ENDERECO="20", COMPLEMENTO="APTO 2")
+    ac = processed_frame(10)
+    ac["ID_ENDERECO"] = "ac" + ac["ID_ENDERECO"]
+    ac["ESTADO"], ac["MUNICIPIO"] = "Acre", "Rio Branco"
+    ac["CEP"], ac["RUA"] = "69900000", "SÃO JOÃO"
+
+    pd.concat([ro, extra]).to_csv(store / "11_RO.csv", index=False)
+    ac.to_csv(store / "12_AC.csv", index=False)
+    return store
+
+
+@pytest.fixture
+def records(tmp_path):
+    path = tmp_path / "records.csv"
+    pd.DataFrame(
+        RECORDS, columns=["ID", "CEP", "MUNICIPIO", "RUA", "NUMERO", "COMPLEMENTO"]
+    ).to_csv(path, index=False)
+    return path
+
+
+def test_similarity():
+    scores = linkage.similarity(
+        pa.array(["DOM PEDRO II", "", "12", "SÃO JOÃO", "dom pedro"]),
+        pa.array(["dom pedro ii", None, "", "sao joao", "dom pedro ii"]),
+    )
+
+    assert scores[:4].tolist() == [1.0, 1.0, 0.0, 1.0]
+    assert 0.5 < scores[4] < 1.0
+
+
+@pytest.mark.parametrize("pairs", [linkage.PAIRS, 1])
+def test_link_tables_finds_best_row_of_block(store, records, pairs):
+    reference = linkage.read_table(
+        store / "11_RO.csv", ["ID_ENDERECO", "CEP", "MUNICIPIO", *linkage.FIELDS]
+    )
+    matched, rows, scores = linkage.link_tables(
+        linkage.read_records(records, "ID"), reference, pairs=pairs
+    )
+
+    ids = reference["ID_ENDERECO"].take(rows).to_pylist()
+    assert dict(zip(matched.tolist(), ids)) == {0: "12", 1: "7", 2: "20"}
+    assert scores[0] == pytest.approx(1.0)
+    assert scores[1] < 1.0
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_link_writes_best_matches(store, records, tmp_path, workers):
+    destination = tmp_path / "linked.csv"
+
+    linked = linkage.link(store, records, destination, workers=workers)
+
+    result = pd.read_csv(destination, dtype={"ID_ENDERECO": str})
+    assert linked == 4
+    assert result["ID"].tolist() == [record[0] for record in RECORDS]
+    assert result["ID_ENDERECO"].tolist()[:3] == ["12", "7", "20"]
+    assert result["ID_ENDERECO"].tolist()[-1] == "ac5"
+    assert result["SCORE"].isna().tolist() == [False] * 3 + [True] * 3 + [False]
+
+
+def test_link_requires_columns(store, tmp_path):
+    path = tmp_path / "records.csv"
+    pd.DataFrame({"ID": ["a"], "CEP": ["76801000"], "RUA": ["X"]}).to_csv(path)
+
+    with pytest.raises(ValueError, match=r"\['MUNICIPIO', 'NUMERO'\]"):
+        linkage.link(store, path, tmp_path / "linked.csv")
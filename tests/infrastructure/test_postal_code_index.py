@@ -0,0 +1,84 @@
+import multiprocessing
+
+import pytest
+
+from addresses.domain.value_objects import PostalCode
+from addresses.infrastructure import postal_code_index
+
+
+@pytest.fixture
+def store(processed_frame, tmp_path):
+    store = tmp_path / "processed"
+    store.mkdir()
+
+    ro = processed_frame(500)
+    ro["CEP"] = ["76801000", "76801-001", "01310100", None, "76801000"] * 100
+    ro["COMPLEMENTO"] = ['APTO "1", BLOCO A'] * 500  # Needs quoting
+    ac = processed_frame(300, seed=1)
+    ac["ESTADO"] = "Acre"
+    ac["CEP"] = "69900000"
+    ac.loc[0, "CEP"] = "01310100"
+
+    ro.to_csv(store / "11_RO.csv", index=False)
+    ac.to_csv(store / "12_AC.csv", index=False)
+    return store
+
+
+@pytest.fixture
+def index(store, tmp_path):
+    return postal_code_index.build(store, tmp_path / "index")
+
+
+def _lookup(directory, code):
+    index = postal_code_index.PostalCodeIndex(directory)
+    return [address.id for address in index.find_by_postal_code(PostalCode(code))]
+
+
+def test_find_by_postal_code_returns_every_match(index):
+    found = index.find_by_postal_code(PostalCode("76801-000"))
+
+    assert len(found) == 200
+    assert {address.postal_code.code for address in found} == {"76801-000"}
+    assert found[0].street_address.complement == 'APTO "1", BLOCO A'
+
+
+def test_find_by_postal_code_spans_files(index):
+    found = index.find_by_postal_code(PostalCode("01310-100"))
+
+    assert len(found) == 101
+    assert {address.territorial_division.uf for address in found} == {"RO", "AC"}
+
+
+def test_find_by_postal_code_normalizes_formats(index):
+    # "76801-001" in the store is indexed as 76801001
+    assert len(index.find_by_postal_code(PostalCode("76801-001"))) == 100
+
+
+def test_find_by_postal_code_without_match(index):
+    assert index.find_by_postal_code(PostalCode("99999-999")) == []
+
+
+def test_index_serves_worker_processes(index, tmp_path):
+    index.find_by_postal_code(PostalCode("69900-000"))  # Opens file descriptors
+
+    with multiprocessing.get_context("spawn").Pool(2) as pool:
+        results = pool.starmap(
+            _lookup,
+            [(tmp_path / "index", "69900-000"), (tmp_path / "index", "01310-100")],
+        )
+
+    assert len(results[0]) == 299
+    assert len(results[1]) == 101
+
+
+def test_index_rejects_changed_store(index, store, tmp_path):
+    with open(store / "12_AC.csv", "a", encoding="utf-8") as f:
+        f.write("\n")
+
+    with pytest.raises(ValueError, match="changed since the index was built"):
+        postal_code_index.PostalCodeIndex(tmp_path / "index")
+
+
+def test_build_requires_csv_store(tmp_path):
+    with pytest.raises(ValueError, match="No processed CSV files"):
+        postal_code_index.build(tmp_path, tmp_path / "index")
@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from addresses.domain.value_objects import AddressSpecies, GeocodingLevel
+from addresses.infrastructure.records import format_postal_code, to_address, to_batch
+
+
+def test_to_address_maps_processed_row(processed_frame):
+    row = processed_frame(1).iloc[0].to_dict()
+    row.update(CEP=1310100, ESPECIE=4, NIVEL_GEOCODIFICACAO=3, COMPLEMENTO=np.nan)
+
+    address = to_address(row)
+
+    assert address.postal_code.code == "01310-100"
+    assert address.species is AddressSpecies.EDUCATIONAL
+    assert address.coordinate.precision is GeocodingLevel.ESTIMATED
+    assert address.street_address.complement == ""
+    assert address.territorial_division.subdistrict == ""
+
+
+def test_format_postal_code():
+    assert format_postal_code("76801-000") == "76801-000"
+    assert format_postal_code("1310100") == "01310-100"
+
+
+def test_to_batch_matches_to_address(processed_frame):
+    df = processed_frame(4)
+    df["CEP"] = ["76801000", "1310100", "01310-100", "76801000"]
+    df["NUMERO"] = ["1", "SN", None, "4"]
+    df.loc[1, "COMPLEMENTO"] = "CASA 2"
+
+    batch = to_batch(df)
+
+    assert list(batch) == [to_address(row) for row in df.to_dict("records")]
+    assert len(batch.postal_code.categories) == 2
+
+
+def test_to_batch_accepts_categorical_columns(processed_frame):
+    df = processed_frame(3)
+    df["ESTADO"] = pd.Categorical(["Rondônia", None, "Acre"])
+    df["SUBDISTRITO"] = df["SUBDISTRITO"].astype("category")
+
+    batch = to_batch(df.dropna(subset=["ESTADO"]))
+
+    assert [a.territorial_division.uf for a in batch] == ["RO", "AC"]
+    assert [a.territorial_division.subdistrict for a in batch] == ["", ""]
+
+
+def test_to_batch_rejects_unknown_state(processed_frame):
+    df = processed_frame(2)
+    df["ESTADO"] = "Atlântida"
+
+    with pytest.raises(ValueError, match="Unknown UF"):
+        to_batch(df)
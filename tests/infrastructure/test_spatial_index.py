@@ -0,0 +1,104 @@
+import numpy as np
+import pytest
+
+from addresses.domain.aggregates import Address
+from addresses.infrastructure import spatial_index
+from addresses.infrastructure.records import PROCESSED_SCHEMA
+
+CENTER = (-8.76, -63.90)  # Porto Velho, around which the rows are drawn
+
+
+@pytest.fixture
+def points(processed_frame):
+    df = processed_frame(3000)
+    df.loc[0, ["LATITUDE", "LONGITUDE"]] = np.nan  # Dropped from the index
+    return df
+
+
+@pytest.fixture
+def index(points, tmp_path):
+    source = tmp_path / "processed"
+    source.mkdir()
+    # Two UF files, both indexed as separate shards
+    points.iloc[:2000].to_csv(source / "11_RO.csv", index=False)
+    points.iloc[2000:].to_csv(source / "11_RO_2.csv", index=False)
+    return spatial_index.build(source, tmp_path / "index")
+
+
+def brute_force(points, lat, lon):
+    points = points.dropna(subset=["LATITUDE"])
+    distances = spatial_index.haversine(
+        lat, lon, points["LATITUDE"].to_numpy(), points["LONGITUDE"].to_numpy()
+    )
+    return points.assign(distance=distances).sort_values("distance", kind="stable")
+
+
+def test_nearest_matches_brute_force(index, points):
+    lat, lon = CENTER[0] + 0.013, CENTER[1] - 0.021
+    expected = brute_force(points, lat, lon)["ID_ENDERECO"].head(10).tolist()
+
+    found = index.nearest(lat, lon, k=10)
+
+    assert all(isinstance(address, Address) for address in found)
+    assert [address.id for address in found] == expected
+
+
+def test_nearest_expands_to_far_points(index, points):
+    # No point within the first radii: the search must keep growing
+    found = index.nearest(0.0, 0.0, k=2)
+
+    expected = brute_force(points, 0.0, 0.0)["ID_ENDERECO"].head(2).tolist()
+    assert [address.id for address in found] == expected
+
+
+def test_nearest_returns_everything_when_k_exceeds_size(index):
+    assert len(index.nearest(*CENTER, k=5000)) == 2999
+
+
+def test_within_radius_matches_brute_force(index, points):
+    expected = brute_force(points, *CENTER)
+    expected = expected[expected["distance"] <= 1500]["ID_ENDERECO"].tolist()
+
+    found = index.within_radius(*CENTER, 1500)
+
+    assert len(expected) > 0
+    assert [address.id for address in found] == expected
+
+
+def test_within_radius_outside_data(index):
+    assert index.within_radius(10.0, 10.0, 1000) == []
+
+
+def test_index_reopens_from_disk(index, tmp_path):
+    reopened = spatial_index.SpatialIndex(tmp_path / "index")
+
+    assert [a.id for a in reopened.nearest(*CENTER, k=3)] == [
+        a.id for a in index.nearest(*CENTER, k=3)
+    ]
+
+
+def test_build_from_parquet_dataset(points, tmp_path):
+    source = tmp_path / "processed"
+    points.to_parquet(source, partition_cols=["ESTADO", "MUNICIPIO"])
+
+    index = spatial_index.build(source, tmp_path / "index")
+
+    (address,) = index.nearest(*CENTER, k=1)
+    assert address.territorial_division.uf == "RO"
+    assert address.territorial_division.municipality == "Porto Velho"
+
+
+@pytest.mark.parametrize("layout", ["csv", "parquet"])
+def test_read_shards_drops_rows_without_coordinates(points, tmp_path, layout):
+    source = tmp_path / "processed"
+    if layout == "csv":
+        source.mkdir()
+        points.to_csv(source / "11_RO.csv", index=False)
+    else:
+        points.to_parquet(source, partition_cols=["ESTADO", "MUNICIPIO"])
+
+    ((name, table),) = spatial_index.read_shards(source)
+
+    assert name == ("11_RO" if layout == "csv" else "Rondônia")
+    assert table.num_rows == len(points) - 1
+    assert table.schema == PROCESSED_SCHEMA
@@ -0,0 +1,131 @@
+import sqlite3
+
+import pytest
+
+from addresses.domain.value_objects import PostalCode, TerritorialDivision
+from addresses.infrastructure import sqlite_repository
+from addresses.infrastructure.records import to_address
+
+
+@pytest.fixture
+def store(processed_frame, tmp_path):
+    store = tmp_path / "processed"
+    store.mkdir()
+
+    ro = processed_frame(10)
+    ro["CEP"] = ["76801000"] * 5 + ["1310100"] * 5
+    ro["NUMERO"] = ["SN"] + [str(i) for i in range(1, 10)]
+    ro.loc[9, "LATITUDE"] = None  # Dropped: no coordinate
+    ac = processed_frame(5, seed=1)
+    ac["ID_ENDERECO"] = [f"ac{i}" for i in range(5)]
+    ac["ESTADO"] = "Acre"
+    ac["MUNICIPIO"] = "Rio Branco"
+    ac["CEP"] = "69900000"
+
+    ro.to_csv(store / "11_RO.csv", index=False)
+    ac.to_csv(store / "12_AC.csv", index=False)
+    return store
+
+
+@pytest.fixture
+def repository(store, tmp_path):
+    assert sqlite_repository.load(store, tmp_path / "addresses.db", chunksize=3) == 14
+    repository = sqlite_repository.SqliteAddressRepository(tmp_path / "addresses.db")
+    yield repository
+    repository.close()
+
+
+def test_find_by_id(repository):
+    address = repository.find_by_id("ac2")
+
+    assert address.territorial_division.uf == "AC"
+    assert address.territorial_division.municipality == "Rio Branco"
+    assert address.postal_code.code == "69900-000"
+    assert repository.find_by_id("missing") is None
+
+
+def test_find_by_postal_code(repository):
+    found = repository.find_by_postal_code(PostalCode("01310-100"))
+
+    # Leading zero restored; the row without coordinates was not loaded
+    assert sorted(address.id for address in found) == ["5", "6", "7", "8"]
+
+
+def test_find_by_territorial_division(repository):
+    found = repository.find_by_territorial_division(
+        TerritorialDivision(
+            uf="RO", municipality="Porto Velho", district="Porto Velho", subdistrict=""
+        )
+    )
+
+    assert len(found) == 9
+    assert found[0].street_address.number == "SN"
+
+
+def test_save_batch_round_trips_addresses(repository, processed_frame):
+    rows = processed_frame(3).assign(ID_ENDERECO=["n0", "n1", "n2"], ESPECIE=5)
+    addresses = [to_address(row) for row in rows.to_dict("records")]
+
+    repository.save_batch(addresses)
+
+    assert repository.find_by_id("n1") == addresses[1]
+
+
+def test_save_batch_replaces_existing_id(repository):
+    address = repository.find_by_id("ac0")
+    address.street_address = type(address.street_address)(
+        street="NOVA", street_type="RUA", number="1", complement="", neighborhood=""
+    )
+
+    repository.save_batch([address])
+
+    assert repository.find_by_id("ac0").street_address.street == "NOVA"
+    assert len(repository.find_by_postal_code(PostalCode("69900-000"))) == 5
+
+
+def test_load_uses_wal_and_builds_indexes(repository):
+    connection = repository.connection
+
+    assert connection.execute("PRAGMA journal_mode").fetchone() == ("wal",)
+    indexes = {
+        name
+        for (name,) in connection.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'index'"
+        )
+    }
+    assert indexes == set(sqlite_repository.INDEXES)
+    plan = connection.execute(
+        f"EXPLAIN QUERY PLAN {sqlite_repository.SELECT} WHERE postal_code = ?",
+        ("69900-000",),
+    ).fetchall()
+    assert "addresses_postal_code" in plan[0][-1]
+
+
+def test_load_twice_replaces_rows(store, tmp_path):
+    database = tmp_path / "addresses.db"
+    sqlite_repository.load(store, database, chunksize=3)
+
+    # Act: e.g. `make sqlite` run again
+    assert sqlite_repository.load(store, database, chunksize=3) == 14
+
+    # Assert
+    connection = sqlite3.connect(database)
+    assert connection.execute("SELECT count(*) FROM addresses").fetchone() == (14,)
+    indexes = connection.execute(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'index'"
+    ).fetchone()
+    assert indexes == (len(sqlite_repository.INDEXES),)
+    connection.close()
+
+
+def test_bulk_load_rebuilds_indexes_after_failure(tmp_path):
+    repository = sqlite_repository.SqliteAddressRepository(tmp_path / "a.db")
+
+    with pytest.raises(sqlite3.Error):
+        with repository.bulk_load():
+            repository.save_rows([("too", "few")])
+
+    count = repository.connection.execute(
+        "SELECT count(*) FROM sqlite_master WHERE type = 'index'"
+    ).fetchone()
+    assert count == (3,)
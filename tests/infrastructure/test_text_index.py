@@ -0,0 +1,119 @@
+import pyarrow as pa
+import pytest
+
+from addresses.infrastructure import text_index
+
+STREETS = [
+    ("RUA", "DOM PEDRO II", "Centro"),
+    ("AVENIDA", "SETE DE SETEMBRO", "Centro"),
+    ("RUA", "JOSÉ DE ALENCAR", "Olaria"),
+    ("TRAVESSA", "SÃO JOÃO", "Nossa Senhora das Graças"),
+    ("RUA", "SÃO JOÃO", "Olaria"),
+]
+
+
+@pytest.fixture
+def store(processed_frame, tmp_path):
+    store = tmp_path / "processed"
+    store.mkdir()
+
+    ro = processed_frame(500)
+    for column, values in zip(["TIPO_LOGRADOURO", "RUA", "BAIRRO"], zip(*STREETS)):
+        ro[column] = list(values) * 100
+    ro.loc[ro["RUA"] == "SÃO JOÃO", "MUNICIPIO"] = "Ji-Paraná"
+    ac = processed_frame(300, seed=1)
+    ac["ESTADO"] = "Acre"
+    ac["MUNICIPIO"] = "Rio Branco"
+    ac["RUA"] = "SÃO JOÃO"
+    ac["BAIRRO"] = None
+
+    ro.to_csv(store / "11_RO.csv", index=False)
+    ac.to_csv(store / "12_AC.csv", index=False)
+    return store
+
+
+@pytest.fixture
+def index(store, tmp_path):
+    return text_index.build(store, tmp_path / "index")
+
+
+def test_normalize_removes_accents_case_and_punctuation():
+    normalized = text_index.normalize(pa.array(["São João-D'Água ", None]))
+
+    assert normalized.to_pylist() == ["sao joao d agua", ""]
+
+
+def test_trigrams_pad_each_word():
+    texts, trigrams = text_index.trigrams(pa.array(["ab", "", "ab c"]))
+
+    assert texts.tolist() == [0, 0, 0, 2, 2, 2, 2, 2]
+    # "  a", " ab", "ab " for "ab", and "  c", " c " for "c"
+    assert len(set(trigrams[texts == 2].tolist())) == 5
+
+
+def test_search_ranks_exact_match_first(index):
+    found = index.search("rua dom pedro")
+
+    assert found[0].street == "DOM PEDRO II"
+    assert found[0].score == 1.0
+    assert found[0].rows == 100
+    assert (found[0].uf, found[0].municipality) == ("RO", "Porto Velho")
+
+
+def test_search_ignores_accents_and_tolerates_typos(index):
+    assert index.search("jose de alencra")[0].street == "JOSÉ DE ALENCAR"
+    assert index.search("SETE DE SETENBRO")[0].street == "SETE DE SETEMBRO"
+
+
+def test_search_matches_neighborhood_and_municipality(index):
+    found = index.search("sao joao olaria")
+
+    assert (found[0].street_type, found[0].neighborhood) == ("RUA", "Olaria")
+    assert found[1].street == "JOSÉ DE ALENCAR"  # Olaria outweighs "sao"
+    assert index.search("sao joao rio branco")[0].municipality == "Rio Branco"
+
+
+def test_search_bounds_the_candidates_of_common_trigrams(index, monkeypatch):
+    expected = index.search("rua sao joao olaria")
+    monkeypatch.setattr(text_index, "COUNTED_POSTINGS", 1)
+    monkeypatch.setattr(text_index, "MAX_CANDIDATES", 2)
+
+    found = index.search("rua sao joao olaria")
+
+    # Only the documents of the rarest trigram are candidates: the street of
+    # Rio Branco, matching "rua sao joao" alone, is missed
+    assert found[0] == expected[0]
+    assert (found[0].street, found[0].neighborhood) == ("SÃO JOÃO", "Olaria")
+    assert len(found) < len(expected)
+
+
+def test_search_filters_by_municipality(index):
+    found = index.search("sao joao", municipality="rio branco")
+
+    assert [(match.uf, match.rows) for match in found] == [("AC", 300)]
+    assert index.search("sao joao", municipality="ji parana", uf="Rondônia")
+    assert index.search("sao joao", municipality="Rio Branco", uf="RO") == []
+    assert index.search("sao joao", municipality="Curitiba") == []
+
+
+def test_search_without_match(index):
+    assert index.search("xyz") == []
+    assert index.search("  --  ") == []
+
+
+def test_addresses_of_match(index):
+    match = index.search("sete de setembro")[0]
+    addresses = index.addresses(match)
+
+    assert len(addresses) == match.rows
+    assert {address.street_address.street for address in addresses} == {
+        "SETE DE SETEMBRO"
+    }
+
+
+def test_index_rejects_changed_store(index, store, tmp_path):
+    with open(store / "11_RO.csv", "a", encoding="utf-8") as f:
+        f.write("\n")
+
+    with pytest.raises(ValueError, match="changed since the index was built"):
+        text_index.TextIndex(tmp_path / "index")
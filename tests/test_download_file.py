@@ -1,7 +1,11 @@
+import ftplib
+import json
 import sys
 from pathlib import Path
 from unittest.mock import Mock, patch
 
+import pytest
+
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 
 import scripts.download as download_cnefe
@@ -10,10 +14,10 @@ import scripts.download as download_cnefe
 def test_download_file_characterization(tmp_path):
     # Arrange
     fake_ftp = Mock()
-    fake_ftp.size.return_value = 10
+    fake_ftp.size.return_value = 12
     chunks = [b"012345", b"abcdef"]
 
-    def fake_retrbinary(cmd, callback, blocksize):
+    def fake_retrbinary(cmd, callback, blocksize, rest=None):
         for c in chunks:
             callback(c)
 
@@ -36,6 +40,9 @@ def test_main_characterization(mock_ftp_class, tmp_path):
     fake_ftp = Mock()
     fake_ftp.nlst.return_value = ["UF/file1.zip", "UF/file2.zip"]
     fake_ftp.size.return_value = 10
+    fake_ftp.retrbinary.side_effect = (
+        lambda cmd, callback, blocksize, rest=None: callback(b"0123456789")
+    )
     mock_ftp_class.return_value = fake_ftp
 
     # Act
@@ -46,3 +53,165 @@ def test_main_characterization(mock_ftp_class, tmp_path):
     assert any("Dicionario_CNEFE_Censo_2022.xls" in c for c in calls)
     assert any("UF/file1.zip" in c for c in calls)
     assert any("UF/file2.zip" in c for c in calls)
+
+
+@pytest.fixture
+def cnefe_ftp(ftp_server, monkeypatch):
+    """Local stand-in for the IBGE server with the CNEFE directory layout."""
+    host, port, root = ftp_server
+    directory = root / download_cnefe.FTP_DIR.lstrip("/")
+    (directory / download_cnefe.ADDRESSES_PATH).mkdir(parents=True)
+
+    files = {download_cnefe.DICTIONARY_PATH: b"dictionary"}
+    for uf in ["11_RO", "12_AC", "35_SP"]:
+        files[f"{download_cnefe.ADDRESSES_PATH}/{uf}.zip"] = uf.encode() * 1000
+    for name, content in files.items():
+        (directory / name).write_bytes(content)
+
+    monkeypatch.setattr(download_cnefe, "FTP_HOST", host)
+    monkeypatch.setattr(download_cnefe, "FTP_PORT", port)
+    return files
+
+
+def test_main_concurrent_downloads_from_ftp_server(cnefe_ftp, tmp_path):
+    # Act
+    download_cnefe.main(tmp_path / "raw", workers=2)
+
+    # Assert
+    for name, content in cnefe_ftp.items():
+        assert (tmp_path / "raw" / name).read_bytes() == content
+
+
+def test_main_records_metrics(cnefe_ftp, tmp_path, metrics_file):
+    # Act
+    download_cnefe.main(tmp_path / "raw", workers=2)
+
+    # Assert
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    files = {r["file"]: r["bytes"] for r in records if r["name"] == "download_file"}
+    assert files == {
+        Path(name).name: len(content) for name, content in cnefe_ftp.items()
+    }
+    assert records[-1]["name"] == "download"
+    assert records[-1]["bytes"] == sum(map(len, cnefe_ftp.values()))
+
+
+@patch("scripts.download.FTP")
+def test_fetch_reconnects_after_failure(mock_ftp_class, tmp_path):
+    # Arrange: the first session drops the transfer, the second one works
+    broken_ftp, healthy_ftp = Mock(), Mock()
+    broken_ftp.size.return_value = healthy_ftp.size.return_value = 4
+    broken_ftp.retrbinary.side_effect = ftplib.error_temp("421 Timeout")
+    healthy_ftp.retrbinary.side_effect = (
+        lambda cmd, callback, blocksize, rest=None: callback(b"data")
+    )
+    mock_ftp_class.side_effect = [broken_ftp, healthy_ftp]
+
+    pool = download_cnefe.ConnectionPool()
+    local_path = tmp_path / "file.zip"
+
+    # Act
+    download_cnefe.fetch(pool, "UF/file.zip", local_path)
+    pool.close()
+
+    # Assert
+    assert local_path.read_bytes() == b"data"
+    broken_ftp.close.assert_called_once()
+    healthy_ftp.quit.assert_called_once()
+
+
+def test_main_resumes_partial_and_skips_complete_files(cnefe_ftp, tmp_path):
+    # Arrange
+    destination = tmp_path / "raw"
+    complete, partial, truncated = [
+        f"{download_cnefe.ADDRESSES_PATH}/{uf}.zip"
+        for uf in ["11_RO", "12_AC", "35_SP"]
+    ]
+    (destination / download_cnefe.ADDRESSES_PATH).mkdir(parents=True)
+
+    (destination / complete).write_bytes(cnefe_ftp[complete])
+    complete_mtime = (destination / complete).stat().st_mtime_ns
+    Path(destination, partial + download_cnefe.PARTIAL_SUFFIX).write_bytes(
+        cnefe_ftp[partial][:1500]
+    )
+    (destination / truncated).write_bytes(cnefe_ftp[truncated][:10])
+
+    # Act
+    download_cnefe.main(destination, workers=2)
+
+    # Assert
+    for name, content in cnefe_ftp.items():
+        assert (destination / name).read_bytes() == content
+    assert (destination / complete).stat().st_mtime_ns == complete_mtime
+    assert not list(destination.rglob(f"*{download_cnefe.PARTIAL_SUFFIX}"))
+
+
+def test_download_file_resumes_from_partial_offset(tmp_path):
+    # Arrange
+    fake_ftp = Mock()
+    fake_ftp.size.return_value = 12
+    fake_ftp.retrbinary.side_effect = lambda cmd, callback, blocksize, rest=None: (
+        callback(b"abcdef")
+    )
+    local_path = tmp_path / "file.zip"
+    (tmp_path / "file.zip.part").write_bytes(b"012345")
+
+    # Act
+    download_cnefe.download_file(fake_ftp, "UF/file.zip", local_path)
+
+    # Assert
+    assert local_path.read_bytes() == b"012345abcdef"
+    assert fake_ftp.retrbinary.call_args.kwargs["rest"] == 6
+
+
+def test_download_file_renames_complete_partial_without_transfer(tmp_path):
+    # Arrange: interrupted after the last byte, before the rename
+    fake_ftp = Mock()
+    fake_ftp.size.return_value = 12
+    local_path = tmp_path / "file.zip"
+    (tmp_path / "file.zip.part").write_bytes(b"012345abcdef")
+
+    # Act
+    download_cnefe.download_file(fake_ftp, "UF/file.zip", local_path)
+
+    # Assert
+    assert local_path.read_bytes() == b"012345abcdef"
+    assert not (tmp_path / "file.zip.part").exists()
+    fake_ftp.retrbinary.assert_not_called()
+
+
+def test_download_file_restarts_when_size_is_unknown(tmp_path):
+    # Arrange: SIZE not answered with 213
+    fake_ftp = Mock()
+    fake_ftp.size.return_value = None
+    fake_ftp.retrbinary.side_effect = lambda cmd, callback, blocksize, rest=None: (
+        callback(b"012345abcdef")
+    )
+    local_path = tmp_path / "file.zip"
+    (tmp_path / "file.zip.part").write_bytes(b"012345")
+
+    # Act
+    download_cnefe.download_file(fake_ftp, "UF/file.zip", local_path)
+
+    # Assert
+    assert local_path.read_bytes() == b"012345abcdef"
+    assert fake_ftp.retrbinary.call_args.kwargs["rest"] is None
+    assert not download_cnefe.is_downloaded(local_path, None)
+
+
+def test_download_file_rejects_incomplete_transfer(tmp_path):
+    # Arrange
+    fake_ftp = Mock()
+    fake_ftp.size.return_value = 12
+    fake_ftp.retrbinary.side_effect = lambda cmd, callback, blocksize, rest=None: (
+        callback(b"012")
+    )
+    local_path = tmp_path / "file.zip"
+
+    # Act
+    with pytest.raises(OSError, match="got 3 of 12 bytes"):
+        download_cnefe.download_file(fake_ftp, "UF/file.zip", local_path)
+
+    # Assert: the partial data is kept for the next attempt
+    assert not local_path.exists()
+    assert (tmp_path / "file.zip.part").read_bytes() == b"012"
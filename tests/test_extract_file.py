@@ -1,6 +1,9 @@
+import json
 import sys
 import zipfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from unittest.mock import patch
 
 import pytest
 
@@ -43,3 +46,90 @@ def test_main_extraction_real_zip(tmp_source, tmp_destination):
 
     non_txt_files = list(dest_dir.rglob("*.csv"))
     assert len(non_txt_files) == 0
+
+
+def test_main_rerun_skips_verified_members(tmp_source, tmp_destination):
+    # Arrange
+    extractor.main(tmp_source, tmp_destination, ".txt")
+    extracted = tmp_destination / "file1.txt"
+    mtime = extracted.stat().st_mtime_ns
+
+    # Act
+    with patch.object(zipfile.ZipFile, "extract") as mock_extract:
+        extractor.main(tmp_source, tmp_destination, ".txt")
+
+    # Assert
+    mock_extract.assert_not_called()
+    assert extracted.stat().st_mtime_ns == mtime
+    manifest = extractor.load_manifest(tmp_destination)
+    assert manifest["file1.txt"]["size"] == len("Hello World")
+
+
+def test_main_records_metrics(tmp_source, tmp_destination, metrics_file):
+    # Act: the second run has nothing left to extract
+    extractor.main(tmp_source, tmp_destination, ".txt")
+    extractor.main(tmp_source, tmp_destination, ".txt")
+
+    # Assert
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert [record["name"] for record in records] == [
+        "extract_member",
+        "extract",
+        "extract",
+    ]
+    assert records[0]["file"] == "file1.txt"
+    assert records[0]["bytes"] == len("Hello World")
+    assert records[1]["bytes"] == (tmp_source / "archive.zip").stat().st_size
+
+
+def test_main_reextracts_corrupted_member(tmp_source, tmp_destination):
+    # Arrange: same size, different content
+    extractor.main(tmp_source, tmp_destination, ".txt")
+    (tmp_destination / "file1.txt").write_text("Hello Earth")
+
+    # Act
+    extractor.main(tmp_source, tmp_destination, ".txt")
+
+    # Assert
+    assert (tmp_destination / "file1.txt").read_text() == "Hello World"
+
+
+def test_main_parallel_extraction(tmp_source, tmp_destination):
+    # Arrange
+    with zipfile.ZipFile(tmp_source / "other.zip", "w") as zipf:
+        zipf.writestr("nested/file3.csv", "More data")
+    (tmp_source / "broken.zip").write_bytes(b"not a zip")
+
+    # Act
+    extractor.main(tmp_source, tmp_destination, ".csv", workers=2)
+
+    # Assert
+    assert (tmp_destination / "file2.csv").read_text() == "Data"
+    assert (tmp_destination / "nested" / "file3.csv").read_text() == "More data"
+    assert set(extractor.load_manifest(tmp_destination)) == {
+        "file2.csv",
+        "nested/file3.csv",
+    }
+
+
+def test_main_extracts_one_archive_per_cpu_by_default(
+    tmp_source, tmp_destination, monkeypatch
+):
+    # Arrange: more CPUs than archives
+    with zipfile.ZipFile(tmp_source / "other.zip", "w") as zipf:
+        zipf.writestr("file3.csv", "More data")
+    pools = []
+
+    def thread_pool(max_workers, mp_context):
+        pools.append(max_workers)
+        return ThreadPoolExecutor(max_workers)
+
+    monkeypatch.setattr(extractor.os, "cpu_count", lambda: 8)
+    monkeypatch.setattr(extractor, "ProcessPoolExecutor", thread_pool)
+
+    # Act
+    extractor.main(tmp_source, tmp_destination, ".csv")
+
+    # Assert
+    assert pools == [2]
+    assert (tmp_destination / "file3.csv").read_text() == "More data"
@@ -0,0 +1,89 @@
+import argparse
+import io
+import json
+import os
+import pstats
+from pathlib import Path
+
+import pytest
+
+from scripts import instrumentation
+
+
+def read_records(path):
+    return [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+
+
+def test_add_arguments_parses_the_configure_options():
+    parser = argparse.ArgumentParser()
+    instrumentation.add_arguments(parser)
+
+    args = parser.parse_args(["--metrics", "metrics.jsonl"])
+
+    assert args.metrics == Path("metrics.jsonl")
+    assert args.profile is None
+
+
+def test_measure_records_nothing_unless_configured(tmp_path, monkeypatch):
+    monkeypatch.delenv(instrumentation.METRICS_ENV, raising=False)
+
+    with instrumentation.measure("read_chunk") as measured:
+        measured.rows = 10
+
+    assert not instrumentation.enabled()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_measure_appends_json_lines(metrics_file):
+    with instrumentation.measure("write_chunk", file="11_RO.csv") as measured:
+        measured.rows, measured.nbytes = 1_000, 50_000
+    with instrumentation.measure("download_file"):
+        pass
+
+    first, second = read_records(metrics_file)
+    assert first["name"] == "write_chunk"
+    assert first["file"] == "11_RO.csv"
+    assert first["pid"] == os.getpid()
+    assert first["stage"] is None
+    assert first["rows_per_second"] == pytest.approx(1_000 / first["seconds"])
+    assert first["bytes_per_second"] == pytest.approx(50_000 / first["seconds"])
+    assert first["peak_rss_mb"] > 0
+    assert second["rows"] is None
+    assert second["rows_per_second"] is None
+
+
+def test_measure_skips_failed_blocks(metrics_file):
+    with pytest.raises(ValueError):
+        with instrumentation.measure("process_chunk"):
+            raise ValueError
+
+    assert not metrics_file.exists()
+
+
+def test_iterate_measures_bytes_consumed(metrics_file):
+    handle = io.BytesIO(b"abcdef")
+
+    def chunks():
+        while data := handle.read(4):
+            yield data
+
+    assert list(instrumentation.iterate("read_chunk", chunks(), handle.tell)) == [
+        b"abcd",
+        b"ef",
+    ]
+    assert [record["bytes"] for record in read_records(metrics_file)] == [4, 2]
+
+
+def test_stage_names_spans_and_dumps_profile(metrics_file, tmp_path):
+    with instrumentation.stage("extract") as measured:
+        with instrumentation.measure("extract_member"):
+            pass
+        measured.nbytes = 10
+
+    member, stage = read_records(metrics_file)
+    assert member["stage"] == stage["stage"] == "extract"
+    assert stage["name"] == "extract"
+    assert stage["bytes"] == 10
+    assert instrumentation.STAGE_ENV not in os.environ
+    stats = pstats.Stats(str(tmp_path / "profiles" / "extract.prof"))
+    assert stats.total_calls > 0
@@ -0,0 +1,60 @@
+import sys
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.manifest import Manifest, code_version, fingerprint
+
+
+def test_fingerprint_reuses_hash_of_untouched_file(tmp_path):
+    path = tmp_path / "input.csv"
+    path.write_text("a;b\n1;2\n")
+    first = fingerprint(path)
+
+    # A stale hash is kept as long as size and mtime do not change
+    previous = {**first, "sha256": "cached"}
+    assert fingerprint(path, previous)["sha256"] == "cached"
+
+    path.write_text("a;b\n3;4\n")
+    assert fingerprint(path, previous)["sha256"] != first["sha256"]
+
+
+def test_fingerprint_of_missing_file_is_none(tmp_path):
+    assert fingerprint(tmp_path / "missing.csv") is None
+
+
+def test_manifest_is_current(tmp_path):
+    # Arrange
+    source = tmp_path / "input.csv"
+    source.write_text("content")
+    output = tmp_path / "out" / "output.csv"
+    output.parent.mkdir()
+    output.write_text("result")
+
+    manifest = Manifest(tmp_path / "out" / "_manifest.json")
+    inputs = {"input.csv": fingerprint(source)}
+    version = code_version(Path(__file__), option="a")
+    manifest.record("input.csv", inputs, version, [output])
+
+    # Act: reload from disk, as a new run would
+    reloaded = Manifest(tmp_path / "out" / "_manifest.json")
+
+    # Assert
+    assert reloaded.entries["input.csv"]["outputs"] == ["output.csv"]
+    assert reloaded.is_current("input.csv", inputs, version)
+    assert not reloaded.is_current("other.csv", inputs, version)
+    assert not reloaded.is_current(
+        "input.csv", inputs, code_version(Path(__file__), option="b")
+    )
+
+    # Touched with identical content: still current
+    source.touch()
+    touched = {"input.csv": fingerprint(source, inputs["input.csv"])}
+    assert reloaded.is_current("input.csv", touched, version)
+
+    # Changed content or missing output: stale
+    source.write_text("changed")
+    assert not reloaded.is_current(
+        "input.csv", {"input.csv": fingerprint(source)}, version
+    )
+    output.unlink()
+    assert not reloaded.is_current("input.csv", inputs, version)
@@ -0,0 +1,196 @@
+import io
+import sys
+import ftplib
+import threading
+import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+import scripts.download as download
+import scripts.metadata as metadata
+import scripts.pipeline as pipeline
+import scripts.process_metadata as process_metadata
+from scripts.process_addresses import COLUMNS
+
+UFS = {"11_RO": ("11", "Rondônia", 3), "12_AC": ("12", "Acre", 2)}
+
+
+def address_csv(uf: str, rows: int) -> bytes:
+    df = pd.DataFrame({column: [""] * rows for column in COLUMNS})
+    df["COD_UNICO_ENDERECO"] = [f"{uf}{row}" for row in range(rows)]
+    df["COD_UF"] = uf
+    df["COD_MUNICIPIO"] = f"{uf}00015"
+    df["COD_DISTRITO"] = f"{uf}0001505"
+    df["NUM_ENDERECO"] = "10"
+    df["LATITUDE"], df["LONGITUDE"] = -9.0, -63.0
+    df["CEP"] = "76801000"
+    df["COD_ESPECIE"], df["NV_GEO_COORD"] = 1, 1
+    return df.to_csv(sep=";", index=False).encode()
+
+
+def spreadsheet(df: pd.DataFrame) -> bytes:
+    # The reader is picked from the content, so XLSX is read under .xls names
+    buffer = io.BytesIO()
+    df.to_excel(
+        buffer, startrow=process_metadata.HEADER_POS, index=False, engine="openpyxl"
+    )
+    return buffer.getvalue()
+
+
+def dtb_zip() -> bytes:
+    codes = [code for code, _, _ in UFS.values()]
+    sheets = {
+        process_metadata.STATE_MUNICIPALITY_FILE: pd.DataFrame(
+            {
+                "UF": codes,
+                "Nome_UF": [name for _, name, _ in UFS.values()],
+                "Código Município Completo": [f"{code}00015" for code in codes],
+                "Nome_Município": ["Município " + code for code in codes],
+            }
+        ),
+        process_metadata.DISTRITAL_FILE: pd.DataFrame(
+            {
+                "Código de Distrito Completo": [f"{code}0001505" for code in codes],
+                "Nome_Distrito": ["Distrito " + code for code in codes],
+            }
+        ),
+        process_metadata.SUBDISTRITAL_FILE: pd.DataFrame(
+            {"Código de Subdistrito Completo": [], "Nome_Subdistrito": []}
+        ),
+    }
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as archive:
+        for name, df in sheets.items():
+            archive.writestr(name, spreadsheet(df))
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def cnefe_release(ftp_server, monkeypatch):
+    """Serve the address ZIPs, the dictionary and the DTB as the IBGE does."""
+    host, port, root = ftp_server
+    addresses = root / download.FTP_DIR.lstrip("/")
+    (addresses / download.ADDRESSES_PATH).mkdir(parents=True)
+    (addresses / download.DICTIONARY_PATH).write_bytes(b"dictionary")
+    for name, (code, _, rows) in UFS.items():
+        with zipfile.ZipFile(
+            addresses / download.ADDRESSES_PATH / f"{name}.zip", "w"
+        ) as z:
+            z.writestr(f"{name}.csv", address_csv(code, rows))
+
+    territory = root / metadata.FTP_DIR.lstrip("/")
+    territory.mkdir(parents=True)
+    (territory / metadata.DTB_PATH).write_bytes(dtb_zip())
+
+    for module in [download, metadata]:
+        monkeypatch.setattr(module, "FTP_HOST", host)
+        monkeypatch.setattr(module, "FTP_PORT", port)
+
+
+def test_run_tasks_follows_dependencies():
+    order = []
+
+    def step(name):
+        order.append(name)
+        return name.upper()
+
+    tasks = [
+        pipeline.Task("process", "cpu", step, ("process",), ["download", "mappings"]),
+        pipeline.Task("download", "io", step, ("download",)),
+        pipeline.Task("mappings", "cpu", step, ("mappings",), ["metadata"]),
+        pipeline.Task("metadata", "io", step, ("metadata",)),
+    ]
+    with ThreadPoolExecutor(1) as io_executor, ThreadPoolExecutor(1) as cpu:
+        results = pipeline.run_tasks(tasks, {"io": io_executor, "cpu": cpu})
+
+    assert results == {name: name.upper() for name in order}
+    assert order.index("mappings") > order.index("metadata")
+    assert order[-1] == "process"
+
+
+def test_run_tasks_overlaps_stages():
+    # The second download only finishes once the first file is processed, so
+    # running the stages one after the other would time out
+    processed = threading.Event()
+
+    def fetch(name):
+        if name == "second" and not processed.wait(timeout=5):
+            raise TimeoutError
+
+    tasks = [
+        pipeline.Task("download:first", "download", fetch, ("first",)),
+        pipeline.Task("download:second", "download", fetch, ("second",)),
+        pipeline.Task(
+            "process:first", "process", processed.set, (), ["download:first"]
+        ),
+    ]
+    with ThreadPoolExecutor(2) as downloads, ThreadPoolExecutor(1) as processing:
+        pipeline.run_tasks(tasks, {"download": downloads, "process": processing})
+
+
+def test_run_tasks_stops_after_failure():
+    ran = []
+
+    def fail():
+        raise OSError("connection lost")
+
+    tasks = [
+        pipeline.Task("download", "io", fail),
+        pipeline.Task("process", "io", ran.append, ("process",), ["download"]),
+    ]
+    with ThreadPoolExecutor(1) as executor:
+        with pytest.raises(OSError, match="connection lost"):
+            pipeline.run_tasks(tasks, {"io": executor})
+
+    assert ran == []
+
+
+@pytest.mark.parametrize(
+    "after, message",
+    [({"a": ["b"], "b": ["a"]}, "Circular"), ({"a": ["c"], "b": []}, "Unknown")],
+)
+def test_run_tasks_rejects_invalid_graphs(after, message):
+    tasks = [pipeline.Task(name, "io", print, (), deps) for name, deps in after.items()]
+
+    with ThreadPoolExecutor(1) as executor:
+        with pytest.raises(ValueError, match=message):
+            pipeline.run_tasks(tasks, {"io": executor})
+
+
+def test_main_runs_pipeline_from_ftp_server(cnefe_release, tmp_path, monkeypatch):
+    root = tmp_path / "data"
+
+    # Act
+    pipeline.main(root, download_workers=2, workers=2)
+
+    # Assert
+    addresses = root / pipeline.ADDRESSES_DIR
+    for name, (code, state, rows) in UFS.items():
+        df = pd.read_csv(addresses / f"{name}.csv", dtype=str)
+        assert len(df) == rows
+        assert df["ESTADO"].unique().tolist() == [state]
+        assert df["MUNICIPIO"].unique().tolist() == ["Município " + code]
+    assert (root / pipeline.RAW_DIR / download.DICTIONARY_PATH).exists()
+
+    # A second run downloads and processes nothing again, sizing each file once
+    downloaded = [pipeline.RAW_DIR, pipeline.METADATA_DIR]
+    paths = [path for name in downloaded for path in (root / name).rglob("*.*")]
+    paths += addresses.glob("*.csv")
+    mtimes = {path: path.stat().st_mtime_ns for path in paths}
+    sized = Counter()
+    size = ftplib.FTP.size
+
+    def count_size(ftp, remote_path):
+        sized[remote_path] += 1
+        return size(ftp, remote_path)
+
+    monkeypatch.setattr(ftplib.FTP, "size", count_size)
+    pipeline.main(root)
+    assert {path: path.stat().st_mtime_ns for path in mtimes} == mtimes
+    assert set(sized.values()) == {1}
+    assert len(sized) == len(UFS) + 2
@@ -1,13 +1,16 @@
 import json
 import sys
+import zipfile
 from pathlib import Path
 from unittest.mock import patch
 
 import pandas as pd
+import pyarrow.parquet as pq
 import pytest
 
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 import scripts.process_addresses as process_addresses
+from scripts.territory import TERRITORY_FILENAME, write_territory
 
 
 @pytest.fixture
@@ -23,9 +26,17 @@ def tmp_source(tmp_path):
             "COD_MUNICIPIO": ["001", "002"],
             "COD_DISTRITO": ["01", "02"],
             "COD_SUBDISTRITO": ["001", "002"],
-            "NUM_ENDERECO": ["100", None],
+            "NUM_ENDERECO": ["100", "200"],
             "NOM_COMP_ELEM1": ["A", "B"],
             "VAL_COMP_ELEM1": ["X", None],
+            "NOM_COMP_ELEM2": [None, "BLOCO"],
+            "VAL_COMP_ELEM2": [None, "2"],
+            "NOM_COMP_ELEM3": [None, None],
+            "VAL_COMP_ELEM3": [None, None],
+            "NOM_COMP_ELEM4": [None, None],
+            "VAL_COMP_ELEM4": [None, None],
+            "NOM_COMP_ELEM5": [None, "  FUNDOS "],
+            "VAL_COMP_ELEM5": [None, None],
             "LATITUDE": [10.0, 20.0],
             "DSC_MODIFICADOR": ["SN", ""],
             "DSC_LOCALIDADE": ["bairro1", "bairro2"],
@@ -33,6 +44,8 @@ def tmp_source(tmp_path):
             "NOM_TIPO_SEGLOGR": ["RUA", "AV"],
             "LONGITUDE": [30.0, 40.0],
             "NOM_SEGLOGR": ["rua1", "rua2"],
+            "COD_ESPECIE": [1, 4],
+            "NV_GEO_COORD": [1, 3],
         }
     )
     df.to_csv(csv_file, sep=";", index=False)
@@ -85,4 +98,553 @@ def test_main_characterization(tmp_source, tmp_metadata, tmp_destination):
 
     assert df_out.loc[0, "NUMERO"] == "SN"
     assert df_out.loc[0, "COMPLEMENTO"] == "A X"
-    assert df_out.loc[1, "COMPLEMENTO"] == "B"
+    assert df_out.loc[1, "COMPLEMENTO"] == "B BLOCO 2 FUNDOS"
+    assert df_out["ESPECIE"].tolist() == [1, 4]
+    assert df_out["NIVEL_GEOCODIFICACAO"].tolist() == [1, 3]
+
+
+def test_build_complement_merges_all_elements():
+    df = pd.DataFrame(
+        {column: [None, None] for column in process_addresses.COMPLEMENT_COLUMNS}
+    ).astype("string")
+    df.loc[0, "NOM_COMP_ELEM1"] = "APARTAMENTO"
+    df.loc[0, "VAL_COMP_ELEM1"] = " 101"
+    df.loc[0, "NOM_COMP_ELEM3"] = "BLOCO  A "
+
+    complement = process_addresses.build_complement(df)
+
+    assert complement.tolist() == ["APARTAMENTO 101 BLOCO A", ""]
+
+
+def test_main_with_workers_matches_sequential(tmp_source, tmp_metadata, tmp_path):
+    # Arrange: a second, smaller UF file
+    df = pd.read_csv(tmp_source / "addresses.csv", sep=";", dtype=str)
+    df.head(1).to_csv(tmp_source / "small.csv", sep=";", index=False)
+
+    sequential = tmp_path / "sequential"
+    parallel = tmp_path / "parallel"
+
+    # Act
+    process_addresses.main(tmp_source, tmp_metadata, sequential)
+    process_addresses.main(tmp_source, tmp_metadata, parallel, workers=2)
+
+    # Assert
+    for name in ["addresses.csv", "small.csv"]:
+        pd.testing.assert_frame_equal(
+            pd.read_csv(sequential / name), pd.read_csv(parallel / name)
+        )
+
+
+def test_main_parquet_output(tmp_source, tmp_metadata, tmp_destination):
+    # Act: run twice to make sure a re-run replaces the previous parts
+    process_addresses.main(
+        tmp_source, tmp_metadata, tmp_destination, output_format="parquet"
+    )
+    process_addresses.main(
+        tmp_source, tmp_metadata, tmp_destination, output_format="parquet"
+    )
+
+    # Assert
+    partitions = sorted(
+        path.relative_to(tmp_destination).parent.as_posix()
+        for path in tmp_destination.rglob("*.parquet")
+    )
+    assert partitions == [
+        "ESTADO=Estado1/MUNICIPIO=Mun1",
+        "ESTADO=Estado2/MUNICIPIO=Mun2",
+    ]
+
+    df_out = pd.read_parquet(
+        tmp_destination, filters=[("MUNICIPIO", "==", "Mun1")]
+    ).reset_index(drop=True)
+    assert len(df_out) == 1
+    assert df_out.loc[0, "NUMERO"] == "SN"
+    assert df_out["LATITUDE"].dtype == "float64"
+
+
+def partition_chunk(municipalities, types):
+    return pd.DataFrame(
+        {
+            "ESTADO": pd.Categorical(["Estado1"] * len(municipalities)),
+            "MUNICIPIO": pd.Categorical(municipalities),
+            "TIPO_LOGRADOURO": pd.Categorical(types),
+            "NUMERO": [str(i) for i in range(len(municipalities))],
+        }
+    )
+
+
+def test_parquet_partitions_fill_row_groups_across_chunks(tmp_path):
+    # Arrange: street types vary, so categories differ from chunk to chunk
+    chunks = [
+        partition_chunk(["Mun1", "Mun2", "Mun1"], ["RUA", "RUA", "AVENIDA"]),
+        partition_chunk(["Mun1", "Mun2", "Mun1"], [f"T{i}" for i in range(3)]),
+    ] * 2
+
+    # Act
+    with process_addresses.ParquetPartitions(
+        tmp_path, "addresses", row_group_size=4
+    ) as partitions:
+        for chunk in chunks:
+            partitions.write(chunk)
+        partitions.flush()
+        paths = partitions.paths
+
+    # Assert: one file per municipality, with full row groups
+    row_groups = {
+        path.relative_to(tmp_path).as_posix(): [
+            pq.ParquetFile(path).metadata.row_group(i).num_rows
+            for i in range(pq.ParquetFile(path).metadata.num_row_groups)
+        ]
+        for path in paths
+    }
+    assert row_groups == {
+        "ESTADO=Estado1/MUNICIPIO=Mun1/addresses.parquet": [4, 4],
+        "ESTADO=Estado1/MUNICIPIO=Mun2/addresses.parquet": [4],
+    }
+    df_out = pd.read_parquet(tmp_path, filters=[("MUNICIPIO", "==", "Mun2")])
+    assert df_out["TIPO_LOGRADOURO"].astype(str).tolist() == ["RUA", "T1"] * 2
+
+
+def test_parquet_partitions_bound_the_rows_held_back(tmp_path):
+    with process_addresses.ParquetPartitions(
+        tmp_path, "addresses", row_group_size=100, buffer_rows=2
+    ) as partitions:
+        for _ in range(3):
+            partitions.write(partition_chunk(["Mun1", "Mun2", "Mun1"], ["RUA"] * 3))
+            assert sum(partitions.buffered.values()) <= 2
+        partitions.flush()
+
+    assert len(pd.read_parquet(tmp_path)) == 9
+
+
+def test_process_file_sizes_row_groups_to_the_budget(
+    tmp_source, tmp_metadata, tmp_destination, monkeypatch
+):
+    # Arrange: 10 rows of each of two municipalities, in chunks of 3 rows
+    df = pd.read_csv(tmp_source / "addresses.csv", sep=";", dtype=str)
+    pd.concat([df] * 10).to_csv(tmp_source / "addresses.csv", sep=";", index=False)
+    budget = 100_000 * process_addresses.MB
+    sizer = process_addresses.ChunkSizer(budget, size=3, settled=True)
+    monkeypatch.setattr(process_addresses, "_sizers", {budget: sizer})
+    (source,) = process_addresses.find_sources(tmp_source)
+
+    # Act
+    outputs, _ = process_addresses.process_file(
+        source,
+        tmp_destination,
+        process_addresses.load_lookups(tmp_metadata),
+        progress=False,
+        output_format="parquet",
+        memory_budget=budget,
+    )
+
+    # Assert: full row groups of a chunk's rows, the rest in the last one
+    for path in outputs:
+        metadata = pq.ParquetFile(path).metadata
+        row_groups = [
+            metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)
+        ]
+        assert row_groups == [3, 3, 3, 1]
+
+
+def test_main_pyarrow_engine_matches_c_engine(tmp_source, tmp_metadata, tmp_path):
+    # Act
+    process_addresses.main(tmp_source, tmp_metadata, tmp_path / "c")
+    process_addresses.main(
+        tmp_source, tmp_metadata, tmp_path / "pyarrow", engine="pyarrow"
+    )
+
+    # Assert
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "c" / "addresses.csv"),
+        pd.read_csv(tmp_path / "pyarrow" / "addresses.csv"),
+    )
+
+
+def test_read_chunks_pyarrow_engine_splits_by_rows(tmp_source):
+    df = pd.read_csv(tmp_source / "addresses.csv", sep=";", dtype=str)
+    pd.concat([df] * 5).to_csv(tmp_source / "addresses.csv", sep=";", index=False)
+
+    with open(tmp_source / "addresses.csv", "rb") as handle:
+        chunks = list(
+            process_addresses.read_chunks(handle, engine="pyarrow", chunksize=4)
+        )
+
+    assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+    assert chunks[0]["CEP"].dtype == pd.StringDtype("pyarrow")
+    assert chunks[0]["COD_UF"].dtype == "float64"
+    assert chunks[0]["LATITUDE"].dtype == "float64"
+
+
+@pytest.mark.parametrize("engine", process_addresses.ENGINES)
+def test_read_chunks_sizes_each_chunk(tmp_source, engine):
+    df = pd.read_csv(tmp_source / "addresses.csv", sep=";", dtype=str)
+    pd.concat([df] * 5).to_csv(tmp_source / "addresses.csv", sep=";", index=False)
+    sizes = iter([1, 3, 4, 4])
+
+    with open(tmp_source / "addresses.csv", "rb") as handle:
+        chunks = list(
+            process_addresses.read_chunks(handle, engine, next_size=lambda: next(sizes))
+        )
+
+    assert [len(chunk) for chunk in chunks] == [1, 3, 4, 2]
+    assert (
+        pd.concat(chunks)["COD_UNICO_ENDERECO"].astype(str).tolist()
+        == [
+            "1",
+            "2",
+        ]
+        * 5
+    )
+
+
+def test_chunk_sizer_measures_bytes_per_row(monkeypatch):
+    mb = process_addresses.MB
+    # Peak RSS after each chunk: flat while fixed costs dominate, then 1 KB/row
+    peaks = iter([100 * mb, 100 * mb, 100 * mb + 120_000 * 1024])
+    monkeypatch.setattr(
+        process_addresses.instrumentation, "peak_rss_mb", lambda: next(peaks) / mb
+    )
+    sizer = process_addresses.ChunkSizer(budget=400 * mb)
+
+    sizes = [sizer.size]
+    for _ in range(3):
+        sizer.observe(sizer.size)
+        sizes.append(sizer.size)
+
+    assert sizes[:3] == [10_000, 40_000, 160_000]
+    assert sizer.bytes_per_row == 1024
+    target = 400 * mb * process_addresses.BUDGET_MARGIN
+    assert sizes[3] == int(160_000 + (target - 100 * mb - 120_000 * 1024) / 1024)
+    assert sizer.settled
+
+    # Settled: later chunks, e.g. of other files, keep the size
+    sizer.observe(sizer.size)
+    assert sizer.size == sizes[3]
+
+
+def test_chunk_sizer_keeps_default_size_without_rss(monkeypatch):
+    monkeypatch.setattr(process_addresses.instrumentation, "peak_rss_mb", lambda: None)
+    sizer = process_addresses.ChunkSizer(budget=1)
+
+    sizer.observe(sizer.size)
+
+    assert sizer.size == process_addresses.CHUNKSIZE
+    assert sizer.settled
+
+
+def test_process_chunk_territorial_columns_are_categorical(tmp_source, tmp_metadata):
+    lookups = process_addresses.build_lookups(
+        process_addresses.load_mappings(tmp_metadata)
+    )
+    with open(tmp_source / "addresses.csv", "rb") as handle:
+        first, second = process_addresses.read_chunks(handle, chunksize=1)
+
+    first = process_addresses.process_chunk(first, lookups)
+    second = process_addresses.process_chunk(second, lookups)
+
+    for column in ["ESTADO", "MUNICIPIO", "DISTRITO", "SUBDISTRITO"]:
+        assert first[column].dtype == second[column].dtype
+    assert list(first["ESTADO"].cat.categories) == ["Estado1", "Estado2"]
+    assert first["ESTADO"].tolist() == ["Estado1"]
+    assert second["MUNICIPIO"].tolist() == ["Mun2"]
+    assert first["TIPO_LOGRADOURO"].dtype == "category"
+
+
+def test_process_chunk_unknown_code_is_missing(tmp_source, tmp_metadata):
+    lookups = process_addresses.build_lookups(
+        process_addresses.load_mappings(tmp_metadata)
+    )
+    with open(tmp_source / "addresses.csv", "rb") as handle:
+        chunk = next(process_addresses.read_chunks(handle))
+    chunk.loc[0, "COD_MUNICIPIO"] = 999
+
+    processed = process_addresses.process_chunk(chunk, lookups)
+
+    assert pd.isna(processed.loc[0, "MUNICIPIO"])
+    assert processed.loc[1, "MUNICIPIO"] == "Mun2"
+
+
+def test_territorial_lookup_resolves_integer_codes():
+    lookups = process_addresses.build_lookups(
+        {
+            "state": {"12": "Acre", "11": "Rondônia", "53": "Distrito Federal"},
+            "municipality": {},
+            "distrital": {},
+            "subdistrital": {},
+        }
+    )
+    codes = pd.array([11, 53, None, 12, 10, 99, 11.5], dtype="Float64")
+
+    states = lookups["ESTADO"].category_codes(pd.Series(codes))
+    municipalities = lookups["MUNICIPIO"].category_codes(pd.Series(codes))
+
+    names = list(lookups["ESTADO"].dtype.categories)
+    assert [names[code] if code >= 0 else None for code in states] == [
+        "Rondônia",
+        "Distrito Federal",
+        None,
+        "Acre",
+        None,
+        None,
+        None,
+    ]
+    assert municipalities.tolist() == [-1] * 7
+
+
+def test_main_streams_csv_from_zip(tmp_source, tmp_metadata, tmp_path):
+    # Arrange: the same CSV, packed the way IBGE ships it
+    raw = tmp_path / "raw"
+    (raw / "UF").mkdir(parents=True)
+    with zipfile.ZipFile(raw / "UF" / "addresses.zip", "w") as archive:
+        archive.write(tmp_source / "addresses.csv", "CSV/addresses.csv")
+        archive.writestr("CSV/readme.txt", "not an address file")
+
+    # Act
+    process_addresses.main(tmp_source, tmp_metadata, tmp_path / "extracted")
+    process_addresses.main(raw, tmp_metadata, tmp_path / "zipped")
+
+    # Assert
+    assert [path.name for path in (tmp_path / "zipped").glob("*.csv")] == [
+        "addresses.csv"
+    ]
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "extracted" / "addresses.csv"),
+        pd.read_csv(tmp_path / "zipped" / "addresses.csv"),
+    )
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_main_records_metrics(
+    tmp_source, tmp_metadata, tmp_destination, metrics_file, workers
+):
+    # Act
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination, workers=workers)
+
+    # Assert: spans of the workers are recorded under the stage too
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert [record["name"] for record in records] == [
+        "read_chunk",
+        "process_chunk",
+        "write_chunk",
+        "process_file",
+        "process_addresses",
+    ]
+    assert {record["stage"] for record in records} == {"process_addresses"}
+    assert records[0]["rows"] == records[3]["rows"] == 2
+    assert records[2]["bytes"] == (tmp_destination / "addresses.csv").stat().st_size
+    assert records[-1]["bytes"] == (tmp_source / "addresses.csv").stat().st_size
+
+
+def test_main_skips_files_unchanged_since_last_run(
+    tmp_source, tmp_metadata, tmp_destination
+):
+    # Arrange
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination)
+    df = pd.read_csv(tmp_source / "addresses.csv", sep=";", dtype=str)
+    df.head(1).to_csv(tmp_source / "new.csv", sep=";", index=False)
+
+    # Act
+    with patch.object(
+        process_addresses, "process_file", wraps=process_addresses.process_file
+    ) as mock_process_file:
+        process_addresses.main(tmp_source, tmp_metadata, tmp_destination)
+
+    # Assert: only the new file is processed
+    assert [call.args[0].name for call in mock_process_file.call_args_list] == [
+        "new.csv"
+    ]
+
+
+def test_main_reprocesses_when_mappings_change_or_forced(
+    tmp_source, tmp_metadata, tmp_destination
+):
+    # Arrange
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination)
+    (tmp_metadata / "state_mapping.json").write_text(
+        json.dumps({"11": "Rondônia", "12": "Acre"}), encoding="utf-8"
+    )
+
+    # Act
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination)
+
+    # Assert
+    df_out = pd.read_csv(tmp_destination / "addresses.csv")
+    assert df_out["ESTADO"].tolist() == ["Rondônia", "Acre"]
+
+    with patch.object(
+        process_addresses, "process_file", return_value=([], {})
+    ) as mock_process_file:
+        process_addresses.main(tmp_source, tmp_metadata, tmp_destination)
+        mock_process_file.assert_not_called()
+
+        process_addresses.main(tmp_source, tmp_metadata, tmp_destination, force=True)
+        mock_process_file.assert_called_once()
+
+
+def test_main_reprocesses_when_a_module_it_uses_changes(
+    tmp_source, tmp_metadata, tmp_destination, tmp_path, monkeypatch
+):
+    # Arrange: a copy of territory.py stands in for the shared module
+    names = [path.name for path in process_addresses.VERSION_SOURCES]
+    assert names[1:] == ["territory.py", "manifest.py"]
+    module = tmp_path / "territory.py"
+    module.write_bytes(process_addresses.VERSION_SOURCES[1].read_bytes())
+    monkeypatch.setattr(
+        process_addresses,
+        "VERSION_SOURCES",
+        [process_addresses.VERSION_SOURCES[0], module],
+    )
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination)
+
+    # Act
+    module.write_text(module.read_text() + "\n# changed\n")
+    with patch.object(
+        process_addresses, "process_file", return_value=([], {})
+    ) as mock_process_file:
+        process_addresses.main(tmp_source, tmp_metadata, tmp_destination)
+
+    # Assert
+    mock_process_file.assert_called_once()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_main_reads_compiled_territory(
+    tmp_source, tmp_metadata, tmp_destination, workers
+):
+    # Arrange: the compiled territory takes precedence over the JSON mappings
+    mappings = process_addresses.load_mappings(tmp_metadata)
+    mappings["state"] = {"11": "Rondônia", "12": "Acre"}
+    write_territory(mappings, tmp_metadata / TERRITORY_FILENAME)
+
+    # Act
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination, workers)
+
+    # Assert
+    df_out = pd.read_csv(tmp_destination / "addresses.csv")
+    assert df_out["ESTADO"].tolist() == ["Rondônia", "Acre"]
+    assert df_out["MUNICIPIO"].tolist() == ["Mun1", "Mun2"]
+
+    # A new territory file reprocesses the outputs built from the old one
+    mappings["state"]["12"] = "Estado do Acre"
+    write_territory(mappings, tmp_metadata / TERRITORY_FILENAME)
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination, workers)
+    df_out = pd.read_csv(tmp_destination / "addresses.csv")
+    assert df_out["ESTADO"].tolist() == ["Rondônia", "Estado do Acre"]
+
+
+@pytest.mark.parametrize("engine", process_addresses.ENGINES)
+def test_main_with_memory_budget_matches_default(
+    tmp_source, tmp_metadata, tmp_path, monkeypatch, capsys, engine
+):
+    df = pd.read_csv(tmp_source / "addresses.csv", sep=";", dtype=str)
+    pd.concat([df] * 5).to_csv(tmp_source / "addresses.csv", sep=";", index=False)
+    budget = process_addresses.MB
+    sizer = process_addresses.ChunkSizer(budget, size=3)
+    monkeypatch.setattr(process_addresses, "_sizers", {budget: sizer})
+
+    # Act: a budget far below the RSS of the process, so chunks stay small
+    process_addresses.main(tmp_source, tmp_metadata, tmp_path / "default")
+    with pytest.warns(RuntimeWarning, match="over the memory budget of 1 MB"):
+        process_addresses.main(
+            tmp_source,
+            tmp_metadata,
+            tmp_path / "budget",
+            engine=engine,
+            memory_budget=budget,
+        )
+
+    # Assert
+    pd.testing.assert_frame_equal(
+        pd.read_csv(tmp_path / "default" / "addresses.csv"),
+        pd.read_csv(tmp_path / "budget" / "addresses.csv"),
+    )
+    assert [rows for rows, _ in sizer.samples] == [3, 3, 3]
+    assert "addresses.csv: 3 rows per chunk" in capsys.readouterr().out
+
+
+def test_main_fails_fast_when_the_budget_is_taken_before_any_rows(
+    tmp_source, tmp_metadata, tmp_destination, monkeypatch
+):
+    # Arrange: the process already peaked at 200 MB, e.g. for the lookups
+    monkeypatch.setattr(process_addresses, "_sizers", {})
+    monkeypatch.setattr(process_addresses.instrumentation, "peak_rss_mb", lambda: 200)
+
+    # Act / Assert
+    with pytest.raises(ValueError, match="budget of 100 MB is below the 200 MB"):
+        process_addresses.main(
+            tmp_source,
+            tmp_metadata,
+            tmp_destination,
+            memory_budget=100 * process_addresses.MB,
+        )
+    assert not (tmp_destination / "addresses.csv").exists()
+    assert process_addresses._sizers == {}
+
+
+@pytest.mark.parametrize("engine", process_addresses.ENGINES)
+def test_main_skips_a_file_without_rows(
+    tmp_source, tmp_metadata, tmp_destination, capsys, engine
+):
+    # Arrange: only the header is left
+    df = pd.read_csv(tmp_source / "addresses.csv", sep=";", dtype=str)
+    df.head(0).to_csv(tmp_source / "addresses.csv", sep=";", index=False)
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination, engine=engine)
+    capsys.readouterr()
+
+    # Act
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination, engine=engine)
+
+    # Assert
+    assert "1 files up to date, processing 0" in capsys.readouterr().out
+
+
+def test_check_rules_flags_each_rule():
+    df = pd.DataFrame(
+        {
+            "LATITUDE": [-8.7, 95.0, None],
+            "LONGITUDE": [-63.9, -63.9, -200.0],
+            "CEP": pd.array(["76801000", "76801-000", "7680"], dtype="string"),
+            "NUMERO": ["SN", None, "10"],
+            "ESTADO": ["Rondônia", "Rondônia", None],
+            "MUNICIPIO": ["Porto Velho"] * 3,
+            "DISTRITO": ["Porto Velho"] * 3,
+            "ESPECIE": pd.array([1, 9, None], dtype="Int8"),
+            "NIVEL_GEOCODIFICACAO": pd.array([6, 1, 0], dtype="Int8"),
+        }
+    )
+
+    failures = process_addresses.check_rules(df)
+
+    assert list(failures.columns) == list(process_addresses.RULES)
+    assert failures.sum(axis=1).tolist() == [0, 3, 6]
+    assert process_addresses.rejection_reasons(failures).tolist() == [
+        "latitude,numero,especie",
+        "latitude,longitude,cep,territorio,especie,nivel_geo",
+    ]
+
+
+def test_main_writes_rejected_rows_with_reasons(
+    tmp_source, tmp_metadata, tmp_destination, capsys
+):
+    # Arrange: no coordinates, and no number without the SN modifier
+    df = pd.read_csv(tmp_source / "addresses.csv", sep=";", dtype=str)
+    df.loc[1, "LATITUDE"] = None
+    df.loc[1, "NUM_ENDERECO"] = None
+    df.to_csv(tmp_source / "addresses.csv", sep=";", index=False)
+
+    # Act
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination)
+
+    # Assert
+    assert pd.read_csv(tmp_destination / "addresses.csv")["ID_ENDERECO"].tolist() == [1]
+    rejects = pd.read_csv(tmp_destination / "_rejects" / "addresses.csv")
+    assert rejects["ID_ENDERECO"].tolist() == [2]
+    assert rejects["MOTIVO_REJEICAO"].tolist() == ["latitude,numero"]
+    assert "latitude: 1" in capsys.readouterr().out
+
+    # A clean re-run removes the previous rejects
+    df.loc[1, ["LATITUDE", "NUM_ENDERECO"]] = ["20.0", "200"]
+    df.to_csv(tmp_source / "addresses.csv", sep=";", index=False)
+    process_addresses.main(tmp_source, tmp_metadata, tmp_destination)
+    assert not (tmp_destination / "_rejects" / "addresses.csv").exists()
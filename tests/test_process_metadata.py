@@ -1,12 +1,14 @@
-import pytest
+import json
 import sys
 from pathlib import Path
-import json
-import pandas as pd
 from unittest.mock import patch
 
+import pandas as pd
+import pytest
+
 sys.path.append(str(Path(__file__).resolve().parents[1]))
 import scripts.process_metadata as process_metadata
+from scripts.territory import TERRITORY_FILENAME, Territory
 
 
 @pytest.fixture
@@ -79,3 +81,99 @@ def test_main_characterization_patched(tmp_output):
         )
     )
     assert state_map["11"] == "Estado1"
+
+    # The same mappings, compiled into the territory file
+    territory = Territory(tmp_output / TERRITORY_FILENAME)
+    assert territory["state"].mapping() == {"11": "Estado1", "12": "Estado2"}
+
+
+@pytest.fixture
+def dtb_source(tmp_path):
+    """Placeholder DTB files, parsed through a patched read_excel."""
+    source = tmp_path / "source"
+    source.mkdir()
+    for fname in [
+        process_metadata.STATE_MUNICIPALITY_FILE,
+        process_metadata.DISTRITAL_FILE,
+        process_metadata.SUBDISTRITAL_FILE,
+    ]:
+        (source / fname).write_bytes(fname.encode())
+
+    df = pd.DataFrame(
+        {
+            "UF": ["11"],
+            "Nome_UF": ["Estado1"],
+            "Código Município Completo": ["11001"],
+            "Nome_Município": ["Mun1"],
+            "Código de Distrito Completo": ["1100101"],
+            "Nome_Distrito": ["Dist1"],
+            "Código de Subdistrito Completo": ["110010101"],
+            "Nome_Subdistrito": ["Sub1"],
+        }
+    )
+
+    def read_excel(filepath, skiprows, usecols):
+        return df[usecols]
+
+    with patch("pandas.read_excel", side_effect=read_excel) as mock_read:
+        yield source, mock_read
+
+
+def test_main_skips_unchanged_sources(dtb_source, tmp_output):
+    # Arrange
+    source, mock_read = dtb_source
+    process_metadata.main(source, tmp_output)
+    assert mock_read.call_count == 3
+
+    # Act: nothing changed
+    mock_read.reset_mock()
+    process_metadata.main(source, tmp_output)
+
+    # Assert
+    mock_read.assert_not_called()
+
+    # Act: one DTB file is updated
+    (source / process_metadata.DISTRITAL_FILE).write_bytes(b"updated")
+    process_metadata.main(source, tmp_output)
+
+    # Assert
+    assert mock_read.call_count == 3
+
+
+def test_main_reruns_when_a_module_it_uses_changes(
+    dtb_source, tmp_path, tmp_output, monkeypatch
+):
+    # Arrange: a copy of territory.py stands in for the shared module
+    source, mock_read = dtb_source
+    names = [path.name for path in process_metadata.VERSION_SOURCES]
+    assert names[1:] == ["territory.py", "manifest.py"]
+    module = tmp_path / "territory.py"
+    module.write_bytes(process_metadata.VERSION_SOURCES[1].read_bytes())
+    monkeypatch.setattr(
+        process_metadata,
+        "VERSION_SOURCES",
+        [process_metadata.VERSION_SOURCES[0], module],
+    )
+    process_metadata.main(source, tmp_output)
+    mock_read.reset_mock()
+
+    # Act
+    module.write_text(module.read_text() + "\n# changed\n")
+    process_metadata.main(source, tmp_output)
+
+    # Assert
+    assert mock_read.call_count == 3
+
+
+def test_main_records_metrics(dtb_source, tmp_output, tmp_path, metrics_file):
+    # Act: the second run finds the mappings up to date
+    source, _ = dtb_source
+    process_metadata.main(source, tmp_output)
+    process_metadata.main(source, tmp_output)
+
+    # Assert
+    records = [json.loads(line) for line in metrics_file.read_text().splitlines()]
+    assert [record["name"] for record in records] == 2 * ["process_metadata"]
+    assert records[0]["bytes"] == sum(f.stat().st_size for f in source.iterdir())
+    assert records[1]["bytes"] == 0
+    assert (tmp_path / "profiles" / "process_metadata.prof").exists()
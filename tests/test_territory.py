@@ -0,0 +1,102 @@
+import pickle
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+sys.path.append(str(Path(__file__).resolve().parents[1]))
+from scripts.territory import Territory, write_territory
+
+MAPPINGS = {
+    "state": {"12": "Acre", "11": "Rondônia"},
+    "municipality": {
+        "1200013": "Acrelândia",
+        "1100015": "Alta Floresta D'Oeste",
+        "1100023": "Ariquemes",
+        "9900001": "Órfão",
+    },
+    "distrital": {"110001505": "Alta Floresta D'Oeste", "120001305": "Acrelândia"},
+    "subdistrital": {"11000150501": "Centro"},
+}
+
+
+@pytest.fixture
+def territory_path(tmp_path):
+    path = tmp_path / "territory.bin"
+    write_territory(MAPPINGS, path)
+    return path
+
+
+def test_territory_round_trips_mappings(territory_path):
+    territory = Territory(territory_path)
+
+    for name, mapping in MAPPINGS.items():
+        assert territory[name].mapping() == mapping
+    assert territory["municipality"].codes.tolist() == [
+        1100015,
+        1100023,
+        1200013,
+        9900001,
+    ]
+    assert territory["distrital"].names == ["Acrelândia", "Alta Floresta D'Oeste"]
+    assert not list(territory_path.parent.glob("*.partial"))
+
+
+def test_territory_links_codes_to_their_parents(territory_path):
+    territory = Territory(territory_path)
+
+    assert territory.parent("subdistrital", 11000150501) == 110001505
+    assert territory.parent("distrital", 120001305) == 1200013
+    assert territory.parent("municipality", 1100023) == 11
+    assert territory.parent("municipality", 9900001) is None
+    assert territory.parent("state", 11) is None
+    assert territory.parent("municipality", 1) is None
+    assert territory["municipality"].parents.tolist() == [0, 0, 1, -1]
+
+
+def test_territory_maps_arrays_read_only(territory_path):
+    territory = Territory(territory_path)
+    codes = territory["state"].codes
+
+    assert not codes.flags.writeable
+    with pytest.raises(ValueError):
+        codes[0] = 0
+    # Names are decoded on first use only
+    assert territory["state"]._names is None
+    assert territory["state"].names == ["Acre", "Rondônia"]
+
+
+def test_territory_handles_empty_levels(tmp_path):
+    path = tmp_path / "territory.bin"
+    write_territory({**MAPPINGS, "subdistrital": {}}, path)
+
+    level = Territory(path)["subdistrital"]
+
+    assert level.mapping() == {}
+    assert level.names == []
+
+
+@pytest.mark.parametrize("content", [b"", b"not a territory", pickle.dumps([1])])
+def test_territory_rejects_other_files(tmp_path, content):
+    path = tmp_path / "territory.bin"
+    path.write_bytes(content)
+
+    with pytest.raises(ValueError, match="territory"):
+        Territory(path)
+
+
+def test_territory_rejects_other_format_versions(tmp_path):
+    path = tmp_path / "territory.bin"
+    with open(path, "wb") as f:
+        np.save(f, np.array([0]))
+
+    with pytest.raises(ValueError, match="format"):
+        Territory(path)
+
+
+def test_write_territory_rejects_names_with_line_breaks(tmp_path):
+    mappings = {**MAPPINGS, "state": {"11": "Rondônia\nRO"}}
+
+    with pytest.raises(ValueError, match="line breaks"):
+        write_territory(mappings, tmp_path / "territory.bin")